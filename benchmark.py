@@ -0,0 +1,601 @@
+"""
+Performance benchmarks.
+Generates synthetic reports (see synthetic_report.py) and times every stage
+a report goes through: streaming parse, model build, parse cache, search
+index, loading into the viewer's tree, expanding every suite, filtering,
+selecting failed cases, copying and exporting. Peak memory is recorded per
+scenario, each of which runs in a fresh process.
+
+The viewer is driven through its own methods. Without a display (CI, or
+Linux without Xvfb) Tk is replaced by stand-in widgets that keep the tree
+in plain Python structures, so the timings cover the viewer's code but not
+Tk's drawing; run under Xvfb (xvfb-run python benchmark.py) to include Tk.
+
+With --startup, the viewer is started in fresh interpreters with a report
+on the command line, timing what the user waits for before the report is
+shown: imports, window creation and the load.
+
+Results are written as JSON; with --baseline, stages that became slower
+than a previous result by more than --tolerance are listed and the exit
+code is 1.
+
+    python benchmark.py --preset small --preset medium -o results.json
+    python benchmark.py --suites 100 --cases 1000 --depth 3 -o custom.json
+"""
+
+import argparse
+import functools
+import heapq
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PRESETS = {
+    "small": dict(suites=20, cases=50, failure_ratio=0.05, trace_lines=20, output_lines=5, depth=1),
+    "medium": dict(suites=200, cases=250, failure_ratio=0.02, trace_lines=40, output_lines=10, depth=2),
+    "large": dict(suites=1000, cases=500, failure_ratio=0.01, trace_lines=40, output_lines=10, depth=3),
+    # Mostly passing suites, which stay collapsed with a placeholder row
+    "many-suites": dict(suites=1000, cases=20, failure_ratio=0.01, trace_lines=20, output_lines=0, depth=1),
+    # Few cases, each with a stack trace longer than the details panel preview
+    "huge-traces": dict(suites=5, cases=20, failure_ratio=1.0, trace_lines=20000, output_lines=0, depth=1),
+}
+DEFAULT_PRESETS = ("small", "medium", "many-suites")
+# Failed cases selected in the tree per scenario
+SELECTIONS = 100
+# Slowdown of a stage, as a fraction, that --baseline reports as a regression
+TOLERANCE = 0.25
+# Stages shorter than this are too noisy to compare
+MIN_COMPARED_SECONDS = 0.01
+# Report on the command line of the startup benchmark, and the fresh interpreters it starts;
+# the median of each stage is reported
+STARTUP_REPORT = dict(suites=20, cases=50, failure_ratio=0.05, trace_lines=20, output_lines=5, depth=1)
+STARTUP_RUNS = 5
+# Run by the startup benchmark: the viewer is imported first, as by main.py
+STARTUP_PROBE = ("import time; start = time.perf_counter(); import viewer; imported = time.perf_counter(); "
+                 "import benchmark, sys; benchmark.run_startup(sys.argv[1], start, imported)")
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+class Stub:
+    """Stand-in for any Tk widget or object: accepts every call and returns another stub"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Stub()
+
+    def __getattr__(self, name):
+        return Stub()
+
+
+class StubVar:
+    default = None
+
+    def __init__(self, master=None, value=None):
+        self.value = self.default if value is None else value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+    def trace_add(self, mode, callback):
+        pass
+
+
+class StubStringVar(StubVar):
+    default = ""
+
+
+class StubBooleanVar(StubVar):
+    default = False
+
+
+class StubTree(Stub):
+    """The parts of ttk.Treeview the viewer uses, on plain dicts and lists"""
+
+    def __init__(self, *args, **kwargs):
+        self.items = {"": {"parent": None, "children": [], "options": {}}}
+        self.selected = ()
+        self.focused = ""
+        self.ids = itertools.count(1)
+
+    def insert(self, parent, index, iid=None, **options):
+        iid = iid or f"I{next(self.ids):03X}"
+        self.items[iid] = {"parent": parent, "children": [], "options": options}
+        children = self.items[parent]["children"]
+        children.insert(len(children) if index == "end" else index, iid)
+        return iid
+
+    def item(self, iid, option=None, **options):
+        self.items[iid]["options"].update(options)
+        return self.items[iid]["options"].get(option) if option else None
+
+    def delete(self, *iids):
+        for iid in iids:
+            item = self.items.pop(iid)
+            siblings = self.items[item["parent"]]["children"] if item["parent"] in self.items else []
+            if iid in siblings:
+                siblings.remove(iid)
+            for child in list(item["children"]):
+                self.items[child]["parent"] = None
+                self.delete(child)
+
+    def set_children(self, parent, *children):
+        for iid in self.items[parent]["children"]:
+            self.items[iid]["parent"] = None
+        for iid in children:
+            old_parent = self.items[iid]["parent"]
+            if old_parent is not None and old_parent != parent:
+                self.items[old_parent]["children"].remove(iid)
+            self.items[iid]["parent"] = parent
+        self.items[parent]["children"] = list(children)
+
+    def get_children(self, parent=""):
+        return tuple(self.items[parent]["children"])
+
+    def exists(self, iid):
+        return iid in self.items
+
+    def selection_set(self, iid):
+        self.selected = (iid,)
+
+    def selection(self):
+        return self.selected
+
+    def focus(self, iid=None):
+        if iid is None:
+            return self.focused
+        self.focused = iid
+
+
+class StubText(Stub):
+    """The parts of tk.Text the viewer uses; keeps only the amount of text inserted"""
+
+    def __init__(self, *args, **kwargs):
+        self.chars = 0
+
+    def insert(self, index, text, *tags):
+        self.chars += len(text)
+
+    def delete(self, start, end=None):
+        self.chars = 0
+
+
+class StubEvent:
+    def __init__(self, widget):
+        self.widget = widget
+
+
+class StubRoot(Stub):
+    """Main window stand-in whose after() callbacks run from run_pending, at their due time.
+
+    A <Map> binding is called from the next run_pending, as if the window had just been shown.
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.ids = itertools.count()
+        self.cancelled = set()
+        self.map_bindings = {}
+
+    def after(self, ms, callback, *args):
+        job = next(self.ids)
+        heapq.heappush(self.jobs, (time.perf_counter() + ms / 1000, job, callback, args))
+        return job
+
+    def after_idle(self, callback, *args):
+        return self.after(0, callback, *args)
+
+    def after_cancel(self, job):
+        self.cancelled.add(job)
+
+    def winfo_ismapped(self):
+        return False
+
+    def bind(self, sequence, callback, add=None):
+        if sequence != "<Map>":
+            return None
+        binding = f"map{len(self.map_bindings)}"
+        self.map_bindings[binding] = self.after(0, callback, StubEvent(self))
+        return binding
+
+    def unbind(self, sequence, binding=None):
+        if binding in self.map_bindings:
+            self.after_cancel(self.map_bindings.pop(binding))
+
+    def run_pending(self, until=None):
+        """Run scheduled callbacks until none are left or until() is true"""
+        while self.jobs and not (until and until()):
+            due, job, callback, args = heapq.heappop(self.jobs)
+            if job in self.cancelled:
+                continue
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            callback(*args)
+
+
+class StubModule:
+    """tkinter or ttk with every widget replaced by a stub; constants are the real ones"""
+
+    def __init__(self, module, widgets):
+        self.module = module
+        self.widgets = widgets
+
+    def __getattr__(self, name):
+        if name in self.widgets:
+            return self.widgets[name]
+        value = getattr(self.module, name, None)
+        if isinstance(value, (str, int, float)):
+            return value
+        return Stub
+
+
+def create_viewer(show=False):
+    """An XMLTestViewer on a real Tk root if a display is available, else on stubs.
+
+    The Tk window is only shown with show. Returns (viewer, uses_tk).
+    """
+    import tkinter
+    from tkinter import ttk
+
+    import viewer
+
+    try:
+        root = tkinter.Tk()
+        if not show:
+            root.withdraw()
+        return viewer.XMLTestViewer(root), True
+    except tkinter.TclError:
+        pass
+
+    widgets = {"Treeview": StubTree, "Text": StubText, "StringVar": StubStringVar,
+               "BooleanVar": StubBooleanVar}
+    viewer.tk = StubModule(tkinter, widgets)
+    viewer.ttk = StubModule(ttk, widgets)
+    return viewer.XMLTestViewer(StubRoot()), False
+
+
+class Timer:
+    def __init__(self):
+        self.timings = {}
+
+    def __call__(self, stage):
+        timer = self
+
+        class Stage:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc_info):
+                timer.timings[stage] = round(time.perf_counter() - self.start, 6)
+
+        return Stage()
+
+
+def run_scenario(name, params, workdir):
+    """Generate one report and time every stage on it; returns the scenario's result dict"""
+    from report_cache import ReportCache
+    from report_diff import ReportDiff
+    from report_export import FORMATS, format_as_yaml, write_failures
+    from report_model import TestReport
+    from report_parser import ReportBuilder, iter_report
+    from report_search import SearchIndex
+    from synthetic_report import write_report
+
+    path = os.path.join(workdir, f"{name}.xml")
+    cases = write_report(path, **params)
+    timer = Timer()
+
+    # One pass as in load_report, with the time spent building the model split from parsing
+    report = TestReport()
+    report.sources.append(path)
+    builder = ReportBuilder(report)
+    clock = time.perf_counter
+    build = 0.0
+    start = clock()
+    for kind, data in iter_report(path):
+        applied = clock()
+        builder.apply(kind, data)
+        build += clock() - applied
+    total = clock() - start
+    timer.timings.update(load_report=round(total, 6), parse=round(total - build, 6), model_build=round(build, 6))
+
+    cache = ReportCache(os.path.join(workdir, "cache"))
+    with timer("cache_store"):
+        cache.store(path, report)
+    with timer("cache_load"):
+        cache.load(path, TestReport())
+    with timer("search_index"):
+        SearchIndex(report)
+    with timer("diff"):
+        ReportDiff(report, report)
+
+    app, uses_tk = create_viewer()
+
+    def flush():
+        """Let the viewer finish what it scheduled on the main loop"""
+        if uses_tk:
+            app.root.update()
+            while app.render_job is not None:
+                app.root.update()
+        else:
+            app.root.run_pending()
+
+    def wait_for_load():
+        if uses_tk:
+            while app.loader is not None:
+                app.root.update()
+        else:
+            app.root.run_pending(until=lambda: app.loader is None)
+
+    # Loads through the worker thread and the batched tree insertion, as when opening a file
+    with timer("load_xml"):
+        app.load_xml(path)
+        wait_for_load()
+    with timer("load_xml_cached"):
+        app.load_xml(path)
+        wait_for_load()
+    report = app.report
+
+    # Sorted while suites are still collapsed, so that filtering puts their placeholders back
+    with timer("filter_collapsed"):
+        app.sort_by("time")
+        app.search_var.set("test1")
+        app.apply_filter()
+        app.clear_filter()
+        app.sort_by(None)
+
+    with timer("tree_expand_all"):
+        for suite_id in list(app.lazy_suites):
+            app.populate_suite(suite_id)
+    with timer("sort_by_time"):
+        app.sort_by("time")
+    with timer("filter"):
+        app.search_var.set("test1")
+        app.apply_filter()
+        app.clear_filter()
+
+    rows = list(itertools.islice(report.failures, SELECTIONS))
+    with timer("select_failures"):
+        for row in rows:
+            app.tree.selection_set(f"c{row}")
+            if not uses_tk:
+                app.on_select(None)
+            flush()
+
+    with timer("copy_yaml"):
+        format_as_yaml(list(report.iter_failure_groups()))
+    for format in FORMATS:
+        with timer(f"export_{format}"):
+            with open(os.devnull, "w", encoding="utf-8") as out:
+                write_failures([report], out, format)
+
+    return {
+        "name": name,
+        "params": params,
+        "file_bytes": os.path.getsize(path),
+        "cases": cases,
+        "failures": len(report.failures),
+        "tk": uses_tk,
+        "timings": timer.timings,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def run_startup(path, start, imported):
+    """Start the viewer with path on the command line and write the time of each startup stage.
+
+    Called by STARTUP_PROBE in a fresh interpreter; start and imported are
+    the times before and after importing the viewer.
+    """
+    import viewer
+
+    timer = Timer()
+    timer.timings["import"] = round(imported - start, 6)
+    with timer("create_window"):
+        app, uses_tk = create_viewer(show=True)
+        viewer.open_command_line(app, [path])
+
+    def run_until(done):
+        if uses_tk:
+            while not done():
+                app.root.update()
+        else:
+            app.root.run_pending(until=done)
+
+    # Deferred widgets built and the report load started by <Map>
+    with timer("first_idle"):
+        run_until(lambda: app.details_text is not None and app.loader is not None)
+    with timer("load_report"):
+        run_until(lambda: app.loader is None)
+    timer.timings["ready"] = round(time.perf_counter() - start, 6)
+    sys.stdout.write(json.dumps({"tk": uses_tk, "cases": len(app.report), "timings": timer.timings}))
+
+
+def run_startup_benchmark(runs=STARTUP_RUNS):
+    """Median startup stages over runs fresh interpreters, as a scenario result dict.
+
+    "process" is the wall time of the whole interpreter, from its start until
+    the report on its command line is loaded and it has exited.
+    """
+    from synthetic_report import write_report
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "startup.xml")
+        write_report(path, **STARTUP_REPORT)
+        env = dict(os.environ, XMLVIEWER_CACHE_DIR=os.path.join(workdir, "viewer-cache"),
+                   XMLVIEWER_HISTORY_DB=os.path.join(workdir, "history.sqlite3"))
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            completed = subprocess.run([sys.executable, "-c", STARTUP_PROBE, path], stdout=subprocess.PIPE,
+                                       check=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+            result = json.loads(completed.stdout)
+            result["timings"]["process"] = round(time.perf_counter() - started, 6)
+            samples.append(result)
+        file_bytes = os.path.getsize(path)
+
+    return {
+        "name": "startup",
+        "params": dict(STARTUP_REPORT, runs=runs),
+        "file_bytes": file_bytes,
+        "cases": samples[0]["cases"],
+        "tk": samples[0]["tk"],
+        "timings": {stage: statistics.median(sample["timings"][stage] for sample in samples)
+                    for stage in samples[0]["timings"]},
+        "peak_rss_bytes": None,
+    }
+
+
+def run_in_subprocess(name, params):
+    """Run one scenario in a fresh interpreter, so that its peak memory is its own"""
+    command = [sys.executable, os.path.abspath(__file__), "--run-scenario", json.dumps([name, params])]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(completed.stdout)
+
+
+def version_label():
+    """git describe of the checkout, or None outside a git checkout"""
+    try:
+        completed = subprocess.run(["git", "describe", "--always", "--dirty"], stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return completed.stdout.decode().strip() or None
+
+
+def regressions(results, baseline, tolerance):
+    """(scenario, stage, old, new) of stages slower than in baseline by more than tolerance"""
+    old_scenarios = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    found = []
+    for scenario in results["scenarios"]:
+        old = old_scenarios.get(scenario["name"])
+        if old is None or old["params"] != scenario["params"]:
+            continue
+        for stage, seconds in scenario["timings"].items():
+            old_seconds = old["timings"].get(stage)
+            if old_seconds is None or max(seconds, old_seconds) < MIN_COMPARED_SECONDS:
+                continue
+            if seconds > old_seconds * (1 + tolerance):
+                found.append((scenario["name"], stage, old_seconds, seconds))
+    return found
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, loading, rendering and exporting reports.")
+    parser.add_argument("--preset", action="append", choices=sorted(PRESETS),
+                        help=f"scenario to run, repeatable (default: {', '.join(DEFAULT_PRESETS)})")
+    parser.add_argument("--suites", type=int, help="run a custom scenario with this many top-level suites")
+    parser.add_argument("--cases", type=int, default=100, help="custom scenario: cases per suite")
+    parser.add_argument("--failure-ratio", type=float, default=0.05, help="custom scenario: fraction failing")
+    parser.add_argument("--trace-lines", type=int, default=30, help="custom scenario: stack trace lines")
+    parser.add_argument("--output-lines", type=int, default=0, help="custom scenario: <system-out> lines")
+    parser.add_argument("--depth", type=int, default=1, help="custom scenario: suite nesting depth")
+    parser.add_argument("--startup", action="store_true",
+                        help=f"time the viewer's startup with a report on the command line ({STARTUP_RUNS} runs)")
+    parser.add_argument("-o", "--output", metavar="PATH", help="write the JSON results to PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against the JSON results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"slowdown reported as a regression (default: {TOLERANCE})")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.run_scenario:
+        name, params = json.loads(args.run_scenario)
+        with tempfile.TemporaryDirectory() as workdir:
+            # Keep the user's parse cache and test history out of the measurements
+            os.environ["XMLVIEWER_CACHE_DIR"] = os.path.join(workdir, "viewer-cache")
+            os.environ["XMLVIEWER_HISTORY_DB"] = os.path.join(workdir, "history.sqlite3")
+            result = run_scenario(name, params, workdir)
+        sys.stdout.write(json.dumps(result))
+        return 0
+
+    scenarios = [(name, PRESETS[name]) for name in args.preset or ()]
+    if args.suites:
+        scenarios.append(("custom", dict(suites=args.suites, cases=args.cases, failure_ratio=args.failure_ratio,
+                                         trace_lines=args.trace_lines, output_lines=args.output_lines,
+                                         depth=max(args.depth, 1))))
+    if not scenarios and not args.startup:
+        scenarios = [(name, PRESETS[name]) for name in DEFAULT_PRESETS]
+
+    results = {
+        "version": version_label(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "scenarios": [],
+    }
+    runs = [functools.partial(run_in_subprocess, name, params) for name, params in scenarios]
+    if args.startup:
+        runs.append(run_startup_benchmark)
+    for run in runs:
+        result = run()
+        name = result["name"]
+        results["scenarios"].append(result)
+        rss = result["peak_rss_bytes"]
+        sys.stderr.write(f"{name}: {result['cases']:,} cases, {result['file_bytes'] / 1e6:.1f} MB"
+                         + (f", peak RSS {rss / 1e6:.0f} MB" if rss else "") + "\n")
+        for stage, seconds in result["timings"].items():
+            sys.stderr.write(f"  {stage:<18} {seconds:10.3f}s\n")
+
+    text = json.dumps(results, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(text)
+    else:
+        sys.stdout.write(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for name, stage, old, new in found:
+            sys.stderr.write(f"REGRESSION {name} {stage}: {old:.3f}s -> {new:.3f}s\n")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Headless command line mode.
+Summarizes or exports JUnit XML reports without importing Tk, for CI agents
+that have no display. Output is streamed to stdout or to the -o file.
+
+With --baseline, writes the changes between a baseline run and the
+reports instead (see report_diff.py).
+
+Exit codes: 0 all tests passed, 1 failures or errors, 2 a report could not be read.
+With --baseline, 1 means that some test started failing.
+"""
+
+import argparse
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+from report_archive import archive_errors
+from report_diff import DIFF_FORMATS, SLOWER_RATIO, SLOWER_SECONDS, ReportDiff, write_diff
+from report_export import FORMATS, write_failures
+from report_loader import collect_report_files, load_merged
+from report_parser import load_report
+
+EXIT_PASSED = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+# Consecutive failed runs after which --history lists a test
+FAILING_RUNS = 3
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py --headless",
+        description="Summarize or export JUnit XML test reports without a GUI."
+    )
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("reports", nargs="+", metavar="report.xml",
+                        help="JUnit XML report files (also .xml.gz, .xml.bz2, .xml.xz), zip archives "
+                             "of them, or directories to search for them")
+    parser.add_argument("--format", choices=("summary",) + FORMATS, default="summary",
+                        help="output format: a summary, or all failures as YAML, JSON, "
+                             "JSON Lines or JUnit XML (default: summary)")
+    parser.add_argument("--max-lines", type=int, metavar="N",
+                        help="cut failure content after N lines, 0 for no limit (default: 50 in YAML)")
+    parser.add_argument("--max-chars", type=int, metavar="N",
+                        help="cut failure content after N characters, 0 for no limit beyond "
+                             "XMLVIEWER_TEXT_KEEP_KB (default: 2000 in JSON and JSON Lines)")
+    parser.add_argument("-o", "--output", metavar="PATH",
+                        help="write output to PATH instead of stdout")
+    parser.add_argument("--baseline", action="append", metavar="PATH",
+                        help="compare the reports against a baseline report or directory (repeatable); "
+                             "--format is then summary, json or jsonl")
+    parser.add_argument("--slower-ratio", type=float, default=SLOWER_RATIO, metavar="R",
+                        help=f"with --baseline, a case is slower when its time grows by more than "
+                             f"this fraction (default: {SLOWER_RATIO})")
+    parser.add_argument("--slower-seconds", type=float, default=SLOWER_SECONDS, metavar="S",
+                        help=f"...and by more than S seconds (default: {SLOWER_SECONDS})")
+    parser.add_argument("--record-history", action="store_true",
+                        help="record the reports in the local test history database")
+    parser.add_argument("--history", action="store_true",
+                        help="after the summary, list the flakiest tests and the tests that failed in "
+                             f"the last {FAILING_RUNS} or more recorded runs")
+    return parser
+
+
+def summary_line(filepath, report):
+    counts = report.status_counts()
+    line = (f"{filepath}: {len(report)} tests, {counts['failure']} failures, "
+            f"{counts['error']} errors, {counts['skipped']} skipped, {sum(report.times):.3f}s")
+    budget = report.text_budget
+    if budget.cut:
+        line += f" ({budget.cut} long texts cut{', text budget reached' if budget.spent else ''})"
+    return line
+
+
+def write_summary(filepath, report, out):
+    out.write(summary_line(filepath, report) + "\n")
+    for f in report.iter_failures():
+        label = "ERROR" if f["status"] == "error" else "FAIL"
+        name = f"{f['classname']}.{f['name']}" if f["classname"] else f["name"]
+        message = f["failure"]["message"].split("\n", 1)[0]
+        out.write(f"  {label} {name}: {message}\n" if message else f"  {label} {name}\n")
+
+
+def write_history(history, out):
+    out.write("Flakiest tests:\n")
+    for classname, name, flakiness, flips in history.flaky_tests():
+        out.write(f"  {classname}.{name}: {flakiness:.0%} ({flips} flips)\n" if classname
+                  else f"  {name}: {flakiness:.0%} ({flips} flips)\n")
+    out.write(f"Failing for {FAILING_RUNS}+ runs:\n")
+    for classname, name, streak in history.failing_tests(FAILING_RUNS):
+        out.write(f"  {classname}.{name}: {streak} runs\n" if classname else f"  {name}: {streak} runs\n")
+
+
+def iter_reports(paths, errors, history=None):
+    """Parse each path in turn; unreadable reports are reported on stderr and recorded in errors.
+
+    With a HistoryStore, each report is recorded in it as a run.
+    """
+    for filepath in paths:
+        try:
+            report = load_report(filepath)
+        except (ET.ParseError, OSError, *archive_errors()) as e:
+            errors.append(filepath)
+            sys.stderr.write(f"{filepath}: {e}\n")
+            continue
+        if history is not None:
+            history.record(report)
+        yield filepath, report
+
+
+def run_reports(args, out):
+    """Write the requested output for all reports and return the exit code"""
+    errors = []
+    failed = False
+    history = None
+    if args.record_history or args.history:
+        # Imported here: sqlite3 is only needed with the history options
+        from report_history import HistoryStore
+
+        history = HistoryStore()
+    recorder = history if args.record_history else None
+
+    def reports():
+        nonlocal failed
+        for filepath, report in iter_reports(args.reports, errors, recorder):
+            if report.failures:
+                failed = True
+            yield report
+
+    if args.format == "summary":
+        for filepath, report in iter_reports(args.reports, errors, recorder):
+            failed = failed or bool(report.failures)
+            write_summary(filepath, report, out)
+        if args.history:
+            write_history(history, out)
+    else:
+        # Only limits given on the command line override the format's defaults
+        limits = {name: value or None for name, value in
+                  (("max_lines", args.max_lines), ("max_chars", args.max_chars)) if value is not None}
+        write_failures(reports(), out, args.format, **limits)
+    if history is not None:
+        history.close()
+
+    if errors:
+        return EXIT_ERROR
+    return EXIT_FAILED if failed else EXIT_PASSED
+
+
+def run_diff(args, out):
+    """Write the changes from the baseline to the reports; exit code 1 if any case started failing"""
+    try:
+        # Each side may be several files (e.g. CI shards), merged before the join
+        baseline = load_merged(args.baseline, load_report)
+        candidate = load_merged(args.reports, load_report)
+    except (ET.ParseError, OSError, *archive_errors()) as e:
+        sys.stderr.write(f"{e}\n")
+        return EXIT_ERROR
+    diff = ReportDiff(baseline, candidate, args.slower_ratio, args.slower_seconds)
+    write_diff(diff, out, args.format)
+    return EXIT_FAILED if diff.changes["new_failure"] else EXIT_PASSED
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.reports = collect_report_files(args.reports)
+        if args.baseline:
+            args.baseline = collect_report_files(args.baseline)
+    except (OSError, *archive_errors()) as e:
+        sys.stderr.write(f"{e}\n")
+        return EXIT_ERROR
+    if args.baseline and args.format not in DIFF_FORMATS:
+        parser.error(f"--format {args.format} cannot be used with --baseline")
+    if args.history and (args.baseline or args.format != "summary"):
+        parser.error("--history needs the summary format")
+    run = run_diff if args.baseline else run_reports
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8", newline="\n") as out:
+            return run(args, out)
+    return run(args, sys.stdout)
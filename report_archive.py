@@ -0,0 +1,153 @@
+"""
+Compressed and archived reports.
+CI systems often keep reports as .xml.gz (or .bz2, .xz) files or as zip
+archives of TEST-*.xml files. These are read as streams that decompress as
+the parser asks for more, so nothing is extracted to disk. A report inside a
+zip archive is named by the archive path and the member name joined by "!/",
+e.g. reports.zip!/TEST-Foo.xml; archives are listed from their central
+directory without decompressing anything.
+
+Failure bodies of such reports are kept in memory when they are parsed.
+Their <system-out> and <system-err> texts are read back on demand (see
+report_text.py) by seeking in the decompressed stream. Seeking forward
+decompresses up to the text and seeking backward starts over, so reading
+one text costs up to a decompression of the file so far; the viewer does
+that on a worker thread.
+
+The compression modules are imported when a compressed report is first
+opened, so that starting the viewer does not pay for them.
+"""
+
+import importlib
+import os
+
+MEMBER_SEPARATOR = "!/"
+# Modules whose open() reads compressed report files, by suffix
+COMPRESSORS = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma"}
+REPORT_SUFFIXES = (".xml",) + tuple(".xml" + suffix for suffix in COMPRESSORS)
+ARCHIVE_SUFFIX = ".zip"
+
+
+def member_path(archive, member):
+    return archive + MEMBER_SEPARATOR + member
+
+
+def split_member(path):
+    """(archive path, member name) of a path into a zip archive, or (path, None)"""
+    index = path.lower().find(ARCHIVE_SUFFIX + MEMBER_SEPARATOR)
+    if index < 0:
+        return path, None
+    index += len(ARCHIVE_SUFFIX)
+    return path[:index], path[index + len(MEMBER_SEPARATOR):]
+
+
+def disk_path(path):
+    """The file on disk that holds a report: the archive of a zip member, else the path itself"""
+    return split_member(path)[0]
+
+
+def compressor(name):
+    """open() of the module that decompresses a report name, or None for an uncompressed one"""
+    for suffix, module in COMPRESSORS.items():
+        if name.lower().endswith(suffix):
+            return importlib.import_module(module).open
+    return None
+
+
+def archive_errors():
+    """Exceptions raised by truncated or corrupt compressed data, besides OSError.
+
+    A function rather than a constant, so that the compression modules are
+    only imported once an except clause naming them is reached.
+    """
+    import lzma
+    import zipfile
+    import zlib
+
+    return (EOFError, zipfile.BadZipFile, lzma.LZMAError, zlib.error)
+
+
+def is_plain(path):
+    """Whether a report is an uncompressed file, whose texts can be read at their byte offsets"""
+    return split_member(path)[1] is None and compressor(path) is None
+
+
+def is_report_name(name):
+    return name.lower().endswith(REPORT_SUFFIXES)
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIX) and split_member(path)[1] is None
+
+
+def list_members(archive):
+    """(member name, size, compressed size) of the reports in a zip archive, in archive order"""
+    import zipfile
+
+    with zipfile.ZipFile(archive) as zf:
+        return [(info.filename, info.file_size, info.compress_size) for info in zf.infolist()
+                if not info.is_dir() and is_report_name(info.filename)]
+
+
+def report_size(path):
+    """Bytes of a report as stored on disk (compressed, for a zip member)"""
+    archive, member = split_member(path)
+    if member is None:
+        return os.path.getsize(path)
+    import zipfile
+
+    with zipfile.ZipFile(archive) as zf:
+        return zf.getinfo(member).compress_size
+
+
+class ReportFile:
+    """A report opened for binary reading, decompressed as it is read"""
+
+    def __init__(self, path):
+        archive, member = split_member(path)
+        self.raw = open(archive, "rb")
+        self.zip = None
+        # Stream of a zip member and its compressed bytes per byte, for bytes_read
+        self.member = None
+        self.ratio = None
+        try:
+            if member is not None:
+                import zipfile
+
+                self.zip = zipfile.ZipFile(self.raw)
+                info = self.zip.getinfo(member)
+                self.stream = self.member = self.zip.open(info)
+                self.ratio = info.compress_size / info.file_size if info.file_size else 1.0
+            else:
+                self.stream = self.raw
+            # Also for compressed reports inside an archive
+            open_compressed = compressor(member if member is not None else path)
+            if open_compressed is not None:
+                self.stream = open_compressed(self.stream, "rb")
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def seek(self, offset):
+        return self.stream.seek(offset)
+
+    @property
+    def bytes_read(self):
+        """Bytes of the file on disk consumed so far (estimated for a zip member)"""
+        if self.member is None:
+            return self.raw.tell()
+        return int(self.member.tell() * self.ratio)
+
+    def close(self):
+        for f in (getattr(self, "stream", None), self.member, self.zip, self.raw):
+            if f is not None:
+                f.close()
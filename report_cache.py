@@ -0,0 +1,393 @@
+"""
+Persistent parse cache.
+Stores parsed TestReport models on disk so that reopening an unchanged report
+skips XML parsing. Entries are keyed by absolute path and validated against
+the file's mtime, size and content hash; corrupt or stale entries are
+discarded and rebuilt. The cache directory is kept under a size limit by
+evicting the least recently used entries.
+
+Settings (environment variables):
+    XMLVIEWER_CACHE_DIR       cache directory
+    XMLVIEWER_CACHE_SIZE_MB   size limit in MB (default 1024, 0 disables the cache)
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+from report_archive import archive_errors, disk_path, split_member
+from report_model import STATUS_NAMES, FailureRecord, SpanColumn, SuiteRecord, TestReport, TextSpan
+from report_parser import load_report
+from report_text import text_limits
+
+MAGIC = b"XTVC"
+# Bump whenever the layout or the model changes; older entries are then rebuilt
+FORMAT_VERSION = 6
+DIGEST_SIZE = 16
+HEADER = struct.Struct("<4sHI")
+DEFAULT_SIZE_MB = 1024
+# Separates strings in a section; XML text cannot contain NUL
+NUL = "\x00"
+
+
+class CacheError(Exception):
+    """A cache entry is corrupt or does not belong to the file"""
+
+
+def default_cache_dir():
+    base = os.environ.get("LOCALAPPDATA") if sys.platform == "win32" else None
+    base = base or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "XMLTestViewer", "cache")
+
+
+def file_digest(path):
+    """Content hash of a file, read in 1 MB blocks"""
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def report_digest(path):
+    """Content hash of a report; for a zip member, the CRC and size recorded in the archive"""
+    archive, member = split_member(path)
+    if member is None:
+        return file_digest(path)
+    import zipfile
+
+    with zipfile.ZipFile(archive) as zf:
+        info = zf.getinfo(member)
+    return f"crc32:{info.CRC:08x}:{info.file_size}"
+
+
+def pack_strings(values):
+    return NUL.join(values).encode("utf-8", "surrogatepass")
+
+
+def unpack_strings(data, count):
+    if not count:
+        return []
+    values = str(data, "utf-8", "surrogatepass").split(NUL)
+    if len(values) != count:
+        raise CacheError("string section length mismatch")
+    return values
+
+
+def pack_ints(values):
+    return array("i", values).tobytes()
+
+
+def unpack_ints(data):
+    values = array("i")
+    values.frombytes(data)
+    return values
+
+
+def pack_longs(values):
+    # File offsets can exceed 2 GB
+    return array("q", values).tobytes()
+
+
+def unpack_longs(data):
+    values = array("q")
+    values.frombytes(data)
+    return values
+
+
+def pack_spans(column):
+    return [pack_ints(column.rows), pack_ints(column.sources), pack_longs(column.starts), pack_longs(column.ends)]
+
+
+def unpack_spans(sections, column):
+    rows, sources, starts, ends = sections
+    column.rows.fromlist(unpack_ints(rows).tolist())
+    column.sources.fromlist(unpack_ints(sources).tolist())
+    column.starts = unpack_longs(starts)
+    column.ends = unpack_longs(ends)
+    if not len(column.rows) == len(column.sources) == len(column.starts) == len(column.ends):
+        raise CacheError("span column length mismatch")
+    return column
+
+
+def encode_report(report, key):
+    """Serialize a report into (header dict, list of payload sections)"""
+    classname_ids = {}
+    for classname in report.classnames:
+        classname_ids.setdefault(classname, len(classname_ids))
+
+    failure_rows = list(report.failures)
+    failures = [report.failures[row] for row in failure_rows]
+    # Bodies read on demand are stored as spans (source -1: the body is stored as text)
+    spans = [failure.content if isinstance(failure.content, TextSpan) else None for failure in failures]
+    suite_rows = array("i")
+    for suite in report.suites:
+        suite_rows.fromlist(suite.rows.tolist())
+
+    sections = [
+        pack_strings(report.names),
+        pack_strings(classname_ids),
+        pack_ints(classname_ids[classname] for classname in report.classnames),
+        report.times.tobytes(),
+        bytes(report.statuses),
+        pack_ints(failure_rows),
+        pack_strings(failure.type for failure in failures),
+        pack_strings(failure.message for failure in failures),
+        pack_strings("" if span else failure.content for span, failure in zip(spans, failures)),
+        pack_ints(span.source if span else -1 for span in spans),
+        pack_longs(span.start if span else 0 for span in spans),
+        pack_longs(span.end if span else 0 for span in spans),
+        suite_rows.tobytes(),
+    ] + pack_spans(report.system_out) + pack_spans(report.system_err) + [
+        pack_strings(failure.fingerprint for failure in failures),
+    ]
+    header = dict(key)
+    header.update({
+        "attrs": report.attrs,
+        "sources": report.sources,
+        "cases": len(report),
+        "classnames": len(classname_ids),
+        "failures": len(failure_rows),
+        "suites": [[suite.name, suite.tests, suite.failures, suite.errors, suite.skipped,
+                    suite.time, suite.source, len(suite.rows), suite.parent] for suite in report.suites],
+        "sections": [len(section) for section in sections],
+        # Messages were cut to these limits when the report was parsed
+        "text_limits": list(text_limits()),
+        "text_budget": report.text_budget.state(),
+    })
+    return header, sections
+
+
+def decode_report(header, payload, report):
+    """Fill an empty TestReport from a decoded header and payload.
+
+    Everything is decoded and checked before report is touched, so a corrupt
+    entry leaves it empty.
+    """
+    sections = []
+    offset = 0
+    for length in header["sections"]:
+        sections.append(payload[offset:offset + length])
+        offset += length
+    (names, classname_table, classname_ids, times, statuses, failure_rows,
+     types, messages, contents, span_sources, span_starts, span_ends, suite_rows) = sections[:13]
+
+    cases = header["cases"]
+    names = unpack_strings(names, cases)
+    table = [report.intern(classname) for classname in unpack_strings(classname_table, header["classnames"])]
+    classnames = [table[index] for index in unpack_ints(classname_ids)]
+    time_column = array("d")
+    time_column.frombytes(times)
+    if len(classnames) != cases or len(time_column) != cases or len(statuses) != cases:
+        raise CacheError("column length mismatch")
+
+    count = header["failures"]
+    contents = unpack_strings(contents, count)
+    span_sources = unpack_ints(span_sources)
+    span_starts = unpack_longs(span_starts)
+    span_ends = unpack_longs(span_ends)
+    if not len(span_sources) == len(span_starts) == len(span_ends) == len(contents):
+        raise CacheError("failure span length mismatch")
+    contents = [
+        content if source < 0 else TextSpan(source, start, end, STATUS_NAMES[statuses[row]])
+        for row, content, source, start, end in zip(
+            unpack_ints(failure_rows), contents, span_sources, span_starts, span_ends)
+    ]
+    failures = {
+        row: FailureRecord(*fields) for row, *fields in zip(
+            unpack_ints(failure_rows),
+            unpack_strings(types, count),
+            unpack_strings(messages, count),
+            contents,
+            (report.intern(value) for value in unpack_strings(sections[21], count))
+        )
+    }
+    system_out = unpack_spans(sections[13:17], SpanColumn("system-out"))
+    system_err = unpack_spans(sections[17:21], SpanColumn("system-err"))
+
+    rows = unpack_ints(suite_rows)
+    suites = []
+    start = 0
+    for name, tests, failure_count, errors, skipped, time, source, row_count, parent in header["suites"]:
+        suite = SuiteRecord(report.intern(name), tests, failure_count, errors, skipped, time, source, parent)
+        suite.rows.fromlist(rows[start:start + row_count].tolist())
+        start += row_count
+        if parent >= len(suites):
+            raise CacheError("suite nested in a later suite")
+        if parent >= 0:
+            suite.position = len(suites[parent].children)
+            suites[parent].children.append(len(suites))
+        suites.append(suite)
+    if start != len(rows) or len(failures) != count:
+        raise CacheError("suite rows do not add up")
+    budget_state = header["text_budget"]
+    if len(budget_state) != 4:
+        raise CacheError("text budget length mismatch")
+
+    report.attrs = header["attrs"]
+    report.sources = header["sources"]
+    report.names = names
+    report.classnames = classnames
+    report.times = time_column
+    report.statuses[:] = statuses
+    report.failures = failures
+    report.system_out = system_out
+    report.system_err = system_err
+    report.suites = suites
+    report.text_budget.restore(budget_state)
+    return report
+
+
+class ReportCache:
+    def __init__(self, directory=None, size_limit=None):
+        self.directory = directory or os.environ.get("XMLVIEWER_CACHE_DIR") or default_cache_dir()
+        if size_limit is None:
+            size_limit = int(float(os.environ.get("XMLVIEWER_CACHE_SIZE_MB", DEFAULT_SIZE_MB)) * 1024 * 1024)
+        self.size_limit = size_limit
+
+    @property
+    def enabled(self):
+        return self.size_limit > 0
+
+    def entry_path(self, filepath):
+        key = os.path.normcase(os.path.abspath(filepath))
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8", "surrogatepass")).hexdigest() + ".cache")
+
+    def file_key(self, filepath):
+        # A zip member is as current as its archive
+        stat = os.stat(disk_path(filepath))
+        return {
+            "path": os.path.abspath(filepath),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+
+    def load(self, filepath, report):
+        """Fill report from the cache entry for filepath; return False on a miss"""
+        if not self.enabled:
+            return False
+        entry = self.entry_path(filepath)
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+        except OSError:
+            return False
+
+        try:
+            header, payload = self.read_entry(data)
+            key = self.file_key(filepath)
+            if any(header.get(name) != value for name, value in key.items()):
+                raise CacheError("file changed since it was cached")
+            if header.get("text_limits") != list(text_limits()):
+                raise CacheError("cached with other text limits")
+            if header.get("hash") != report_digest(filepath):
+                raise CacheError("content hash mismatch")
+            if len(header["sources"]) != 1:
+                raise CacheError("entry of several files")
+            decode_report(header, payload, report)
+            # Texts are read back through the source path; the stored one may be relative
+            # to another working directory, so the file is named as the caller names it
+            report.sources = [filepath]
+        except (CacheError, ValueError, KeyError, IndexError, TypeError, UnicodeDecodeError, OSError,
+                *archive_errors()):
+            # Stale or corrupt: drop it, the caller parses and stores a fresh entry
+            self.remove(entry)
+            return False
+
+        # Most recently used entries survive eviction
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return True
+
+    def read_entry(self, data):
+        import json
+
+        if len(data) < HEADER.size + DIGEST_SIZE:
+            raise CacheError("truncated entry")
+        # Slices of a memoryview, so the payload is not copied
+        view = memoryview(data)
+        body, digest = view[:-DIGEST_SIZE], view[-DIGEST_SIZE:]
+        if hashlib.blake2b(body, digest_size=DIGEST_SIZE).digest() != digest:
+            raise CacheError("checksum mismatch")
+        magic, version, header_size = HEADER.unpack_from(body)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise CacheError("unknown format")
+        start = HEADER.size + header_size
+        header = json.loads(bytes(body[HEADER.size:start]))
+        return header, body[start:]
+
+    def store(self, filepath, report):
+        """Write the cache entry for a freshly parsed file, then enforce the size limit"""
+        import json
+        import tempfile
+
+        if not self.enabled:
+            return
+        try:
+            key = self.file_key(filepath)
+            key["hash"] = report_digest(filepath)
+            header, sections = encode_report(report, key)
+            header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+            digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in [HEADER.pack(MAGIC, FORMAT_VERSION, len(header_bytes)), header_bytes] + sections:
+                        digest.update(chunk)
+                        f.write(chunk)
+                    f.write(digest.digest())
+                # Atomic, so concurrent loaders never see a half-written entry
+                os.replace(tmp_path, self.entry_path(filepath))
+            except OSError:
+                self.remove(tmp_path)
+                raise
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its size limit"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(".cache"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.size_limit:
+                break
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_report_cached(filepath, cache=None):
+    """Parse filepath, going through the cache; usable in worker processes"""
+    cache = cache or ReportCache()
+    report = TestReport()
+    if cache.load(filepath, report):
+        return report
+    report = load_report(filepath)
+    cache.store(filepath, report)
+    return report
@@ -0,0 +1,178 @@
+"""
+Run-to-run comparison.
+Matches the test cases of a baseline and a candidate report by
+(classname, name) with one dict built over the baseline, so comparing two
+runs of a million cases is a single pass over each. Reports the cases that
+started failing, got fixed, appeared, disappeared or became slower.
+"""
+
+from report_model import ERROR, FAILURE, PASSED, STATUS_NAMES
+
+# Change kinds, in the order they are listed
+CHANGES = ("new_failure", "fixed", "added", "removed", "slower")
+CHANGE_TITLES = {
+    "new_failure": "Newly failing",
+    "fixed": "Newly passing",
+    "added": "Added",
+    "removed": "Removed",
+    "slower": "Slower",
+}
+
+# A case counts as slower when its time grows by more than this fraction...
+SLOWER_RATIO = 0.5
+# ...and by more than this many seconds, so that millisecond jitter is ignored
+SLOWER_SECONDS = 0.1
+
+
+def case_index(report):
+    """Row of every case by (classname, name).
+
+    Cases that share a name (a parameterized test reported twice, or the
+    same suite in two merged files) get the key (classname, name, n) for
+    their n-th repeat, so that they are paired in report order.
+    """
+    index = {}
+    repeats = {}
+    for row, key in enumerate(zip(report.classnames, report.names)):
+        if key in index:
+            n = repeats.get(key, 0) + 1
+            repeats[key] = n
+            key = key + (n,)
+        index[key] = row
+    return index
+
+
+def is_failed(status):
+    return status == FAILURE or status == ERROR
+
+
+class ReportDiff:
+    """Changes between two reports, as (baseline row, candidate row) pairs per change kind.
+
+    Added cases have no baseline row and removed cases no candidate row (None).
+    """
+
+    def __init__(self, baseline, candidate, slower_ratio=SLOWER_RATIO, slower_seconds=SLOWER_SECONDS):
+        self.baseline = baseline
+        self.candidate = candidate
+        self.slower_ratio = slower_ratio
+        self.slower_seconds = slower_seconds
+        self.changes = {change: [] for change in CHANGES}
+        # Cases that failed in both runs
+        self.still_failing = 0
+        self.compare()
+
+    def compare(self):
+        baseline, candidate = self.baseline, self.candidate
+        new_failures, fixed, added, slower = (
+            self.changes[change] for change in ("new_failure", "fixed", "added", "slower"))
+        base_statuses, base_times = baseline.statuses, baseline.times
+        statuses, times = candidate.statuses, candidate.times
+        ratio, seconds = 1 + self.slower_ratio, self.slower_seconds
+
+        # Baseline rows left over after the join were removed
+        remaining = case_index(baseline)
+        for key, row in case_index(candidate).items():
+            base_row = remaining.pop(key, None)
+            if base_row is None:
+                added.append((None, row))
+                continue
+
+            status, base_status = statuses[row], base_statuses[base_row]
+            if is_failed(status):
+                if is_failed(base_status):
+                    self.still_failing += 1
+                else:
+                    new_failures.append((base_row, row))
+            elif status == PASSED and is_failed(base_status):
+                fixed.append((base_row, row))
+
+            time, base_time = times[row], base_times[base_row]
+            if time - base_time > seconds and time > base_time * ratio:
+                slower.append((base_row, row))
+
+        self.changes["removed"] = [(row, None) for row in remaining.values()]
+        # Worst regressions first
+        slower.sort(key=lambda pair: base_times[pair[0]] - times[pair[1]])
+
+    def counts(self):
+        """Number of cases per change kind"""
+        return {change: len(pairs) for change, pairs in self.changes.items()}
+
+    def entry(self, change, base_row, row):
+        """One change as a dict, in the shape of the JSON output"""
+        report, case_row = (self.candidate, row) if row is not None else (self.baseline, base_row)
+        entry = {
+            "change": change,
+            "name": report.names[case_row],
+            "classname": report.classnames[case_row],
+            "baseline_status": STATUS_NAMES[self.baseline.statuses[base_row]] if base_row is not None else None,
+            "status": STATUS_NAMES[self.candidate.statuses[row]] if row is not None else None,
+            "baseline_time": self.baseline.times[base_row] if base_row is not None else None,
+            "time": self.candidate.times[row] if row is not None else None,
+        }
+        failure = report.failures.get(case_row)
+        if failure is not None:
+            entry["failure"] = {"type": failure.type, "message": failure.message}
+        return entry
+
+    def iter_entries(self, changes=CHANGES):
+        for change in changes:
+            for base_row, row in self.changes[change]:
+                yield self.entry(change, base_row, row)
+
+
+def change_line(entry):
+    """One change as a line of the headless summary"""
+    name = f"{entry['classname']}.{entry['name']}" if entry["classname"] else entry["name"]
+    if entry["change"] == "slower":
+        detail = f"{entry['baseline_time']:.3f}s -> {entry['time']:.3f}s"
+    elif entry["change"] in ("added", "removed"):
+        detail = entry["status"] or entry["baseline_status"]
+    else:
+        detail = f"{entry['baseline_status']} -> {entry['status']}"
+    message = entry.get("failure", {}).get("message", "").split("\n", 1)[0]
+    if message and entry["change"] != "slower":
+        detail += f": {message}"
+    return f"  {name} ({detail})"
+
+
+def iter_summary_lines(diff):
+    counts = diff.counts()
+    yield ", ".join(f"{counts[change]} {CHANGE_TITLES[change].lower()}" for change in CHANGES) + \
+        f", {diff.still_failing} still failing\n"
+    for change in CHANGES:
+        if not counts[change]:
+            continue
+        yield f"{CHANGE_TITLES[change]}:\n"
+        for entry in diff.iter_entries((change,)):
+            yield change_line(entry) + "\n"
+
+
+def iter_json_chunks(diff):
+    """Yield every change as a JSON array; joined, it equals json.dumps(entries, indent=2) + newline"""
+    import json
+
+    first = True
+    for entry in diff.iter_entries():
+        body = json.dumps(entry, indent=2).replace("\n", "\n  ")
+        yield ("[\n  " if first else ",\n  ") + body
+        first = False
+    yield "[]\n" if first else "\n]\n"
+
+
+def iter_jsonl_lines(diff):
+    import json
+
+    for entry in diff.iter_entries():
+        yield json.dumps(entry) + "\n"
+
+
+# Output formats of write_diff
+DIFF_FORMATS = {"summary": iter_summary_lines, "json": iter_json_chunks, "jsonl": iter_jsonl_lines}
+
+
+def write_diff(diff, out, format="summary"):
+    """Stream a diff to a text file object as a summary, JSON or JSON Lines"""
+    for chunk in DIFF_FORMATS[format](diff):
+        out.write(chunk)
@@ -0,0 +1,236 @@
+"""
+Failure export formats.
+Shared by the clipboard copy and the "Export all failures" action in the
+viewer, the headless command line and the report server. Failures are dicts
+in the shape produced by TestReport.testcase_dict, optionally with the names
+of other cases that fail the same way under "same_failure". Every format is
+produced one failure at a time, so exporting all failures of a report takes
+constant memory.
+"""
+
+import re
+
+from report_model import ERROR
+
+# Formats of write_failures, and the file extensions that select them
+FORMATS = ("yaml", "json", "jsonl", "junit")
+EXTENSIONS = {".yaml": "yaml", ".yml": "yaml", ".json": "json", ".jsonl": "jsonl", ".xml": "junit"}
+
+# Default truncation of failure content: lines in YAML, characters in JSON
+YAML_MAX_LINES = 50
+JSON_MAX_CHARS = 2000
+
+# Characters that cannot appear in a YAML literal block: non-printables and
+# line breaks other than \n. Listed rather than given as the complement of the
+# printable ranges, which takes ten times longer to compile at import.
+YAML_UNSAFE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f-\x9f\u2028\u2029\ud800-\udfff\ufeff\ufffe\uffff]")
+# Characters escaped in a double-quoted YAML scalar: the above, tab, newline, quote and backslash
+YAML_ESCAPE = re.compile(r"[\x00-\x1f\x22\x5c\x7f-\x9f\u2028\u2029\ud800-\udfff\ufeff\ufffe\uffff]")
+YAML_ESCAPES = {
+    "\\": "\\\\", '"': '\\"', "\n": "\\n", "\t": "\\t", "\r": "\\r", "\x00": "\\0",
+    "\x85": "\\N", "\u2028": "\\L", "\u2029": "\\P",
+}
+# Escaped beyond & < > so that parsing gives back the same text
+XML_ATTR_ENTITIES = {"\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+XML_TEXT_ENTITIES = {"\r": "&#13;"}
+
+
+def export_format(path):
+    """Export format for a file name, by extension; YAML if unknown"""
+    for extension, format in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return format
+    return "yaml"
+
+
+def truncate(content, max_lines=None, max_chars=None):
+    """Cut content to its first max_lines lines and max_chars characters; None means no limit.
+
+    Returns (text, truncated). Lines are found without splitting the whole text.
+    """
+    truncated = False
+    if max_lines is not None:
+        end = -1
+        for _ in range(max_lines):
+            end = content.find("\n", end + 1)
+            if end == -1:
+                break
+        else:
+            truncated = end + 1 < len(content)
+            content = content[:end]
+    if max_chars is not None and len(content) > max_chars:
+        content = content[:max_chars]
+        truncated = True
+    return content, truncated
+
+
+def yaml_escape_char(match):
+    char = match.group()
+    escaped = YAML_ESCAPES.get(char)
+    if escaped:
+        return escaped
+    code = ord(char)
+    if code < 0x100:
+        return f"\\x{code:02x}"
+    if code < 0x10000:
+        return f"\\u{code:04x}"
+    return f"\\U{code:08x}"
+
+
+def yaml_quote(value):
+    """value as a double-quoted YAML scalar"""
+    return '"' + YAML_ESCAPE.sub(yaml_escape_char, value) + '"'
+
+
+def yaml_block(key, text, indent):
+    """A "key: text" line pair as a literal block scalar, or quoted when text cannot be one"""
+    if YAML_UNSAFE.search(text):
+        return f"{indent}{key}: {yaml_quote(text)}"
+
+    # Chomping keeps the trailing line breaks exactly; the indentation indicator is
+    # needed when the text itself starts with spaces
+    chomping = "+" if text.endswith("\n\n") else "" if text.endswith("\n") else "-"
+    indentation = "2" if text.lstrip("\n").startswith(" ") else ""
+    if text.endswith("\n"):
+        text = text[:-1]
+    body = f"\n{indent}  ".join(text.split("\n"))
+    return f"{indent}{key}: |{indentation}{chomping}\n{indent}  {body}"
+
+
+def yaml_failure(f, max_lines=YAML_MAX_LINES, max_chars=None):
+    """One failure as an item of the YAML failures list"""
+    lines = [f"  - name: {yaml_quote(f['name'])}"]
+    if f.get('classname'):
+        lines.append(f"    classname: {yaml_quote(f['classname'])}")
+    if f.get('failure'):
+        lines.append("    failure:")
+        lines.append(f"      type: {yaml_quote(f['failure']['type'])}")
+        lines.append(f"      message: {yaml_quote(f['failure']['message'])}")
+        content, truncated = truncate(f['failure']['content'], max_lines, max_chars)
+        if content:
+            if truncated:
+                content += "\n... (truncated)"
+            lines.append(yaml_block("stacktrace", content, "      "))
+    others = f.get('same_failure')
+    if others:
+        lines.append(f"    same_failure:  # {len(others)} more test(s) failing the same way")
+        lines.extend(f"      - {yaml_quote(name)}" for name in others)
+    return "\n".join(lines)
+
+
+def iter_yaml_chunks(failures, max_lines=YAML_MAX_LINES, max_chars=None):
+    """Yield the YAML report one failure at a time"""
+    first = True
+    for f in failures:
+        if first:
+            yield "# Test Failures Report\nfailures:\n"
+            first = False
+        yield yaml_failure(f, max_lines, max_chars) + "\n"
+    if first:
+        yield "# Test Failures Report\nfailures: []\n"
+
+
+def json_item(f, max_lines=None, max_chars=JSON_MAX_CHARS):
+    item = {
+        "name": f['name'],
+        "classname": f.get('classname', ''),
+    }
+    if f.get('failure'):
+        item["failure"] = {
+            "message": f['failure']['message'],
+            "type": f['failure']['type'],
+            "content": truncate(f['failure']['content'], max_lines, max_chars)[0]
+        }
+    if f.get('same_failure'):
+        item["same_failure"] = f['same_failure']
+    return item
+
+
+def iter_json_chunks(failures, max_lines=None, max_chars=JSON_MAX_CHARS):
+    """Yield the JSON report piece by piece; joined, it equals json.dumps(items, indent=2) + newline"""
+    import json
+
+    first = True
+    for f in failures:
+        body = json.dumps(json_item(f, max_lines, max_chars), indent=2).replace("\n", "\n  ")
+        yield ("[\n  " if first else ",\n  ") + body
+        first = False
+    yield "[]\n" if first else "\n]\n"
+
+
+def iter_jsonl_lines(failures, max_lines=None, max_chars=JSON_MAX_CHARS):
+    """Yield one JSON object per line (JSON Lines), in the item shape of the JSON report"""
+    import json
+
+    for f in failures:
+        # ASCII-only, so that no Unicode line separator can split a record
+        yield json.dumps(json_item(f, max_lines, max_chars)) + "\n"
+
+
+def junit_testcase(f, max_lines=None, max_chars=None):
+    # Imported here: xml.sax.saxutils pulls in urllib and http, which slow down the viewer's startup
+    from xml.sax.saxutils import escape, quoteattr
+
+    failure = f['failure']
+    content, truncated = truncate(failure['content'], max_lines, max_chars)
+    if truncated:
+        content += "\n... (truncated)"
+    tag = f['status']
+    return (
+        f"    <testcase name={quoteattr(f['name'], XML_ATTR_ENTITIES)} "
+        f"classname={quoteattr(f['classname'], XML_ATTR_ENTITIES)} time=\"{f['time']}\">\n"
+        f"      <{tag} message={quoteattr(failure['message'], XML_ATTR_ENTITIES)} "
+        f"type={quoteattr(failure['type'], XML_ATTR_ENTITIES)}>{escape(content, XML_TEXT_ENTITIES)}</{tag}>\n"
+        f"    </testcase>\n"
+    )
+
+
+def iter_junit_chunks(reports, max_lines=None, max_chars=None, rows=None):
+    """Yield a JUnit XML report holding only the failed and errored cases of reports.
+
+    Each suite with failures becomes a <testsuite> with the counts of the
+    cases it contains; it is written one test case at a time. With rows (a
+    set, for a single report), only the failed cases among those rows.
+    """
+    from xml.sax.saxutils import quoteattr
+
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n'
+    for report in reports:
+        for suite in report.suites:
+            # Nested suites are written as suites of their own
+            failed = [row for row in suite.rows if row in report.failures and (rows is None or row in rows)]
+            if not failed:
+                continue
+            errors = sum(1 for row in failed if report.statuses[row] == ERROR)
+            yield (f"  <testsuite name={quoteattr(suite.name, XML_ATTR_ENTITIES)} tests=\"{len(failed)}\" "
+                   f"failures=\"{len(failed) - errors}\" errors=\"{errors}\">\n")
+            for f in report.iter_failures(failed):
+                yield junit_testcase(f, max_lines, max_chars)
+            yield "  </testsuite>\n"
+    yield "</testsuites>\n"
+
+
+def format_as_yaml(failures):
+    """Format failures as YAML for better AI readability"""
+    return ''.join(iter_yaml_chunks(failures))[:-1]
+
+
+def format_as_json(failures):
+    """Format failures as JSON"""
+    return ''.join(iter_json_chunks(failures))[:-1]
+
+
+def write_failures(reports, out, format="yaml", **limits):
+    """Stream the failures of reports to a text file object in one of FORMATS.
+
+    limits are the max_lines and max_chars truncation of failure content;
+    omitted ones keep the format's default.
+    """
+    if format == "junit":
+        chunks = iter_junit_chunks(reports, **limits)
+    else:
+        failures = (f for report in reports for f in report.iter_failures())
+        writer = {"yaml": iter_yaml_chunks, "json": iter_json_chunks, "jsonl": iter_jsonl_lines}[format]
+        chunks = writer(failures, **limits)
+    for chunk in chunks:
+        out.write(chunk)
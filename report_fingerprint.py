@@ -0,0 +1,46 @@
+"""
+Failure fingerprints.
+Failures that share a cause (a broken fixture failing thousands of cases)
+differ only in numbers, addresses, paths and the test's own frames below
+the shared ones. A fingerprint is a short hash of the failure type, the
+message with those details masked and the top frames of the stack trace,
+so that such failures can be grouped. It only needs the start of the
+trace, which the parser keeps while it streams past (see report_parser.py).
+"""
+
+import hashlib
+import re
+
+# Characters of a failure body the parser keeps for fingerprinting
+FINGERPRINT_CHARS = 4096
+# Stack frames that go into a fingerprint
+FINGERPRINT_FRAMES = 5
+
+ADDRESS = re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+# Windows and POSIX paths with at least two components
+PATH = re.compile(r"(?:[A-Za-z]:)?(?:[\\/][\w.$@+-]+){2,}[\\/]?")
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# Stack frame lines of Java/Kotlin/C# ("at ..."), Python ('File "...", line N'), JavaScript and gdb ("#N ...")
+FRAME = re.compile(r'^\s*(?:at |File "|#\d+ )')
+
+
+def normalize(text):
+    """text with addresses, paths and numbers masked and whitespace collapsed"""
+    text = ADDRESS.sub("<addr>", text)
+    text = PATH.sub("<path>", text)
+    text = NUMBER.sub("<n>", text)
+    return " ".join(text.split())
+
+
+def top_frames(trace, count=FINGERPRINT_FRAMES):
+    """The first count stack frame lines of trace, or its first lines if none look like frames"""
+    lines = [line for line in trace.split("\n") if line.strip()]
+    frames = [line for line in lines if FRAME.match(line)]
+    return (frames or lines)[:count]
+
+
+def fingerprint(type, message, trace):
+    """Short hash identifying failures with the same cause"""
+    parts = [type.strip(), normalize(message)]
+    parts.extend(normalize(frame) for frame in top_frames(trace[:FINGERPRINT_CHARS]))
+    return hashlib.blake2b("\x00".join(parts).encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
@@ -0,0 +1,285 @@
+"""
+Local test history.
+Records the suites and cases of loaded reports in a SQLite database, so that
+the outcome of a test can be followed across runs: how often it flips
+between passing and failing, how its duration moves and for how many runs
+it has been failing. Recording is opt-in; a report is ingested with a
+handful of set-based statements inside one transaction.
+
+Settings (environment variables):
+    XMLVIEWER_HISTORY_DB   database file (default history.sqlite3 next to the parse cache)
+"""
+
+import os
+import sqlite3
+import time
+
+from report_archive import disk_path
+from report_cache import default_cache_dir
+from report_model import ERROR, FAILURE, PASSED, SKIPPED
+
+# Runs of a test that its statistics are computed over, most recent first
+HISTORY_RUNS = 50
+# Runs in each of the two windows that duration percentiles are compared between
+TREND_RUNS = 10
+# PRAGMA user_version of an up-to-date database; 1: one result per test and run
+SCHEMA_VERSION = 1
+# Status of a test that ran several times in one run (merged shards, reruns, parametrized
+# duplicates): an error over a failure over a pass over a skip
+WORST_STATUS = f"COALESCE(NULLIF(MAX(CASE status WHEN {SKIPPED} THEN -1 ELSE status END), -1), {SKIPPED})"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    run_time REAL NOT NULL,
+    recorded_at REAL NOT NULL,
+    sources TEXT NOT NULL,
+    tests INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    skipped INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (run_time);
+CREATE TABLE IF NOT EXISTS suites (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    tests INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS suites_run ON suites (run_id);
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    classname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    UNIQUE (classname, name)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    test_id INTEGER NOT NULL REFERENCES tests (id),
+    status INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_test ON results (test_id, run_id);
+"""
+
+
+def default_history_path():
+    return os.path.join(os.path.dirname(default_cache_dir()), "history.sqlite3")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_key(report):
+    """Identity of a report run: its files with their size and modification time.
+
+    Returns (key, run time), or None when a file is gone; the run time is
+    that of the newest file, which is when the run finished.
+    """
+    parts = []
+    mtimes = []
+    for path in report.sources:
+        try:
+            stat = os.stat(disk_path(path))
+        except OSError:
+            return None
+        parts.append(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}")
+        mtimes.append(stat.st_mtime)
+    return "\n".join(sorted(parts)), max(mtimes)
+
+
+class TestStats:
+    """History of one test over its most recent runs"""
+
+    def __init__(self, results):
+        # (status, time) per run, most recent first
+        self.results = results
+        self.runs = len(results)
+        outcomes = [status in (FAILURE, ERROR) for status, _ in results if status != SKIPPED]
+        self.pass_rate = outcomes.count(False) / len(outcomes) if outcomes else None
+        # Changes between passing and failing from one run to the next
+        self.flips = sum(1 for newer, older in zip(outcomes, outcomes[1:]) if newer != older)
+        self.flakiness = self.flips / (len(outcomes) - 1) if len(outcomes) > 1 else 0.0
+
+        self.failing_streak = 0
+        for status, _ in results:
+            if status not in (FAILURE, ERROR):
+                break
+            self.failing_streak += 1
+
+        times = [duration for status, duration in results if status != SKIPPED]
+        recent, previous = times[:TREND_RUNS], times[TREND_RUNS:2 * TREND_RUNS]
+        self.p50 = percentile(recent, 0.5) if recent else None
+        self.p95 = percentile(recent, 0.95) if recent else None
+        self.previous_p50 = percentile(previous, 0.5) if previous else None
+        self.previous_p95 = percentile(previous, 0.95) if previous else None
+
+
+class HistoryStore:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("XMLVIEWER_HISTORY_DB") or default_history_path()
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path)
+            # Readers (the viewer) are not blocked while a report is being recorded
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self.merge_duplicate_results(connection)
+            self.connection = connection
+        return self.connection
+
+    def merge_duplicate_results(self, connection):
+        """Fold the results that earlier versions stored per case into one per test and run"""
+        with connection:
+            connection.execute(
+                "CREATE TEMP TABLE merged AS SELECT run_id, test_id, "
+                f"{WORST_STATUS} AS status, SUM(time) AS time FROM results GROUP BY run_id, test_id"
+            )
+            connection.execute("DELETE FROM results")
+            connection.execute("INSERT INTO results (run_id, test_id, status, time) SELECT * FROM temp.merged")
+            connection.execute("DROP TABLE temp.merged")
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, report):
+        """Store a report as one run; return False if the same files were recorded before"""
+        identity = run_key(report)
+        if identity is None or not len(report):
+            return False
+        key, run_time = identity
+        connection = self.connect()
+        counts = report.status_counts()
+
+        with connection:
+            if connection.execute("SELECT 1 FROM runs WHERE key = ?", (key,)).fetchone():
+                return False
+            run_id = connection.execute(
+                "INSERT INTO runs (key, run_time, recorded_at, sources, tests, failures, errors, skipped) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, run_time, time.time(), "\n".join(report.sources), len(report),
+                 counts["failure"], counts["error"], counts["skipped"])
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO suites (run_id, name, tests, failures, errors, skipped, time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((run_id, suite.name, suite.tests, suite.failures, suite.errors, suite.skipped, suite.time)
+                 for suite in report.suites)
+            )
+
+            # Cases go through a staging table, so that test ids are resolved by two joins
+            # instead of one lookup per case
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS staging (classname TEXT, name TEXT, status INTEGER, time REAL)"
+            )
+            connection.execute("DELETE FROM staging")
+            connection.executemany(
+                "INSERT INTO staging VALUES (?, ?, ?, ?)",
+                zip(report.classnames, report.names, report.statuses, report.times)
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO tests (classname, name) SELECT DISTINCT classname, name FROM staging"
+            )
+            # One result per test: a test can appear several times in a run, and the
+            # statistics count results as runs
+            connection.execute(
+                "INSERT INTO results (run_id, test_id, status, time) "
+                f"SELECT ?, tests.id, {WORST_STATUS}, SUM(staging.time) FROM staging "
+                "JOIN tests ON tests.classname = staging.classname AND tests.name = staging.name "
+                "GROUP BY tests.id",
+                (run_id,)
+            )
+            connection.execute("DELETE FROM staging")
+        return True
+
+    def test_stats(self, classname, name, runs=HISTORY_RUNS):
+        """TestStats of a test over its last runs, or None if it was never recorded"""
+        if not os.path.exists(self.path):
+            return None
+        results = self.connect().execute(
+            "SELECT results.status, results.time FROM results "
+            "JOIN runs ON runs.id = results.run_id "
+            "WHERE results.test_id = (SELECT id FROM tests WHERE classname = ? AND name = ?) "
+            "ORDER BY runs.run_time DESC, runs.id DESC LIMIT ?",
+            (classname, name, runs)
+        ).fetchall()
+        return TestStats(results) if results else None
+
+    def failing_tests(self, min_runs, limit=100):
+        """(classname, name, streak) of tests that failed in each of their last min_runs runs or more"""
+        connection = self.connect()
+        found = []
+        for test_id, classname, name in connection.execute(
+                "SELECT DISTINCT tests.id, tests.classname, tests.name FROM results "
+                "JOIN tests ON tests.id = results.test_id "
+                "WHERE results.run_id = (SELECT id FROM runs ORDER BY run_time DESC, id DESC LIMIT 1) "
+                "AND results.status IN (?, ?)", (FAILURE, ERROR)).fetchall():
+            stats = TestStats(connection.execute(
+                "SELECT results.status, results.time FROM results JOIN runs ON runs.id = results.run_id "
+                "WHERE results.test_id = ? ORDER BY runs.run_time DESC, runs.id DESC LIMIT ?",
+                (test_id, HISTORY_RUNS)
+            ).fetchall())
+            if stats.failing_streak >= min_runs:
+                found.append((classname, name, stats.failing_streak))
+        found.sort(key=lambda test: -test[2])
+        return found[:limit]
+
+    def flaky_tests(self, limit=20, runs=HISTORY_RUNS):
+        """(classname, name, flakiness, flips) of the tests that flip most often over the last runs"""
+        connection = self.connect()
+        run_ids = [run_id for run_id, in connection.execute(
+            "SELECT id FROM runs ORDER BY run_time DESC, id DESC LIMIT ?", (runs,))]
+        if len(run_ids) < 2:
+            return []
+        # Only tests that both passed and failed in the window can have flipped
+        candidates = connection.execute(
+            f"SELECT test_id FROM results WHERE run_id IN ({','.join('?' * len(run_ids))}) "
+            "AND status != ? GROUP BY test_id "
+            "HAVING MIN(status IN (?, ?)) = 0 AND MAX(status IN (?, ?)) = 1",
+            run_ids + [SKIPPED, FAILURE, ERROR, FAILURE, ERROR]
+        ).fetchall()
+        found = []
+        for test_id, in candidates:
+            classname, name = connection.execute(
+                "SELECT classname, name FROM tests WHERE id = ?", (test_id,)).fetchone()
+            stats = self.test_stats(classname, name, runs)
+            found.append((classname, name, stats.flakiness, stats.flips))
+        found.sort(key=lambda test: (-test[2], -test[3]))
+        return found[:limit]
+
+
+def stats_lines(stats):
+    """The history of a test as lines of text for the details panel or the console"""
+    lines = [f"Runs: {stats.runs}" + (f" | Pass rate: {stats.pass_rate:.0%}" if stats.pass_rate is not None else "")]
+    lines.append(f"Flakiness: {stats.flakiness:.0%} ({stats.flips} pass/fail flips)")
+    if stats.failing_streak:
+        lines.append(f"Failing for {stats.failing_streak} consecutive run(s)")
+    if stats.p50 is not None:
+        line = f"Duration p50/p95: {stats.p50:.3f}s / {stats.p95:.3f}s"
+        if stats.previous_p50 is not None:
+            line += f" (previous runs: {stats.previous_p50:.3f}s / {stats.previous_p95:.3f}s)"
+        lines.append(line)
+    symbols = {PASSED: "✓", FAILURE: "✗", ERROR: "!", SKIPPED: "-"}
+    lines.append("Recent: " + "".join(symbols.get(status, "?") for status, _ in stats.results[:TREND_RUNS * 2]))
+    return lines
@@ -0,0 +1,479 @@
+"""
+Background report loading.
+Parses reports on worker threads (and, for several files, worker processes)
+and hands batches of events to the UI thread through a bounded queue.
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from report_archive import (ReportFile, archive_errors, disk_path, is_archive, is_plain, is_report_name,
+                            list_members, member_path, report_size)
+from report_cache import ReportCache, load_report_cached
+from report_model import TestReport
+from report_parser import READ_SIZE, ReportBuilder, StreamParser, iter_report, load_report
+from report_profile import profiler
+from report_search import SearchIndex
+
+# Parser events handed over per queue item
+BATCH_SIZE = 500
+# Batches buffered ahead of the UI before the worker blocks
+QUEUE_SIZE = 64
+# Seconds between checks of a watched file or directory
+WATCH_INTERVAL = 1.0
+# Bytes at the start of a followed file and just before the parsed offset that are compared
+# when it changes, to tell appended data from a file written again from the start
+CHECK_BYTES = 4096
+
+
+def collect_report_files(paths):
+    """Expand directories into the report files below them and zip archives into their reports.
+
+    Reports are XML files, possibly compressed (see report_archive.py);
+    other explicit files are kept as given.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                found.extend(os.path.join(dirpath, name) for name in filenames
+                             if is_report_name(name) or is_archive(name))
+            for found_path in sorted(found):
+                if not is_archive(found_path):
+                    files.append(found_path)
+                    continue
+                try:
+                    files.extend(archive_reports(found_path))
+                except (OSError, *archive_errors()):
+                    continue  # Not a complete archive, e.g. one still being written
+        elif is_archive(path):
+            files.extend(archive_reports(path))
+        else:
+            files.append(path)
+    return files
+
+
+def archive_reports(archive):
+    return [member_path(archive, name) for name, _, _ in list_members(archive)]
+
+
+def load_merged(filepaths, load=load_report_cached):
+    """Parse report files one after another into a single TestReport, one source per file"""
+    report = TestReport()
+    for path in filepaths:
+        try:
+            parsed = load(path)
+        except ET.ParseError as e:
+            raise ET.ParseError(f"{path}: {e}")
+        source = len(report.sources)
+        report.sources.append(path)
+        report.merge_report(parsed, source)
+    return report
+
+
+class LoaderThread(threading.Thread):
+    """Common queue, progress and cancellation handling of the loaders.
+
+    The worker builds a TestReport and announces what it appended through
+    queue items ("events", [event, ...]), ("done", None) or
+    ("error", (title, message)), where an event is ("file", source_index),
+    ("suite", suite_index), ("suite_update", suite_index) or
+    ("testcase", (suite_index, row)). A nested suite is announced after its
+    parent, and every suite again with "suite_update" once its counts are
+    final. Rows are only ever appended, so the UI can read announced indices
+    while parsing continues. The worker never
+    touches Tk; the UI drains the queue from the main loop.
+    """
+
+    def __init__(self, title):
+        super().__init__(daemon=True)
+        self.title = title
+        self.total_bytes = 0
+        self.bytes_read = 0
+        self.cases_parsed = 0
+        self.report = TestReport()
+        self.index = None
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.cancel_event = threading.Event()
+        # Events not yet handed to the queue
+        self.batch = []
+        # Seconds spent blocked on a full queue, waiting for the UI
+        self.waited = 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def run(self):
+        try:
+            if self.load() and self.flush():
+                # Index for the search box, built here to keep it off the UI thread
+                with profiler.phase("search_index") as span:
+                    self.index = SearchIndex(self.report)
+                    span.items = len(self.report)
+                self.put(("done", None))
+                with profiler.phase("cache_store"):
+                    self.save()
+        except ET.ParseError as e:
+            self.put(("error", ("Parse Error", f"Failed to parse XML: {e}")))
+        except Exception as e:
+            self.put(("error", ("Error", f"Failed to load file: {e}")))
+
+    def load(self):
+        """Fill the report, emitting events; return False if cancelled"""
+        raise NotImplementedError
+
+    def save(self):
+        """Called once the UI has the complete report"""
+
+    def emit(self, event):
+        """Queue an event, flushing full batches; return False if cancelled"""
+        self.batch.append(event)
+        if len(self.batch) < BATCH_SIZE:
+            return True
+        batch, self.batch = self.batch, []
+        return self.put(("events", batch))
+
+    def flush(self):
+        """Queue the events of a partial batch; return False if cancelled"""
+        batch, self.batch = self.batch, []
+        return self.put(("events", batch))
+
+    def merge(self, parsed, path, by_name=False):
+        """Merge a separately parsed report file into the report and announce it"""
+        report = self.report
+        source = len(report.sources)
+        report.sources.append(path)
+        merged = report.merge_report(parsed, source, by_name)
+
+        # The file node is announced once its totals are known
+        if not by_name and not self.emit(("file", source)):
+            return False
+        for target, created, rows in merged:
+            if not self.emit(("suite" if created else "suite_update", target)):
+                return False
+            for row in rows:
+                if not self.emit(("testcase", (target, row))):
+                    return False
+        self.cases_parsed += len(parsed)
+        return True
+
+    def put(self, item):
+        """Block until the UI has room for item; give up if the load is cancelled"""
+        start = time.perf_counter()
+        try:
+            while not self.cancelled:
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.waited += time.perf_counter() - start
+
+
+class ReportLoader(LoaderThread):
+    """Streams a single report, announcing suites and cases as they are read.
+
+    An unchanged file that was loaded before is read from the parse cache instead.
+    """
+
+    def __init__(self, filepath, cache=None):
+        super().__init__(filepath)
+        self.filepath = filepath
+        self.total_bytes = report_size(filepath)
+        self.report.sources.append(filepath)
+        self.cache = cache or ReportCache()
+        self.from_cache = False
+
+    def load(self):
+        report = self.report
+        with profiler.phase("cache_load") as span:
+            self.from_cache = self.cache.load(self.filepath, report)
+            span.items = len(report)
+        if self.from_cache:
+            self.bytes_read = self.total_bytes
+            self.cases_parsed = len(report)
+            for suite_index, suite in enumerate(report.suites):
+                if not self.emit(("suite", suite_index)):
+                    return False
+                for row in suite.rows:
+                    if not self.emit(("testcase", (suite_index, row))):
+                        return False
+            return True
+
+        # Profiling splits the time into parsing, building the model and waiting for the UI
+        profiling = profiler.enabled
+        clock = time.perf_counter
+        build = 0.0
+        blocks = sys.getallocatedblocks()
+        start = clock()
+        waited = self.waited
+
+        with ReportFile(self.filepath) as reader:
+            builder = ReportBuilder(report)
+            # Failure bodies of a compressed report are kept, as reading them back decompresses it
+            for kind, data in iter_report(reader, lazy_text=True, lazy_failures=is_plain(self.filepath)):
+                if self.cancelled:
+                    return False
+                if profiling:
+                    applied = clock()
+                    index = builder.apply(kind, data)
+                    build += clock() - applied
+                else:
+                    index = builder.apply(kind, data)
+                if kind == "testcase":
+                    self.cases_parsed += 1
+                    event = ("testcase", (builder.suite_index, index))
+                elif kind == "suite":
+                    event = ("suite", index)
+                elif kind == "suite_end":
+                    # Counts are now those of the cases read, not the attributes
+                    event = ("suite_update", index)
+                else:
+                    continue
+                self.bytes_read = reader.bytes_read
+                if not self.emit(event):
+                    return False
+            self.bytes_read = reader.bytes_read
+
+        waited = self.waited - waited
+        profiler.add("parse", clock() - start - build - waited, len(report), self.bytes_read,
+                     sys.getallocatedblocks() - blocks, start, {"suites": len(report.suites)})
+        profiler.add("model_build", build, len(report), start=start)
+        profiler.add("queue_wait", waited, start=start)
+        return True
+
+    def save(self):
+        if not self.from_cache:
+            self.cache.store(self.filepath, self.report)
+
+
+class MultiReportLoader(LoaderThread):
+    """Parses several reports in parallel worker processes and merges them in order.
+
+    With group_by="file" every suite keeps its file as parent; with
+    group_by="suite" suites of the same name from different files are folded
+    into one, which is how sharded runs are usually read.
+    """
+
+    def __init__(self, filepaths, group_by="file"):
+        super().__init__(f"{len(filepaths)} files")
+        self.filepaths = filepaths
+        self.group_by = group_by
+        self.total_bytes = sum(report_size(path) for path in filepaths)
+
+    def load(self):
+        # Imported on the loader thread: multiprocessing is slow to import and only needed here
+        from concurrent.futures import ProcessPoolExecutor
+
+        by_name = self.group_by == "suite"
+        executor = ProcessPoolExecutor()
+        futures = []
+        try:
+            futures = [executor.submit(load_report_cached, path) for path in self.filepaths]
+            for path, future in zip(self.filepaths, futures):
+                with profiler.phase("parse_wait", file=path) as span:
+                    parsed = self.wait(future, path)
+                    span.bytes = report_size(path)
+                if parsed is None:
+                    return False
+                with profiler.phase("merge", file=path) as span:
+                    if not self.merge(parsed, path, by_name):
+                        return False
+                    span.items = len(parsed)
+                self.bytes_read += report_size(path)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+        return True
+
+    def wait(self, future, path):
+        """Result of future, polling so that a cancel is noticed; None if cancelled"""
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        while not self.cancelled:
+            try:
+                return future.result(timeout=0.1)
+            except FutureTimeout:
+                continue
+            except ET.ParseError as e:
+                raise ET.ParseError(f"{path}: {e}")
+        return None
+
+
+class WatchLoader(LoaderThread):
+    """Follows a report file as it grows, or a directory as report files appear in it.
+
+    A growing file is fed to one StreamParser from where the previous poll
+    stopped, so only the newly appended bytes are parsed; an incomplete tail
+    waits for the next poll. In a directory, each new XML file is ingested
+    once it parses. After every poll that changed something the worker
+    queues ("update", search_index); if a watched file shrinks, is replaced
+    or is written again from the start (see rewritten) it queues
+    ("restart", None) and stops. It never finishes on its own.
+    """
+
+    watching = True
+
+    def __init__(self, path, interval=WATCH_INTERVAL):
+        super().__init__(path)
+        self.path = path
+        self.interval = interval
+        self.is_dir = os.path.isdir(path)
+        if not (self.is_dir or is_plain(path)):
+            raise ValueError("compressed and archived reports cannot be followed as they grow")
+        self.group_by = "file" if self.is_dir else None
+
+        # Growing file: parser state and the bytes it has been fed
+        self.parser = StreamParser(lazy_text=True)
+        self.builder = ReportBuilder(self.report)
+        self.offset = 0
+        # The file that was parsed: (inode, device), mtime and the bytes around what was parsed
+        self.identity = None
+        self.mtime_ns = None
+        self.head = b""
+        self.tail = b""
+        if not self.is_dir:
+            self.report.sources.append(path)
+
+        # Directory: ingested files, (mtime, size) of files not ingested yet,
+        # and of files that did not parse
+        self.ingested = set()
+        self.pending = {}
+        self.failed = {}
+        self.polls = 0
+
+    def run(self):
+        try:
+            while not self.cancelled:
+                changed = self.poll_directory() if self.is_dir else self.poll_file()
+                if changed is None:
+                    return
+                if changed:
+                    with profiler.phase("search_index") as span:
+                        self.index = SearchIndex(self.report)
+                        span.items = len(self.report)
+                    if not (self.flush() and self.put(("update", self.index))):
+                        return
+                self.polls += 1
+                self.cancel_event.wait(self.interval)
+        except ET.ParseError as e:
+            self.put(("error", ("Parse Error", f"Failed to parse XML: {e}")))
+        except Exception as e:
+            self.put(("error", ("Error", f"Failed to watch {self.path}: {e}")))
+
+    def poll_file(self):
+        """Parse what was appended since the last poll; None if the watch ended"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False  # Not written yet
+        if self.offset and self.rewritten(stat):
+            # The UI starts a fresh watch
+            self.put(("restart", None))
+            return None
+        self.identity = (stat.st_ino, stat.st_dev)
+        self.mtime_ns = stat.st_mtime_ns
+        if stat.st_size == self.offset:
+            return False
+
+        report = self.report
+        builder = self.builder
+        changed = False
+        span = profiler.phase("parse", file=self.path)
+        with span, open(self.path, "rb") as f:
+            f.seek(self.offset)
+            for chunk in iter(lambda: f.read(READ_SIZE), b""):
+                self.offset += len(chunk)
+                if len(self.head) < CHECK_BYTES:
+                    self.head = (self.head + chunk)[:CHECK_BYTES]
+                self.tail = (self.tail + chunk)[-CHECK_BYTES:]
+                for kind, data in self.parser.feed(chunk):
+                    index = builder.apply(kind, data)
+                    if kind == "testcase":
+                        self.cases_parsed += 1
+                        event = ("testcase", (builder.suite_index, index))
+                    elif kind == "suite":
+                        event = ("suite", index)
+                    elif kind == "suite_end":
+                        event = ("suite_update", index)
+                    else:
+                        continue
+                    changed = True
+                    if not self.emit(event):
+                        return None
+            span.bytes = self.offset - self.total_bytes
+            span.items = len(report)
+        self.bytes_read = self.total_bytes = self.offset
+
+        # Counts in the attributes of suites still being written are not final; use
+        # what has been read, innermost suite first so that parents include it
+        if changed:
+            for suite_index in reversed(builder.open_suites):
+                report.recount_suite(suite_index)
+                if not self.emit(("suite_update", suite_index)):
+                    return None
+        return changed
+
+    def rewritten(self, stat):
+        """Whether the file is no longer the one parsed so far with bytes appended to it.
+
+        Test runners often write the whole report again at the end of a run,
+        at the same size or larger, or replace the file; its first bytes or
+        the last bytes parsed then differ.
+        """
+        if stat.st_size < self.offset or (stat.st_ino, stat.st_dev) != self.identity:
+            return True
+        if stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.offset:
+            return False
+        with open(self.path, "rb") as f:
+            if f.read(len(self.head)) != self.head:
+                return True
+            f.seek(self.offset - len(self.tail))
+            return f.read(len(self.tail)) != self.tail
+
+    def poll_directory(self):
+        """Ingest XML files that appeared since the last poll; None if cancelled"""
+        changed = False
+        for path in collect_report_files([self.path]):
+            if path in self.ingested:
+                continue
+            try:
+                stat = os.stat(disk_path(path))
+            except OSError:
+                continue
+            key = (stat.st_mtime_ns, stat.st_size)
+            if self.failed.get(path) == key:
+                continue
+
+            # Files present at start are taken as complete; later ones once they stop changing
+            if self.polls and self.pending.get(path) != key:
+                self.pending[path] = key
+                continue
+            try:
+                parsed = load_report(path)
+            except (ET.ParseError, *archive_errors()):
+                # Still being written; retried once it changes and settles again
+                self.failed[path] = key
+                continue
+
+            self.pending.pop(path, None)
+            self.ingested.add(path)
+            self.total_bytes += report_size(path)
+            self.bytes_read = self.total_bytes
+            if not self.merge(parsed, path):
+                return None
+            changed = True
+        return changed
@@ -0,0 +1,442 @@
+"""
+In-memory result model.
+Test cases are stored column-wise (one list or array per field) instead of one
+dict per case, so a million-case report costs a few dozen bytes per case.
+Suites and cases are addressed by integer index. Suites can be nested; a
+suite's counts and time cover its nested suites too.
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+
+from report_text import SpanReader, TextBudget, read_span
+
+# Test case status codes, stored one byte per case
+PASSED, FAILURE, ERROR, SKIPPED = range(4)
+STATUS_NAMES = ("passed", "failure", "error", "skipped")
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+
+# Upper bounds (seconds) of the buckets of a duration histogram, with their labels
+DURATION_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 60.0)
+DURATION_LABELS = ("< 1ms", "1-10ms", "10-100ms", "0.1-1s", "1-10s", "10-60s", "> 60s")
+
+
+def parse_float(value):
+    """Parse a numeric attribute, treating missing or malformed values as 0"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class TextSpan:
+    """Where an element's text is in a report file: from the element's start
+    tag up to its end tag (or first child), in bytes; read with read_span"""
+    __slots__ = ("source", "start", "end", "tag")
+
+    def __init__(self, source, start, end, tag):
+        # Index into TestReport.sources
+        self.source = source
+        self.start = start
+        self.end = end
+        self.tag = tag
+
+    def rebase(self, source):
+        return TextSpan(source, self.start, self.end, self.tag)
+
+
+class SpanColumn:
+    """TextSpans of one kind of element for the rows that have one, as parallel arrays"""
+
+    def __init__(self, tag):
+        self.tag = tag
+        # Ascending, since rows are only ever appended
+        self.rows = array("l")
+        self.sources = array("l")
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def __len__(self):
+        return len(self.rows)
+
+    def append(self, row, span):
+        self.rows.append(row)
+        self.sources.append(span.source)
+        self.starts.append(span.start)
+        self.ends.append(span.end)
+
+    def get(self, row):
+        """The span of row, or None"""
+        i = bisect_left(self.rows, row)
+        if i == len(self.rows) or self.rows[i] != row:
+            return None
+        return TextSpan(self.sources[i], self.starts[i], self.ends[i], self.tag)
+
+
+class FailureRecord:
+    # content is the failure body, or a TextSpan when it is read on demand;
+    # failures with the same fingerprint (see report_fingerprint.py) share a cause
+    __slots__ = ("type", "message", "content", "fingerprint")
+
+    def __init__(self, type, message, content, fingerprint=""):
+        self.type = type
+        self.message = message
+        self.content = content
+        self.fingerprint = fingerprint
+
+
+class SuiteRecord:
+    __slots__ = ("name", "tests", "failures", "errors", "skipped", "time", "rows", "source",
+                 "parent", "children", "position")
+
+    def __init__(self, name, tests, failures, errors, skipped, time, source=0, parent=-1):
+        self.name = name
+        self.tests = tests
+        self.failures = failures
+        self.errors = errors
+        self.skipped = skipped
+        self.time = time
+        # Indices of this suite's test cases
+        self.rows = array("l")
+        # Index into TestReport.sources of the file the suite was read from
+        self.source = source
+        # Index of the enclosing suite (-1 at the top level) and of the nested suites;
+        # a parent always comes before its children
+        self.parent = parent
+        self.children = []
+        # Index of this suite in its parent's children, set when it is appended
+        self.position = 0
+
+    @property
+    def has_failures(self):
+        return self.failures > 0 or self.errors > 0
+
+
+class TestReport:
+    """Columnar store of the suites and test cases of one report"""
+
+    def __init__(self):
+        # Attributes of the root element (report-level totals)
+        self.attrs = {}
+        self.suites = []
+        # Report files merged into this model
+        self.sources = []
+
+        # Test case columns, indexed by row
+        self.names = []
+        self.classnames = []
+        self.times = array("d")
+        self.statuses = bytearray()
+        # Only failed and errored cases carry a failure record
+        self.failures = {}
+        # Captured output of the cases that have any
+        self.system_out = SpanColumn("system-out")
+        self.system_err = SpanColumn("system-err")
+        # Cuts failure messages and in-memory bodies to the load's text limits
+        self.text_budget = TextBudget()
+
+        self._strings = {}
+        self._suites_by_name = {}
+        # Counts of the suites still being read, as [tests, failures, errors, skipped, time]:
+        # their own cases so far plus their finished nested suites
+        self._open_counts = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, value):
+        """Share one string object between all cases with the same classname or suite name"""
+        return self._strings.setdefault(value, value)
+
+    def add_suite(self, attrs, source=0, parent=-1):
+        """Open a suite read from a report; it keeps its attribute counts until end_suite"""
+        suite_index = self.append_suite(SuiteRecord(
+            self.intern(attrs.get("name", "Unknown")),
+            parse_int(attrs.get("tests", "0")),
+            parse_int(attrs.get("failures", "0")),
+            parse_int(attrs.get("errors", "0")),
+            parse_int(attrs.get("skipped", "0")),
+            parse_float(attrs.get("time", "0")),
+            source,
+            parent,
+        ))
+        self._open_counts[suite_index] = [0, 0, 0, 0, 0.0]
+        return suite_index
+
+    def append_suite(self, suite):
+        suite_index = len(self.suites)
+        self.suites.append(suite)
+        if suite.parent >= 0:
+            siblings = self.suites[suite.parent].children
+            suite.position = len(siblings)
+            siblings.append(suite_index)
+        return suite_index
+
+    def end_suite(self, suite_index):
+        """Close a suite: its counts become those of the cases read, and are added to its parent's.
+
+        Nested suites close before their parent, so the counts are built
+        bottom-up while the report is read, without a second pass.
+        """
+        counts = self._open_counts.pop(suite_index, None)
+        if counts is None:
+            return
+        suite = self.suites[suite_index]
+        suite.tests, suite.failures, suite.errors, suite.skipped, suite.time = counts
+        parent_counts = self._open_counts.get(suite.parent)
+        if parent_counts is not None:
+            for i, value in enumerate(counts):
+                parent_counts[i] += value
+
+    def add_testcase(self, suite_index, testcase_data):
+        failure = testcase_data["failure"]
+        return self.append_case(
+            suite_index,
+            testcase_data["name"],
+            testcase_data["classname"],
+            parse_float(testcase_data["time"]),
+            STATUS_CODES[testcase_data["status"]],
+            FailureRecord(failure["type"], self.text_budget.retain(failure["message"]),
+                          self.text_budget.retain(failure["content"]),
+                          self.intern(failure.get("fingerprint", ""))) if failure else None,
+            testcase_data.get("system_out"),
+            testcase_data.get("system_err")
+        )
+
+    def append_case(self, suite_index, name, classname, time, status, failure,
+                    system_out=None, system_err=None):
+        row = len(self.names)
+        self.names.append(name)
+        self.classnames.append(self.intern(classname))
+        self.times.append(time)
+        self.statuses.append(status)
+        if failure is not None:
+            self.failures[row] = failure
+        if system_out is not None:
+            self.system_out.append(row, system_out)
+        if system_err is not None:
+            self.system_err.append(row, system_err)
+
+        self.suites[suite_index].rows.append(row)
+        counts = self._open_counts.get(suite_index)
+        if counts is not None:
+            counts[0] += 1
+            if status != PASSED:
+                # failures, errors and skipped follow tests in the counts
+                counts[status] += 1
+            counts[4] += time
+        return row
+
+    def merge_suite(self, other, suite_index, source, by_name=False, parent=-1):
+        """Copy one suite of another report into this one, below the suite parent.
+
+        With by_name, suites that share a name and parent are folded into a
+        single record whose counts are summed. Returns (suite index, created, new rows).
+        """
+        suite = other.suites[suite_index]
+        key = (parent, suite.name)
+        target_index = self._suites_by_name.get(key) if by_name else None
+
+        if target_index is None:
+            target_index = self.append_suite(SuiteRecord(
+                self.intern(suite.name), suite.tests, suite.failures,
+                suite.errors, suite.skipped, suite.time, source, parent
+            ))
+            created = True
+            if by_name:
+                self._suites_by_name[key] = target_index
+        else:
+            target = self.suites[target_index]
+            target.tests += suite.tests
+            target.failures += suite.failures
+            target.errors += suite.errors
+            target.skipped += suite.skipped
+            target.time += suite.time
+            created = False
+
+        rows = []
+        for row in suite.rows:
+            failure = other.failures.get(row)
+            if failure is not None:
+                content = failure.content
+                failure = FailureRecord(failure.type, self.text_budget.retain(failure.message),
+                                        content.rebase(source) if isinstance(content, TextSpan)
+                                        else self.text_budget.retain(content),
+                                        failure.fingerprint)
+            system_out = other.system_out.get(row)
+            system_err = other.system_err.get(row)
+            rows.append(self.append_case(
+                target_index, other.names[row], other.classnames[row], other.times[row],
+                other.statuses[row], failure,
+                system_out and system_out.rebase(source), system_err and system_err.rebase(source)
+            ))
+        return target_index, created, rows
+
+    def merge_report(self, other, source, by_name=False):
+        """Merge every suite of another report, keeping the nesting.
+
+        Returns the merge_suite result of each suite, in order.
+        """
+        self.text_budget.absorb(other.text_budget)
+        targets = []
+        merged = []
+        for suite_index, suite in enumerate(other.suites):
+            parent = targets[suite.parent] if suite.parent >= 0 else -1
+            result = self.merge_suite(other, suite_index, source, by_name, parent)
+            targets.append(result[0])
+            merged.append(result)
+        return merged
+
+    def recount_suite(self, suite_index):
+        """Replace a suite's attribute counts with counts of the cases read so far.
+
+        Nested suites are taken as already counted.
+        """
+        suite = self.suites[suite_index]
+        statuses = self.statuses
+        counts = [0] * len(STATUS_NAMES)
+        for row in suite.rows:
+            counts[statuses[row]] += 1
+        suite.tests = len(suite.rows)
+        suite.failures = counts[FAILURE]
+        suite.errors = counts[ERROR]
+        suite.skipped = counts[SKIPPED]
+        suite.time = sum(self.times[row] for row in suite.rows)
+        for child in suite.children:
+            child = self.suites[child]
+            suite.tests += child.tests
+            suite.failures += child.failures
+            suite.errors += child.errors
+            suite.skipped += child.skipped
+            suite.time += child.time
+
+    def ancestors(self, suite_index):
+        """Indices of the suites enclosing a suite, innermost first"""
+        found = []
+        parent = self.suites[suite_index].parent
+        while parent >= 0:
+            found.append(parent)
+            parent = self.suites[parent].parent
+        return found
+
+    def suite_rows(self, suite_index):
+        """Rows of a suite and of all suites nested in it, in suite order"""
+        rows = []
+        pending = [suite_index]
+        while pending:
+            suite = self.suites[pending.pop()]
+            rows.extend(suite.rows)
+            pending.extend(reversed(suite.children))
+        return rows
+
+    def totals(self):
+        """Report-wide totals computed from the cases and suites rather than root attributes"""
+        counts = self.status_counts()
+        return {
+            "tests": len(self),
+            "failures": counts["failure"],
+            "errors": counts["error"],
+            "skipped": counts["skipped"],
+            "time": sum(suite.time for suite in self.suites if suite.parent < 0)
+        }
+
+    def top_suites(self):
+        """Indices of the suites that are not nested in another"""
+        return [index for index, suite in enumerate(self.suites) if suite.parent < 0]
+
+    def source_suites(self, source):
+        """Indices of the top-level suites read from one source file"""
+        return [index for index, suite in enumerate(self.suites) if suite.source == source and suite.parent < 0]
+
+    def status_counts(self):
+        """Number of cases per status name"""
+        return {name: self.statuses.count(code) for code, name in enumerate(STATUS_NAMES)}
+
+    def slowest_cases(self, k):
+        """Rows of the k slowest cases, slowest first"""
+        return heapq.nlargest(k, range(len(self)), key=self.times.__getitem__)
+
+    def slowest_suites(self, k):
+        """Indices of the k slowest suites, slowest first"""
+        suites = self.suites
+        return heapq.nlargest(k, range(len(suites)), key=lambda index: suites[index].time)
+
+    def duration_histogram(self, suite_index):
+        """Number of the suite's cases per DURATION_LABELS bucket"""
+        counts = [0] * len(DURATION_LABELS)
+        times = self.times
+        for row in self.suite_rows(suite_index):
+            counts[bisect_right(DURATION_BUCKETS, times[row])] += 1
+        return counts
+
+    def iter_failures(self, rows=None):
+        """Failed and errored cases (all, or those in rows) in report order, as export dicts"""
+        # Bodies are read through one reader, so each report file is mapped once;
+        # the rows are copied first, as a watched report keeps growing
+        with SpanReader() as reader:
+            for row in list(self.failures) if rows is None else rows:
+                yield self.testcase_dict(row, reader)
+
+    def iter_failure_groups(self, rows=None):
+        """One export dict per failure group (see failure_groups): its first case,
+        with the qualified names of the other cases of the group under same_failure"""
+        with SpanReader() as reader:
+            for group in self.failure_groups(rows):
+                f = self.testcase_dict(group[0], reader)
+                if len(group) > 1:
+                    f["same_failure"] = [self.qualified_name(row) for row in group[1:]]
+                yield f
+
+    def qualified_name(self, row):
+        classname = self.classnames[row]
+        return f"{classname}.{self.names[row]}" if classname else self.names[row]
+
+    def failed_rows(self, suite_index):
+        """Rows of the failed or errored cases of one suite, with those of its nested suites"""
+        failures = self.failures
+        return [row for row in self.suite_rows(suite_index) if row in failures]
+
+    def failure_groups(self, rows=None):
+        """Failed and errored cases (all, or those in rows) grouped by fingerprint.
+
+        Returns lists of rows, largest group first; each list is in report
+        order, so its first row can stand for the group.
+        """
+        failures = self.failures
+        groups = {}
+        for row in list(failures) if rows is None else rows:
+            groups.setdefault(failures[row].fingerprint, []).append(row)
+        return sorted(groups.values(), key=len, reverse=True)
+
+    def read_text(self, text, reader=None, keep=None):
+        """Text of a failure body or output: strings are returned as is, TextSpans read from the file.
+
+        Read texts are cut to their first and last keep characters, as read_span does.
+        """
+        if isinstance(text, TextSpan):
+            path = self.sources[text.source]
+            return reader.read(path, text) if reader else read_span(path, text, keep)
+        return text
+
+    def testcase_dict(self, row, reader=None):
+        """Materialize one case in the dict shape used by the export formats"""
+        failure = self.failures.get(row)
+        return {
+            "name": self.names[row],
+            "classname": self.classnames[row],
+            "time": self.times[row],
+            "status": STATUS_NAMES[self.statuses[row]],
+            "failure": {
+                "message": failure.message,
+                "type": failure.type,
+                "content": self.read_text(failure.content, reader)
+            } if failure else None
+        }
@@ -0,0 +1,275 @@
+"""
+Streaming JUnit XML parser.
+Reads reports incrementally with expat so that memory is bounded by the
+largest single test case instead of the size of the whole file, and so that a
+report that is still being written can be read as it grows. When the report is
+a file on disk, failure bodies and <system-out>/<system-err> blocks are not
+read into memory at all: only their byte offsets are recorded (see
+report_text.py). Failure bodies of compressed and archived reports are kept
+in memory instead, since reading one back means decompressing the file up to
+it.
+"""
+
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+from report_archive import ReportFile, is_plain
+from report_fingerprint import FINGERPRINT_CHARS, fingerprint
+from report_model import TestReport, TextSpan
+
+# Bytes read from a report per parser feed
+READ_SIZE = 64 * 1024
+# Children of <testcase> whose text is captured
+TEXT_TAGS = ("failure", "error", "system-out", "system-err")
+
+
+class StreamParser:
+    """Incremental report parser: feed bytes as they arrive and collect report events.
+
+    Events are ("report", attrs), ("suite", attrs), ("suite_end", None) and
+    ("testcase", data). Suites are the <testsuite> root, the <testsuite>
+    children of a <testsuites> root and the <testsuite> children of other
+    suites, at any depth; a suite's events come between its "suite" and
+    "suite_end", so test cases belong to the innermost open suite. Test cases
+    are the direct <testcase> children of suites. No element tree is built,
+    so finished test cases do not accumulate in memory, and an incomplete tail
+    is simply kept until the rest of it is fed.
+
+    The text of a case's failure or error element (up to its first child
+    element, like Element.text) is returned as a string, or with
+    lazy_text as a TextSpan into source 0; <system-out> and <system-err> are
+    only recorded with lazy_text. lazy_failures (by default lazy_text) does
+    the same for failure and error texts alone. Either way the first
+    FINGERPRINT_CHARS characters of a failure are kept long enough to
+    fingerprint it.
+    """
+
+    def __init__(self, lazy_text=False, lazy_failures=None):
+        self.lazy_text = lazy_text
+        self.lazy_failures = lazy_text if lazy_failures is None else lazy_failures
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.events = []
+        # Tags of the open elements, and the depths of the open suites
+        self.stack = []
+        self.suite_depths = []
+
+        # Open test case: its attributes, depth and captured children by tag
+        self.case = None
+        self.case_depth = None
+        self.children = None
+        # Open child whose text is captured: tag, whether it becomes a TextSpan, start offset,
+        # text seen so far and, for a lazy failure, how much of its head is still wanted
+        self.text_tag = None
+        self.text_lazy = False
+        self.text_start = None
+        self.text = None
+        self.head_chars = 0
+
+    def feed(self, data):
+        """Parse another chunk of the document and return the events it completes"""
+        self.parse(data, False)
+        return self.read_events()
+
+    def close(self):
+        """Finish the document; raises ET.ParseError if it is incomplete"""
+        self.parse(b"", True)
+        return self.read_events()
+
+    def parse(self, data, final):
+        try:
+            self.parser.Parse(data, final)
+        except expat.ExpatError as e:
+            # Callers handle the ElementTree error, as raised by ET.parse
+            error = ET.ParseError(str(e))
+            error.code = e.code
+            error.position = (e.lineno, e.offset)
+            raise error from None
+
+    def read_events(self):
+        events, self.events = self.events, []
+        return events
+
+    def start(self, tag, attrs):
+        stack = self.stack
+        depth = len(stack)
+        stack.append(tag)
+        if self.text_tag is not None:
+            # Like Element.text, the captured text stops at the first child element
+            self.end_text()
+
+        if self.case is not None:
+            if depth == self.case_depth + 1 and tag not in self.children:
+                self.children[tag] = attrs
+                if tag in TEXT_TAGS and (self.lazy_text or tag in ("failure", "error")):
+                    self.text_tag = tag
+                    self.text_lazy = self.lazy_failures if tag in ("failure", "error") else self.lazy_text
+                    self.text_start = self.parser.CurrentByteIndex
+                    self.text = []
+                    self.head_chars = FINGERPRINT_CHARS if tag in ("failure", "error") else 0
+                    # Character data is only handled while text is captured
+                    self.parser.CharacterDataHandler = self.data
+        elif depth == 0:
+            self.events.append(("report", dict(attrs)))
+            if tag == "testsuite":
+                self.start_suite(attrs, depth)
+        elif tag == "testsuite" and (depth == 1 and stack[0] == "testsuites"
+                                     or self.suite_depths and self.suite_depths[-1] == depth - 1):
+            self.start_suite(attrs, depth)
+        elif tag == "testcase" and self.suite_depths and self.suite_depths[-1] == depth - 1:
+            self.case = attrs
+            self.case_depth = depth
+            self.children = {}
+
+    def start_suite(self, attrs, depth):
+        self.suite_depths.append(depth)
+        self.events.append(("suite", dict(attrs)))
+
+    def end(self, tag):
+        stack = self.stack
+        stack.pop()
+        if self.text_tag is not None:
+            self.end_text()
+        if len(stack) == self.case_depth:
+            self.events.append(("testcase", self.read_testcase()))
+            self.case = self.case_depth = self.children = None
+        elif self.suite_depths and len(stack) == self.suite_depths[-1]:
+            self.suite_depths.pop()
+            self.events.append(("suite_end", None))
+
+    def data(self, text):
+        if not self.text_lazy:
+            self.text.append(text)
+        elif self.head_chars > 0:
+            # The start of a failure is kept for its fingerprint
+            self.text.append(text)
+            self.head_chars -= len(text)
+        elif text and not self.text:
+            # Only whether there is any text matters; the text itself is read back later
+            self.text.append(text)
+
+    def end_text(self):
+        tag = self.text_tag
+        if not self.text:
+            text = ""
+        elif self.text_lazy:
+            if tag in ("failure", "error"):
+                self.children[tag]["#head"] = "".join(self.text)[:FINGERPRINT_CHARS]
+            text = TextSpan(0, self.text_start, self.parser.CurrentByteIndex, tag)
+        else:
+            text = "".join(self.text)
+        self.children[tag]["#text"] = text
+        self.text_tag = self.text_start = self.text = None
+        self.text_lazy = False
+        self.head_chars = 0
+        self.parser.CharacterDataHandler = None
+
+    def read_testcase(self):
+        """Extract name, timing, failure and output data from a finished <testcase>"""
+        attrs = self.case
+        children = self.children
+
+        testcase_data = {
+            "name": attrs.get("name", "Unknown"),
+            "classname": attrs.get("classname", ""),
+            "time": attrs.get("time", "0"),
+            "status": "passed",
+            "failure": None
+        }
+        if not children:
+            return testcase_data
+
+        # Like the <failure>, <error>, <skipped> precedence of a JUnit summary
+        failure = children.get("failure")
+        if failure is not None:
+            testcase_data["status"] = "failure"
+        else:
+            failure = children.get("error")
+            if failure is not None:
+                testcase_data["status"] = "error"
+            elif "skipped" in children:
+                testcase_data["status"] = "skipped"
+        if failure is not None:
+            content = failure.get("#text", "")
+            testcase_data["failure"] = {
+                "message": failure.get("message", ""),
+                "type": failure.get("type", ""),
+                "content": content,
+                "fingerprint": fingerprint(
+                    failure.get("type", ""), failure.get("message", ""),
+                    failure.get("#head", content if isinstance(content, str) else "")
+                )
+            }
+
+        output = children.get("system-out")
+        if output and output.get("#text"):
+            testcase_data["system_out"] = output["#text"]
+        output = children.get("system-err")
+        if output and output.get("#text"):
+            testcase_data["system_err"] = output["#text"]
+
+        return testcase_data
+
+
+def iter_report(source, lazy_text=None, lazy_failures=None):
+    """Stream a report from a path or binary file object, yielding StreamParser events.
+
+    Paths may be compressed reports or zip members (see report_archive.py).
+    Text is read lazily by default when source is a path, except for the
+    failure bodies of a compressed or archived report.
+    """
+    if lazy_text is None:
+        lazy_text = isinstance(source, str)
+    if isinstance(source, str):
+        if lazy_failures is None:
+            lazy_failures = lazy_text and is_plain(source)
+        with ReportFile(source) as f:
+            yield from iter_report(f, lazy_text, lazy_failures)
+        return
+
+    parser = StreamParser(lazy_text, lazy_failures)
+    for chunk in iter(lambda: source.read(READ_SIZE), b""):
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+class ReportBuilder:
+    """Applies StreamParser events to a TestReport, keeping track of the open suites"""
+
+    def __init__(self, report):
+        self.report = report
+        self.open_suites = []
+
+    @property
+    def suite_index(self):
+        """The innermost open suite"""
+        return self.open_suites[-1]
+
+    def apply(self, kind, data):
+        """Apply one event; returns the index of the case or suite it added or ended, if any"""
+        report = self.report
+        if kind == "testcase":
+            return report.add_testcase(self.open_suites[-1], data)
+        if kind == "suite":
+            suite_index = report.add_suite(data, parent=self.open_suites[-1] if self.open_suites else -1)
+            self.open_suites.append(suite_index)
+            return suite_index
+        if kind == "suite_end":
+            suite_index = self.open_suites.pop()
+            report.end_suite(suite_index)
+            return suite_index
+        report.attrs = data
+        return None
+
+
+def load_report(source):
+    """Parse a whole report into a TestReport"""
+    report = TestReport()
+    if isinstance(source, str):
+        report.sources.append(source)
+    builder = ReportBuilder(report)
+    for kind, data in iter_report(source):
+        builder.apply(kind, data)
+    return report
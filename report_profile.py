@@ -0,0 +1,192 @@
+"""
+Load-phase profiling.
+With the viewer started with --profile, the loaders and the viewer time
+their phases (parse, model build, tree insertion, search index, selection,
+clipboard copy, export) and count the items, bytes and memory blocks each
+one handled. A summary goes to the status bar and the whole run is written
+as a JSON trace in the Chrome trace event format, which can be attached to
+a ticket and opened in chrome://tracing or https://ui.perfetto.dev.
+
+Allocations are counted as the change in live memory blocks of the whole
+process (sys.getallocatedblocks), so phases that overlap on different
+threads see each other's allocations.
+
+Profiling is off by default, and phases then cost one attribute check.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Spans kept for the trace; later ones only go into the totals
+PROFILE_SPANS = 100_000
+# Trace file written by --profile without a path
+DEFAULT_TRACE = "xmlviewer-profile.json"
+
+
+class Span:
+    """One timed run of a phase; set items and bytes to what it processed"""
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.items = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.profiler.add(self.name, end - self.start, self.items, self.bytes,
+                          sys.getallocatedblocks() - self.blocks, self.start, self.args)
+
+
+class NoSpan:
+    """Stand-in for Span while profiling is off"""
+
+    items = 0
+    bytes = 0
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.started_at = time.time()
+            # Phase name -> [calls, seconds, items, bytes, allocated blocks], in order of first use
+            self.totals = {}
+            self.spans = []
+            self.dropped = 0
+
+    def phase(self, name, **args):
+        """Context manager timing one run of a phase; args go into the trace"""
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, args)
+
+    def add(self, name, seconds, items=0, bytes=0, blocks=0, start=None, args=None):
+        """Record a run of a phase that was measured elsewhere (e.g. summed over many events)"""
+        if not self.enabled:
+            return
+        if start is None:
+            start = time.perf_counter() - seconds
+        with self.lock:
+            totals = self.totals.setdefault(name, [0, 0.0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += items
+            totals[3] += bytes
+            totals[4] += blocks
+            if len(self.spans) >= PROFILE_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append((name, start, seconds, threading.get_ident(),
+                               dict(args or (), items=items, bytes=bytes, allocated_blocks=blocks)))
+
+    def summary(self, names=None, since=None):
+        """Totals per phase as {name: {"calls", "seconds", "items", "bytes", "allocated_blocks"}}.
+
+        With names, only those phases, in that order. With since (a
+        time.perf_counter() value), only spans that started after it are counted.
+        """
+        with self.lock:
+            if since is None:
+                totals = self.totals
+            else:
+                totals = {}
+                for name, start, seconds, _, args in self.spans:
+                    if start >= since:
+                        phase = totals.setdefault(name, [0, 0.0, 0, 0, 0])
+                        phase[0] += 1
+                        phase[1] += seconds
+                        phase[2] += args["items"]
+                        phase[3] += args["bytes"]
+                        phase[4] += args["allocated_blocks"]
+            return {
+                name: {"calls": calls, "seconds": round(seconds, 6), "items": items,
+                       "bytes": bytes, "allocated_blocks": blocks}
+                for name, (calls, seconds, items, bytes, blocks) in (
+                    totals.items() if names is None else
+                    ((name, totals[name]) for name in names if name in totals)
+                )
+            }
+
+    def summary_line(self, names=None, since=None):
+        """Totals per phase on one line, for the status bar, in the order of names if given"""
+        parts = []
+        for name, totals in self.summary(names, since).items():
+            part = f"{name} {totals['seconds']:.2f}s"
+            if totals["items"]:
+                part += f" ({totals['items']:,}"
+                if totals["bytes"] >= 1024 * 1024:
+                    part += f", {totals['bytes'] / (1024 * 1024):.1f} MB"
+                elif totals["bytes"]:
+                    part += f", {totals['bytes'] / 1024:.1f} KB"
+                part += ")"
+            parts.append(part)
+        return " | ".join(parts)
+
+    def trace(self):
+        """The recorded spans as a Chrome trace event document"""
+        pid = os.getpid()
+        with self.lock:
+            spans = list(self.spans)
+            dropped = self.dropped
+        threads = {}
+        events = []
+        for name, start, seconds, thread, args in spans:
+            tid = threads.setdefault(thread, len(threads))
+            events.append({"name": name, "cat": "phase", "ph": "X", "pid": pid, "tid": tid,
+                           "ts": round((start - self.origin) * 1e6, 1), "dur": round(seconds * 1e6, 1),
+                           "args": args})
+        for thread, tid in threads.items():
+            thread_name = "main" if thread == threading.main_thread().ident else f"worker {tid}"
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": thread_name}})
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+                "python": sys.version.split()[0],
+                "platform": sys.platform,
+                "dropped_spans": dropped,
+                "summary": self.summary(),
+            },
+        }
+
+    def write(self, path):
+        import json
+
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(self.trace(), out, indent=1)
+
+
+# Shared by the loaders (on their threads) and the viewer
+profiler = Profiler()
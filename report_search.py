@@ -0,0 +1,140 @@
+"""
+Search index over a loaded report.
+Built once after loading so that each keystroke costs a few str.find calls
+over prebuilt lowercase text instead of a scan over every test case.
+"""
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from report_model import STATUS_NAMES
+
+# Separates the values of consecutive rows in the search text; cannot be typed
+SEPARATOR = "\x00"
+# Refining a result by checking rows one by one beats a full scan below this size
+REFINE_LIMIT = 5000
+
+
+class TextColumn:
+    """One searchable field of many rows, stored as a single lowercase string"""
+
+    def __init__(self, values, rows=None):
+        lowered = [value.lower() for value in values]
+        self.text = SEPARATOR + SEPARATOR.join(lowered)
+        # Offset of the separator in front of each value
+        self.starts = array("q", accumulate((len(value) + 1 for value in lowered[:-1]), initial=0)
+                            if lowered else ())
+        # Row of each value, when the column only covers some rows
+        self.rows = rows
+
+    def find(self, query, prefix=False):
+        """Yield the rows whose value contains query (or starts with it)"""
+        needle = SEPARATOR + query if prefix else query
+        text, starts, rows = self.text, self.starts, self.rows
+        count = len(starts)
+        pos = text.find(needle)
+        while pos != -1:
+            i = bisect_right(starts, pos) - 1
+            yield rows[i] if rows is not None else i
+            # Report each row once: continue at the next value
+            if i + 1 >= count:
+                break
+            pos = text.find(needle, starts[i + 1])
+
+
+class SearchIndex:
+    """Substring and prefix lookup over names, classnames and failure types and messages"""
+
+    def __init__(self, report):
+        self.size = len(report)
+        self.names = TextColumn(report.names)
+
+        failure_rows = list(report.failures)
+        failures = [report.failures[row] for row in failure_rows]
+        self.messages = TextColumn([failure.message for failure in failures], array("l", failure_rows))
+
+        # Classnames and failure types repeat a lot: match the distinct values, then expand to rows
+        self.classnames = {}
+        for row, classname in enumerate(report.classnames):
+            self.classnames.setdefault(classname, []).append(row)
+        self.types = {}
+        for row, failure in zip(failure_rows, failures):
+            self.types.setdefault(failure.type, []).append(row)
+
+        # Suite of every row, so that matches can be grouped without walking the suites
+        self.row_suites = array("l", [0]) * self.size
+        for suite_index, suite in enumerate(report.suites):
+            for row in suite.rows:
+                self.row_suites[row] = suite_index
+
+        statuses = report.statuses
+        self.status_rows = {name: array("l") for name in STATUS_NAMES}
+        for code, name in enumerate(STATUS_NAMES):
+            rows = self.status_rows[name]
+            pos = statuses.find(code)
+            while pos != -1:
+                rows.append(pos)
+                pos = statuses.find(code, pos + 1)
+
+        self.report = report
+        self.last_query = None
+        self.last_rows = None
+
+    def search(self, query):
+        """Rows matching query, case-insensitively; a leading ^ restricts it to field prefixes"""
+        query = query.lower()
+        prefix = query.startswith("^")
+        if prefix:
+            query = query[1:]
+        if not query:
+            return set(range(self.size))
+
+        key = (prefix, query)
+        if (self.last_rows is not None and self.last_query[0] == prefix
+                and query.startswith(self.last_query[1]) and len(self.last_rows) <= REFINE_LIMIT):
+            # Typing on: the new matches are a subset of the previous ones
+            rows = {row for row in self.last_rows if self.row_matches(row, query, prefix)}
+        else:
+            rows = set(self.names.find(query, prefix))
+            rows.update(self.messages.find(query, prefix))
+            for values in (self.classnames, self.types):
+                for value, value_rows in values.items():
+                    lowered = value.lower()
+                    if lowered.startswith(query) if prefix else query in lowered:
+                        rows.update(value_rows)
+
+        self.last_query, self.last_rows = key, rows
+        return rows
+
+    def row_matches(self, row, query, prefix):
+        report = self.report
+        values = [report.names[row], report.classnames[row]]
+        failure = report.failures.get(row)
+        if failure:
+            values.append(failure.type)
+            values.append(failure.message)
+        for value in values:
+            lowered = value.lower()
+            if lowered.startswith(query) if prefix else query in lowered:
+                return True
+        return False
+
+    def filter(self, query, statuses):
+        """Rows matching query whose status name is in statuses, or None when nothing is filtered"""
+        all_statuses = len(statuses) == len(STATUS_NAMES)
+        if not query.strip("^ ") and all_statuses:
+            return None
+
+        if query.strip("^ "):
+            rows = self.search(query.strip())
+            if not all_statuses:
+                codes = {STATUS_NAMES.index(name) for name in statuses}
+                report_statuses = self.report.statuses
+                rows = {row for row in rows if report_statuses[row] in codes}
+            return rows
+
+        rows = set()
+        for name in statuses:
+            rows.update(self.status_rows[name])
+        return rows
@@ -0,0 +1,451 @@
+"""
+Report server.
+Loads reports once and serves them as a JSON API over HTTP, so that several
+people can triage the same large report without each of them parsing it:
+
+    python main.py --serve reports/ --port 8765
+    curl "http://127.0.0.1:8765/api/failures?q=timeout&limit=20"
+
+Lists are paginated with offset and limit and answer {"total", "offset",
+"limit", "next", "items"}, where next is the URL of the following page or
+null. Failures are items of the JSON export (see report_export.py) with
+their row, which /api/cases/ROW takes to show the case with its output.
+
+The report does not change while it is served, so every response carries an
+ETag made from the loaded files and the request; sending it back in
+If-None-Match gets 304 Not Modified without the report being read.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from headless import EXIT_ERROR, EXIT_PASSED, summary_line
+from report_archive import archive_errors, disk_path
+from report_export import (FORMATS, iter_json_chunks, iter_jsonl_lines, iter_junit_chunks, iter_yaml_chunks,
+                           json_item)
+from report_loader import collect_report_files, load_merged
+from report_model import STATUS_NAMES
+from report_search import SearchIndex
+from report_text import SpanReader, text_limits
+
+# This machine only, unless --host says otherwise
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Items per page when a list gives no limit, and the most one page may hold
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Filtered row lists kept, so that paging through one does not filter again
+SELECTIONS = 32
+# Bytes of an export gathered before each write to the socket
+WRITE_SIZE = 64 * 1024
+FAILED_STATUSES = ("failure", "error")
+# Content type and file name of each export format
+EXPORTS = {
+    "yaml": ("application/yaml; charset=utf-8", "failures.yaml"),
+    "json": ("application/json", "failures.json"),
+    "jsonl": ("application/jsonl", "failures.jsonl"),
+    "junit": ("application/xml; charset=utf-8", "failures.xml"),
+}
+EXPORT_WRITERS = {"yaml": iter_yaml_chunks, "json": iter_json_chunks, "jsonl": iter_jsonl_lines}
+
+
+class RequestError(Exception):
+    """A request the API cannot answer; sent back as {"error": message}"""
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def report_version(paths):
+    """Digest of the report files as they are on disk and of the text limits, which shape every response"""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        stat = os.stat(disk_path(path))
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode("utf-8", "surrogatepass"))
+    digest.update(repr(text_limits()).encode())
+    return digest.hexdigest()
+
+
+class Query:
+    """Parameters of one request's query string"""
+
+    def __init__(self, query):
+        self.params = parse_qs(query, keep_blank_values=True)
+
+    def get(self, name, default=None):
+        values = self.params.get(name)
+        return values[-1] if values else default
+
+    def int(self, name, default=None, minimum=0, maximum=None):
+        value = self.get(name)
+        if value is None or value == "":
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise RequestError(f"{name} must be an integer, not {value!r}")
+        if number < minimum or (maximum is not None and number > maximum):
+            raise RequestError(f"{name} must be between {minimum} and {maximum}" if maximum is not None
+                               else f"{name} must be at least {minimum}")
+        return number
+
+    def flag(self, name):
+        return self.get(name, "0").lower() not in ("", "0", "false", "no")
+
+    def statuses(self, allowed=STATUS_NAMES):
+        """Status names of status=a,b (also repeated), all of allowed when not given"""
+        names = [name for value in self.params.get("status", ()) for name in value.split(",") if name]
+        for name in names:
+            if name not in allowed:
+                raise RequestError(f"status must be one of {', '.join(allowed)}, not {name!r}")
+        return tuple(sorted(set(names), key=allowed.index)) if names else tuple(allowed)
+
+    def limits(self):
+        """max_lines and max_chars of the export formats; only given ones override the defaults, 0 is no limit"""
+        return {name: value or None for name, value in
+                ((name, self.int(name)) for name in ("max_lines", "max_chars")) if value is not None}
+
+
+class ServedReport:
+    """A loaded report and the queries the endpoints run on it; shared by the request threads"""
+
+    def __init__(self, paths, report, version):
+        self.paths = paths
+        self.report = report
+        self.version = version
+        self.index = SearchIndex(report)
+        # SearchIndex keeps the last query to refine the next one, so one request searches at a time
+        self.search_lock = threading.Lock()
+        self.select = lru_cache(maxsize=SELECTIONS)(self.select_rows)
+        self.groups = lru_cache(maxsize=SELECTIONS)(self.group_rows)
+
+    def etag(self, target):
+        """Strong ETag of the response to a request target (path and query string)"""
+        digest = hashlib.blake2b(f"{self.version}\0{target}".encode("utf-8", "surrogatepass"), digest_size=16)
+        return f'"{digest.hexdigest()}"'
+
+    def suite_index(self, query):
+        suite = query.int("suite", minimum=0)
+        if suite is not None and suite >= len(self.report.suites):
+            raise RequestError(f"no suite {suite}", HTTPStatus.NOT_FOUND)
+        return suite
+
+    def select_rows(self, search, statuses, suite, slowest):
+        """Rows of the cases matching the filters as an array, in report order or slowest first"""
+        report = self.report
+        with self.search_lock:
+            rows = self.index.filter(search, statuses)
+        if suite is not None:
+            suite_rows = report.suite_rows(suite)
+            rows = suite_rows if rows is None else [row for row in suite_rows if row in rows]
+        elif rows is None:
+            rows = range(len(report))
+        if slowest:
+            return array("l", sorted(rows, key=report.times.__getitem__, reverse=True))
+        return array("l", sorted(rows))
+
+    def group_rows(self, search, statuses, suite):
+        """Failure groups (see TestReport.failure_groups) among the failed cases matching the filters"""
+        return self.report.failure_groups(self.select(search, statuses, suite, False))
+
+    def selection(self, query, statuses):
+        return self.select(query.get("q", ""), statuses, self.suite_index(query), query.get("sort") == "time")
+
+    def summary(self):
+        report = self.report
+        keep, budget = text_limits()
+        return {
+            "sources": report.sources,
+            "attrs": report.attrs,
+            "totals": report.totals(),
+            "statuses": report.status_counts(),
+            "suites": len(report.suites),
+            "failure_groups": len(self.groups("", FAILED_STATUSES, None)),
+            "text": {
+                "keep_chars": keep,
+                "budget_chars": budget,
+                "texts_cut": report.text_budget.cut,
+                "budget_reached": bool(report.text_budget.spent),
+            },
+        }
+
+    def suite_item(self, index):
+        suite = self.report.suites[index]
+        return {
+            "index": index,
+            "name": suite.name,
+            "tests": suite.tests,
+            "failures": suite.failures,
+            "errors": suite.errors,
+            "skipped": suite.skipped,
+            "time": suite.time,
+            "source": self.report.sources[suite.source] if self.report.sources else None,
+            "parent": suite.parent,
+            "children": suite.children,
+        }
+
+    def case_item(self, row):
+        report = self.report
+        item = {
+            "row": row,
+            "name": report.names[row],
+            "classname": report.classnames[row],
+            "time": report.times[row],
+            "status": STATUS_NAMES[report.statuses[row]],
+            "suite": self.index.row_suites[row],
+        }
+        failure = report.failures.get(row)
+        if failure:
+            item["failure"] = {"type": failure.type, "message": failure.message}
+        return item
+
+    def case(self, row, whole=False):
+        """One case with its failure body and captured output, cut to XMLVIEWER_TEXT_KEEP_KB unless whole"""
+        report = self.report
+        if not 0 <= row < len(report):
+            raise RequestError(f"no case {row}", HTTPStatus.NOT_FOUND)
+        keep = 0 if whole else None
+        item = self.case_item(row)
+        failure = report.failures.get(row)
+        if failure:
+            item["failure"]["content"] = report.read_text(failure.content, keep=keep)
+        for name, column in (("system_out", report.system_out), ("system_err", report.system_err)):
+            span = column.get(row)
+            item[name] = report.read_text(span, keep=keep) if span is not None else None
+        item["suites"] = [report.suites[index].name
+                          for index in reversed([item["suite"]] + report.ancestors(item["suite"]))]
+        return item
+
+    def failure_items(self, rows, groups, limits):
+        """Items of the JSON export for the first rows of failure groups (lists of rows), or for rows"""
+        report = self.report
+        items = []
+        with SpanReader() as reader:
+            for group in groups if groups is not None else ([row] for row in rows):
+                f = report.testcase_dict(group[0], reader)
+                if len(group) > 1:
+                    f["same_failure"] = [report.qualified_name(row) for row in group[1:]]
+                item = {"row": group[0], "status": f["status"]}
+                item.update(json_item(f, **limits))
+                items.append(item)
+        return items
+
+    def export_chunks(self, format, query):
+        """Chunks of one export format for the failed cases matching the query"""
+        report = self.report
+        statuses = query.statuses(FAILED_STATUSES)
+        filtered = query.get("q", "").strip("^ ") or query.get("suite") or len(statuses) < len(FAILED_STATUSES)
+        limits = query.limits()
+        if format == "junit":
+            if query.flag("groups"):
+                raise RequestError("groups cannot be used with the junit format")
+            rows = set(self.selection(query, statuses)) if filtered else None
+            return iter_junit_chunks([report], rows=rows, **limits)
+        rows = self.selection(query, statuses) if filtered else None
+        if query.flag("groups"):
+            failures = report.iter_failure_groups(rows)
+        else:
+            failures = report.iter_failures(rows)
+        return EXPORT_WRITERS[format](failures, **limits)
+
+
+def page(query, target, total, items_at):
+    """One page of a list of total items; items_at(start, stop) returns the items of a slice"""
+    offset = query.int("offset", 0)
+    limit = query.int("limit", PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    stop = min(offset + limit, total)
+    following = None
+    if stop < total:
+        params = {name: values[-1] for name, values in query.params.items()}
+        params["offset"] = stop
+        params["limit"] = limit
+        following = f"{target}?{urlencode(params)}"
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next": following,
+        "items": items_at(offset, stop) if offset < total else [],
+    }
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """GET endpoints of the API; self.server.served is the ServedReport"""
+
+    server_version = "XMLTestViewer"
+
+    def do_GET(self):
+        served = self.server.served
+        url = urlsplit(self.path)
+        etag = served.etag(self.path)
+        if self.not_modified(etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        query = Query(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            if parts[:1] != ["api"] or len(parts) < 2:
+                raise RequestError(f"no endpoint {url.path}", HTTPStatus.NOT_FOUND)
+            endpoint, arguments = parts[1], parts[2:]
+            if endpoint == "export" and len(arguments) == 1:
+                if arguments[0] not in FORMATS:
+                    raise RequestError(f"format must be one of {', '.join(FORMATS)}", HTTPStatus.NOT_FOUND)
+                chunks = served.export_chunks(arguments[0], query)
+                return self.send_export(arguments[0], chunks, etag)
+            self.send_json(self.api(served, endpoint, arguments, query, url.path), etag)
+        except RequestError as e:
+            self.send_json({"error": str(e)}, status=e.status)
+
+    def api(self, served, endpoint, arguments, query, target):
+        report = served.report
+        if endpoint == "report" and not arguments:
+            return served.summary()
+        if endpoint == "suites" and not arguments:
+            parent = query.int("parent", minimum=-1)
+            search = query.get("q", "").lower()
+            suites = [index for index, suite in enumerate(report.suites)
+                      if (parent is None or suite.parent == parent) and search in suite.name.lower()]
+            return page(query, target, len(suites),
+                        lambda start, stop: [served.suite_item(index) for index in suites[start:stop]])
+        if endpoint == "cases" and not arguments:
+            rows = served.selection(query, query.statuses())
+            return page(query, target, len(rows),
+                        lambda start, stop: [served.case_item(row) for row in rows[start:stop]])
+        if endpoint == "cases" and len(arguments) == 1:
+            try:
+                row = int(arguments[0])
+            except ValueError:
+                raise RequestError(f"no case {arguments[0]}", HTTPStatus.NOT_FOUND)
+            return served.case(row, query.flag("whole"))
+        if endpoint == "failures" and not arguments:
+            statuses = query.statuses(FAILED_STATUSES)
+            limits = query.limits()
+            if query.flag("groups"):
+                groups = served.groups(query.get("q", ""), statuses, served.suite_index(query))
+                return page(query, target, len(groups),
+                            lambda start, stop: served.failure_items(None, groups[start:stop], limits))
+            rows = served.selection(query, statuses)
+            return page(query, target, len(rows),
+                        lambda start, stop: served.failure_items(rows[start:stop], None, limits))
+        raise RequestError(f"no endpoint {target}", HTTPStatus.NOT_FOUND)
+
+    def not_modified(self, etag):
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        for tag in header.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in ("*", etag):
+                return True
+        return False
+
+    def send_json(self, data, etag=None, status=HTTPStatus.OK):
+        body = json.dumps(data, separators=(",", ":")).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_etag(etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_export(self, format, chunks, etag):
+        """Stream an export without a Content-Length; the connection is closed at its end"""
+        content_type, filename = EXPORTS[format]
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        self.send_etag(etag)
+        self.end_headers()
+        buffer, size = [], 0
+        try:
+            for chunk in chunks:
+                buffer.append(chunk)
+                size += len(chunk)
+                if size >= WRITE_SIZE:
+                    self.wfile.write("".join(buffer).encode("utf-8", "replace"))
+                    buffer, size = [], 0
+            self.wfile.write("".join(buffer).encode("utf-8", "replace"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away mid-export
+        self.close_connection = True
+
+    def send_etag(self, etag):
+        self.send_header("ETag", etag)
+        # Cached responses are checked with the server first, in case it was restarted on other files
+        self.send_header("Cache-Control", "no-cache")
+
+
+class ReportServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering the API for one ServedReport"""
+
+    daemon_threads = True
+
+    def __init__(self, address, served):
+        super().__init__(address, ReportRequestHandler)
+        self.served = served
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py --serve",
+        description="Load JUnit XML test reports once and serve them as a paginated JSON API."
+    )
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("reports", nargs="+", metavar="report.xml",
+                        help="JUnit XML report files (also .xml.gz, .xml.bz2, .xml.xz), zip archives "
+                             "of them, or directories to search for them; they are merged into one report")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"address to listen on; 0.0.0.0 to let other machines connect "
+                             f"(default: {DEFAULT_HOST}, this machine only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"port to listen on, 0 for any free port (default: {DEFAULT_PORT})")
+    return parser
+
+
+def load_served(paths):
+    """Parse the report files (through the parse cache) into a ServedReport"""
+    version = report_version(paths)
+    return ServedReport(paths, load_merged(paths), version)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        paths = collect_report_files(args.reports)
+        served = load_served(paths)
+    except (ET.ParseError, OSError, *archive_errors()) as e:
+        sys.stderr.write(f"{e}\n")
+        return EXIT_ERROR
+    try:
+        server = ReportServer((args.host, args.port), served)
+    except OSError as e:
+        sys.stderr.write(f"{args.host}:{args.port}: {e}\n")
+        return EXIT_ERROR
+
+    label = paths[0] if len(paths) == 1 else f"{len(paths)} reports"
+    host, port = server.server_address[:2]
+    sys.stderr.write(summary_line(label, served.report) + "\n")
+    sys.stderr.write(f"Serving on http://{host}:{port}/api/report (Ctrl+C to stop)\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return EXIT_PASSED
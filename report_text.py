@@ -0,0 +1,353 @@
+"""
+On-demand text of report elements.
+Failure bodies and <system-out>/<system-err> blocks are usually the bulk of a
+report but only a few of them are ever looked at, so the parser records where
+they are (a TextSpan) and they are read back here, through a memory-mapped
+view of the file, when a case is selected, copied or exported. Compressed
+and archived reports are read through their decompressed stream instead (see
+report_archive.py). Recently read texts are kept in a small LRU cache.
+
+Some suites capture whole service logs, hundreds of MB per case. A text is
+kept only up to its first and last XMLVIEWER_TEXT_KEEP_KB KB (counted in
+characters), with a note of how much was cut in between; longer spans are
+parsed a chunk at a time, so the full text is never in memory unless it is
+asked for (keep=0). The texts a loaded report holds in memory (failure
+messages, and bodies parsed without a file to read them back from) are cut
+the same way and count against a budget per load, XMLVIEWER_TEXT_BUDGET_MB;
+past it, they keep only SPENT_KEEP_CHARS at each end.
+"""
+
+import codecs
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from xml.parsers import expat
+
+from report_archive import ReportFile, disk_path, is_plain
+
+# Recently read texts kept, by count and by total length
+CACHE_ENTRIES = 64
+CACHE_CHARS = 64 * 1024 * 1024
+# Enough of the file to find its XML declaration
+HEAD_SIZE = 1024
+# Pages of a mapping count as resident until it is closed; SpanReader maps
+# its files afresh after reading this many bytes
+REMAP_BYTES = 32 * 1024 * 1024
+# Characters kept at each end of a text, in KB, and text held in memory per load, in MB (0: no limit);
+# both ends of a cut text fit in the viewer's details preview
+DEFAULT_KEEP_KB = 128
+DEFAULT_BUDGET_MB = 256
+# Characters kept at each end of a text once a load's budget is spent
+SPENT_KEEP_CHARS = 512
+# Bytes parsed at a time from a span that is cut
+READ_CHUNK = 1024 * 1024
+
+XML_DECLARATION = re.compile(rb"<\?xml[^>]*?encoding\s*=\s*[\"']([A-Za-z][A-Za-z0-9._-]*)[\"']")
+
+_cache = OrderedDict()
+_cache_chars = 0
+_lock = threading.Lock()
+
+
+def document_encoding(head):
+    """Encoding of a document from its first bytes: BOM, XML declaration or UTF-8"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8"
+    # Spans start mid-document, past the BOM, so the byte order has to be explicit
+    if head.startswith(codecs.BOM_UTF16_LE):
+        return "utf-16-le"
+    if head.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16-be"
+    match = XML_DECLARATION.match(head)
+    if match:
+        try:
+            return codecs.lookup(match.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def text_limits():
+    """(characters kept at each end of a text, characters held per load); 0 means no limit"""
+    keep = float(os.environ.get("XMLVIEWER_TEXT_KEEP_KB", DEFAULT_KEEP_KB))
+    budget = float(os.environ.get("XMLVIEWER_TEXT_BUDGET_MB", DEFAULT_BUDGET_MB))
+    return int(keep * 1024), int(budget * 1024 * 1024)
+
+
+class CutText(str):
+    """A text whose middle was replaced by a note; dropped is the number of characters cut"""
+
+    dropped = 0
+
+
+def join_cut(head, tail, dropped):
+    text = CutText(f"{head}\n\n... [{dropped:,} characters cut] ...\n\n{tail}")
+    text.dropped = dropped
+    return text
+
+
+def cut_text(text, keep):
+    """(text, characters dropped): text cut to its first and last keep characters; keep 0 keeps all"""
+    if not keep or len(text) <= 2 * keep:
+        return text, 0
+    dropped = len(text) - 2 * keep
+    return join_cut(text[:keep], text[-keep:], dropped), dropped
+
+
+class HeadTail:
+    """Character data handler that keeps only the first and last keep characters of a text"""
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.head = []
+        self.head_chars = 0
+        self.tail = deque()
+        self.tail_chars = 0
+        self.dropped = 0
+
+    def append(self, data):
+        if self.head_chars < self.keep:
+            part = data[:self.keep - self.head_chars]
+            self.head.append(part)
+            self.head_chars += len(part)
+            data = data[len(part):]
+            if not data:
+                return
+        tail = self.tail
+        tail.append(data)
+        self.tail_chars += len(data)
+        # Pieces that the last keep characters no longer reach
+        while self.tail_chars - len(tail[0]) >= self.keep:
+            piece = tail.popleft()
+            self.tail_chars -= len(piece)
+            self.dropped += len(piece)
+
+    def text(self):
+        head = "".join(self.head)
+        tail = "".join(self.tail)
+        dropped = self.dropped + max(len(tail) - self.keep, 0)
+        if not dropped:
+            return head + tail
+        return join_cut(head, tail[-self.keep:], dropped)
+
+
+class TextBudget:
+    """Cuts the texts a load holds in memory and counts what was cut.
+
+    Each text keeps its first and last keep characters; once budget
+    characters are held, only SPENT_KEEP_CHARS. Reports merged into
+    another are cut again against the budget of the merged report.
+    """
+
+    def __init__(self, keep=None, budget=None):
+        limits = text_limits()
+        self.keep = limits[0] if keep is None else keep
+        self.budget = limits[1] if budget is None else budget
+        self.held = 0
+        # Texts cut, characters dropped, and whether the budget ran out
+        self.cut = 0
+        self.dropped = 0
+        self.spent = False
+
+    def retain(self, text):
+        """text as the load keeps it; TextSpans and other non-strings are returned as is"""
+        if not isinstance(text, str):
+            return text
+        keep = self.keep
+        if self.budget and self.held >= self.budget:
+            self.spent = True
+            keep = min(keep, SPENT_KEEP_CHARS) if keep else SPENT_KEEP_CHARS
+        cut, dropped = cut_text(text, keep)
+        self.held += len(cut)
+        if dropped:
+            # Texts cut again in a merge were counted by the report they came from
+            self.cut += not isinstance(text, CutText)
+            self.dropped += dropped
+        return cut
+
+    def absorb(self, other):
+        """Count what another report's budget cut, e.g. one merged into this report"""
+        self.cut += other.cut
+        self.dropped += other.dropped
+        self.spent = self.spent or other.spent
+
+    def state(self):
+        return [self.held, self.cut, self.dropped, self.spent]
+
+    def restore(self, state):
+        self.held, self.cut, self.dropped, self.spent = state
+
+
+def element_text(data, tag, encoding):
+    """Text of an element from the bytes of its start tag and content (which has no child elements)"""
+    parts = []
+    # Not namespace-aware, so prefixed attributes need no declarations from the rest of the document
+    parser = expat.ParserCreate()
+    parser.CharacterDataHandler = parts.append
+    parser.Parse(data.decode(encoding) + f"</{tag}>", True)
+    return "".join(parts)
+
+
+def element_text_cut(chunks, tag, encoding, keep):
+    """Like element_text, from the bytes in chunks, keeping the first and last keep characters"""
+    collected = HeadTail(keep)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.buffer_size = 64 * 1024
+    parser.CharacterDataHandler = collected.append
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        parser.Parse(decoder.decode(chunk), False)
+    parser.Parse(decoder.decode(b"", True) + f"</{tag}>", True)
+    return collected.text()
+
+
+def read_chunks(f, length):
+    """length bytes of a stream in READ_CHUNK pieces"""
+    while length > 0:
+        chunk = f.read(min(length, READ_CHUNK))
+        if not chunk:
+            raise ValueError("file is shorter than when it was read")
+        length -= len(chunk)
+        yield chunk
+
+
+# ValueError covers decoding errors and an empty file
+READ_ERRORS = (OSError, ValueError, expat.ExpatError)
+
+
+def unavailable(span, reason):
+    return f"[{span.tag} text unavailable: {reason}]"
+
+
+def error_reason(error):
+    if isinstance(error, OSError):
+        return error.strerror
+    return "the report file changed since it was loaded"
+
+
+class SpanReader:
+    """Reads many spans, keeping each file mapped until closed.
+
+    For bulk exports, which read every failure once: it bypasses the LRU
+    cache and maps each file once instead of once per span. Texts are cut to
+    their first and last keep characters (by default XMLVIEWER_TEXT_KEEP_KB).
+    """
+
+    def __init__(self, keep=None):
+        # path -> (file, view, encoding); view is None for a decompressed stream
+        self.files = {}
+        self.bytes_read = 0
+        self.keep = text_limits()[0] if keep is None else keep
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, path, span):
+        """Text of span, or a short note saying why it cannot be read"""
+        try:
+            return self.read_text(path, span)
+        except READ_ERRORS as e:
+            return unavailable(span, error_reason(e))
+
+    def read_text(self, path, span):
+        entry = self.files.get(path)
+        if entry is None:
+            entry = self.files[path] = self.open(path)
+        f, view, encoding = entry
+        length = span.end - span.start
+        # A text has at most as many characters as bytes, so shorter spans are kept whole
+        cut = self.keep and length > 2 * self.keep
+        if view is None:
+            # Spans are mostly read in file order, so the stream seeks forward
+            f.seek(span.start)
+            if cut:
+                return element_text_cut(read_chunks(f, length), span.tag, encoding, self.keep)
+            data = f.read(length)
+            if len(data) < length:
+                raise ValueError("file is shorter than when it was read")
+            return element_text(data, span.tag, encoding)
+
+        if span.end > len(view):
+            raise ValueError("file is shorter than when it was read")
+        if cut:
+            chunks = (view[start:min(start + READ_CHUNK, span.end)]
+                      for start in range(span.start, span.end, READ_CHUNK))
+            text = element_text_cut(chunks, span.tag, encoding, self.keep)
+        else:
+            text = element_text(view[span.start:span.end], span.tag, encoding)
+
+        self.bytes_read += span.end - span.start
+        if self.bytes_read > REMAP_BYTES:
+            self.close()
+        return text
+
+    def open(self, path):
+        if not is_plain(path):
+            f = ReportFile(path)
+            try:
+                return f, None, document_encoding(f.read(HEAD_SIZE))
+            except BaseException:
+                f.close()
+                raise
+        f = open(path, "rb")
+        try:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            f.close()
+            raise
+        return f, view, document_encoding(view[:HEAD_SIZE])
+
+    def close(self):
+        for f, view, encoding in self.files.values():
+            if view is not None:
+                view.close()
+            f.close()
+        self.files.clear()
+        self.bytes_read = 0
+
+
+def read_span(path, span, keep=None):
+    """Read the text a TextSpan points to, through the LRU cache.
+
+    The text is cut to its first and last keep characters (by default
+    XMLVIEWER_TEXT_KEEP_KB; 0 reads it whole). If the file has changed or
+    disappeared since it was parsed, a short note saying so is returned
+    instead, so that an export of many cases still completes.
+    """
+    global _cache_chars
+    try:
+        stat = os.stat(disk_path(path))
+    except OSError as e:
+        return unavailable(span, e.strerror)
+
+    if keep is None:
+        keep = text_limits()[0]
+    key = (path, stat.st_mtime_ns, span.start, span.end, keep)
+    with _lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+            return text
+
+    # Mapped only for this read: a mapping kept open would stop a test run
+    # from rewriting the file on Windows
+    with SpanReader(keep) as reader:
+        try:
+            text = reader.read_text(path, span)
+        except READ_ERRORS as e:
+            # Not cached: the file may be readable again on the next try
+            return unavailable(span, error_reason(e))
+
+    with _lock:
+        _cache[key] = text
+        _cache_chars += len(text)
+        while _cache and (len(_cache) > CACHE_ENTRIES or _cache_chars > CACHE_CHARS):
+            _, evicted = _cache.popitem(last=False)
+            _cache_chars -= len(evicted)
+    return text
@@ -0,0 +1,117 @@
+"""
+Synthetic JUnit XML reports for benchmarks.
+Writes reports of a given shape (suites, cases per suite, failure ratio,
+stack trace and output size, suite nesting depth) straight to a file, so
+that reports much larger than memory can be produced. The output is
+deterministic for a given seed, and failures come from a handful of shared
+causes, as in real runs, so that fingerprinting has groups to find.
+
+    python synthetic_report.py out.xml --suites 200 --cases 250 --failure-ratio 0.02
+"""
+
+import argparse
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+# Failure causes: type, message template and the frames the failure starts in
+CAUSES = [
+    ("org.opentest4j.AssertionFailedError", "expected: <{a}> but was: <{b}>",
+     ["org.junit.jupiter.api.AssertionUtils.fail(AssertionUtils.java:{n})",
+      "org.junit.jupiter.api.AssertEquals.assertEquals(AssertEquals.java:{n})"]),
+    ("java.lang.NullPointerException", "Cannot invoke \"Object.toString()\" because \"value\" is null",
+     ["com.example.core.Formatter.format(Formatter.java:{n})",
+      "com.example.core.Renderer.render(Renderer.java:{n})"]),
+    ("java.lang.IllegalStateException", "Fixture database at /tmp/db-{a}/data.db failed to start after {b}ms",
+     ["com.example.fixtures.DatabaseFixture.start(DatabaseFixture.java:{n})",
+      "com.example.fixtures.BaseTest.setUp(BaseTest.java:{n})"]),
+    ("java.util.concurrent.TimeoutException", "Timed out after {a} seconds waiting for 0x{b:08x}",
+     ["java.util.concurrent.FutureTask.get(FutureTask.java:{n})",
+      "com.example.net.Client.call(Client.java:{n})"]),
+    ("AssertionError", "assert {a} == {b}",
+     ["tests/test_module.py:{n}: in test_case"]),
+]
+FRAMEWORK_FRAME = "at org.junit.platform.engine.support.hierarchical.NodeTestTask.execute(NodeTestTask.java:{n})"
+
+
+def failure_body(rng, cause, classname, name, trace_lines):
+    type, message, frames = cause
+    lines = [f"{type}: {message}"]
+    lines.extend("\tat " + frame.format(n=rng.randint(10, 500)) for frame in frames)
+    lines.append(f"\tat {classname}.{name}({classname.rsplit('.', 1)[-1]}.java:{rng.randint(10, 500)})")
+    while len(lines) < trace_lines:
+        lines.append("\t" + FRAMEWORK_FRAME.format(n=rng.randint(10, 500)))
+    return "\n".join(lines[:max(trace_lines, 1)])
+
+
+def write_report(path, suites=10, cases=100, failure_ratio=0.05, trace_lines=30, output_lines=0,
+                 output_ratio=0.1, depth=1, skipped_ratio=0.02, seed=1):
+    """Write a report to path and return its number of test cases.
+
+    Each of the suites top-level suites holds depth - 1 levels of nested
+    suites with cases test cases in the innermost one. A failing case has a
+    stack trace of trace_lines lines; output_ratio of the cases have
+    output_lines lines of <system-out>.
+    """
+    rng = random.Random(seed)
+    total = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="synthetic">\n')
+        for suite in range(suites):
+            package = f"com.example.pkg{suite % 50}"
+            names = [f"Suite{suite}"] + [f"Suite{suite}.Level{level}" for level in range(1, depth)]
+            for level, suite_name in enumerate(names):
+                indent = "  " * (level + 1)
+                out.write(f'{indent}<testsuite name={quoteattr(suite_name)} tests="{cases}">\n')
+
+            indent = "  " * (depth + 1)
+            classname = f"{package}.Suite{suite}Test"
+            for case in range(cases):
+                name = f"test{case}"
+                # Mostly quick cases with a long tail of slow ones
+                time = rng.expovariate(20.0) * (50 if rng.random() < 0.01 else 1)
+                out.write(f'{indent}<testcase classname="{classname}" name="{name}" time="{time:.3f}"')
+                roll = rng.random()
+                children = []
+                if roll < failure_ratio:
+                    cause = CAUSES[min(int(rng.expovariate(1.0)), len(CAUSES) - 1)]
+                    message = cause[1].format(a=rng.randint(0, 1000), b=rng.randint(0, 1000))
+                    tag = "error" if rng.random() < 0.2 else "failure"
+                    children.append(f'<{tag} message={quoteattr(message)} type="{cause[0]}">'
+                                    f'{escape(failure_body(rng, cause, classname, name, trace_lines))}</{tag}>')
+                elif roll < failure_ratio + skipped_ratio:
+                    children.append('<skipped message="disabled"/>')
+                if output_lines and rng.random() < output_ratio:
+                    log = "\n".join(f"{time:.3f} INFO {classname} step {line} of {name}"
+                                    for line in range(output_lines))
+                    children.append(f"<system-out>{escape(log)}</system-out>")
+                if children:
+                    out.write(">\n" + "".join(f"{indent}  {child}\n" for child in children) + f"{indent}</testcase>\n")
+                else:
+                    out.write("/>\n")
+                total += 1
+
+            for level in reversed(range(depth)):
+                out.write("  " * (level + 1) + "</testsuite>\n")
+        out.write("</testsuites>\n")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic JUnit XML report.")
+    parser.add_argument("output", help="report file to write")
+    parser.add_argument("--suites", type=int, default=10, help="top-level suites (default: 10)")
+    parser.add_argument("--cases", type=int, default=100, help="test cases per suite (default: 100)")
+    parser.add_argument("--failure-ratio", type=float, default=0.05, help="fraction of failing cases (default: 0.05)")
+    parser.add_argument("--trace-lines", type=int, default=30, help="stack trace lines per failure (default: 30)")
+    parser.add_argument("--output-lines", type=int, default=0, help="<system-out> lines per case with output (default: 0)")
+    parser.add_argument("--output-ratio", type=float, default=0.1, help="fraction of cases with output (default: 0.1)")
+    parser.add_argument("--depth", type=int, default=1, help="suite nesting depth (default: 1)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    count = write_report(args.output, args.suites, args.cases, args.failure_ratio, args.trace_lines,
+                         args.output_lines, args.output_ratio, max(args.depth, 1), seed=args.seed)
+    print(f"{args.output}: {count} test cases")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1844 @@
+"""
+XML Test Results Viewer
+A Windows application to view JUnit XML test reports in a tree structure.
+"""
+
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+from report_archive import archive_errors, disk_path, is_archive, is_plain, list_members, member_path
+from report_diff import CHANGES, CHANGE_TITLES, ReportDiff
+from report_export import export_format, format_as_yaml, format_as_json, write_failures
+from report_loader import ReportLoader, MultiReportLoader, WatchLoader, collect_report_files, load_merged
+from report_model import TestReport, TextSpan, FAILURE, ERROR, SKIPPED, DURATION_LABELS
+from report_profile import DEFAULT_TRACE, profiler
+
+# Interval between queue polls while a report is loading
+LOAD_POLL_MS = 15
+# Time budget for applying parsed rows to the tree per poll
+LOAD_BATCH_MS = 50
+# Pause in typing before the search filter is applied
+FILTER_DELAY_MS = 250
+# Characters inserted into the details panel per main loop step
+DETAILS_CHUNK_CHARS = 64 * 1024
+# Longer stack traces and logs are cut here until "Load full text" is clicked
+DETAILS_PREVIEW_CHARS = 512 * 1024
+# Cases and suites listed by the "Slowest" window
+TOP_K = 100
+# Width of the longest bar of a suite's duration histogram, in characters
+HISTOGRAM_WIDTH = 30
+# Phases summarized in the status bar when a load finishes with --profile
+LOAD_PHASES = ("cache_load", "parse", "model_build", "queue_wait", "parse_wait", "merge",
+               "tree_insert", "search_index", "finish_load")
+# File dialog choices for reports, compressed or not, and zip archives of them
+REPORT_FILETYPES = [("Test reports", "*.xml *.xml.gz *.xml.bz2 *.xml.xz *.zip"), ("XML files", "*.xml"),
+                    ("Zip archives", "*.zip"), ("All files", "*.*")]
+# Tree columns that can be sorted by clicking their heading, with their titles
+SORT_COLUMNS = {"tests": "Tests", "failures": "Failures", "time": "Time"}
+# Prefixes of the tree ids of model items (file, suite, case), by their rank in report order
+MODEL_KINDS = {"f": 0, "s": 0, "c": 2}
+
+
+class XMLTestViewer:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("XML Test Results Viewer")
+        self.root.geometry("1200x800")
+        self.root.configure(bg="#1a1a2e")
+        
+        # Style configuration
+        self.setup_styles()
+        
+        # Main container
+        self.main_frame = ttk.Frame(root, style="Main.TFrame")
+        self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Header
+        self.create_header()
+        
+        # Content area
+        self.content_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
+        self.content_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        
+        # Tree view with scrollbar
+        self.create_tree_view()
+        
+        # Details panel
+        self.create_details_panel()
+        
+        # Status bar
+        self.create_status_bar()
+        
+        # Parsed report; tree item ids map to its suite and row indices
+        self.report = TestReport()
+        
+        # Suites whose test case rows have not been created yet, with their placeholder item
+        self.lazy_suites = {}
+        # Rows of lazy suites that a search has already created
+        self.partial_suites = {}
+        
+        # Search index of the loaded report and the pending debounced filter
+        self.index = None
+        self.filter_job = None
+        self.filtered = False
+        
+        # Background load in progress, if any
+        self.loader = None
+        self.load_cases = 0
+        self.loaded_paths = []
+        self.group_by_file = False
+        
+        # Details panel text still to be inserted, as [text, position, stop, tag, index],
+        # and the "Load full text" buttons in the panel
+        self.render_queue = deque()
+        self.render_job = None
+        self.more_buttons = []
+        # Poll of the worker reading the selected case's texts out of a compressed report
+        self.text_job = None
+        
+        # Test history database, read when a test case is selected; opened on first use
+        self.history = None
+        
+        # Column the tree is sorted by (None: report order) and its direction
+        self.sort_column = None
+        self.sort_descending = True
+        
+        # With --profile: trace file written after each load and on exit, and when the current load began
+        self.profile_path = None
+        self.load_started = None
+        
+    def setup_styles(self):
+        style = ttk.Style()
+        style.theme_use("clam")
+        
+        # Colors
+        bg_dark = "#1a1a2e"
+        bg_medium = "#16213e"
+        bg_light = "#0f3460"
+        accent = "#e94560"
+        success = "#00d9a0"
+        text_light = "#eaeaea"
+        text_muted = "#a0a0a0"
+        
+        # Frame styles
+        style.configure("Main.TFrame", background=bg_dark)
+        style.configure("Tree.TFrame", background=bg_medium)
+        style.configure("Details.TFrame", background=bg_medium)
+        
+        # Label styles
+        style.configure("Header.TLabel", 
+                       background=bg_dark, 
+                       foreground=text_light,
+                       font=("Segoe UI", 24, "bold"))
+        style.configure("SubHeader.TLabel",
+                       background=bg_dark,
+                       foreground=text_muted,
+                       font=("Segoe UI", 10))
+        style.configure("Status.TLabel",
+                       background=bg_medium,
+                       foreground=text_muted,
+                       font=("Segoe UI", 9))
+        
+        # Button styles
+        style.configure("Open.TButton",
+                       background=bg_light,
+                       foreground=text_light,
+                       font=("Segoe UI", 10, "bold"),
+                       padding=(20, 10))
+        style.map("Open.TButton",
+                 background=[("active", accent)])
+        
+        style.configure("Copy.TButton",
+                       background=accent,
+                       foreground=text_light,
+                       font=("Segoe UI", 9),
+                       padding=(8, 4))
+        style.map("Copy.TButton",
+                 background=[("active", "#ff6b6b")])
+        
+        # Treeview styles
+        style.configure("Custom.Treeview",
+                       background=bg_medium,
+                       foreground=text_light,
+                       fieldbackground=bg_medium,
+                       font=("Consolas", 10),
+                       rowheight=28)
+        style.configure("Custom.Treeview.Heading",
+                       background=bg_light,
+                       foreground=text_light,
+                       font=("Segoe UI", 10, "bold"))
+        style.map("Custom.Treeview",
+                 background=[("selected", bg_light)],
+                 foreground=[("selected", text_light)])
+        
+        # Filter bar styles
+        style.configure("Filter.TCheckbutton",
+                       background=bg_medium,
+                       foreground=text_light,
+                       font=("Segoe UI", 9))
+        style.map("Filter.TCheckbutton",
+                 background=[("active", bg_medium)])
+        style.configure("History.TCheckbutton",
+                       background=bg_dark,
+                       foreground=text_muted,
+                       font=("Segoe UI", 10))
+        style.map("History.TCheckbutton",
+                 background=[("active", bg_dark)])
+        
+    def create_header(self):
+        header_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
+        header_frame.pack(fill=tk.X)
+        
+        # Title
+        title_label = ttk.Label(header_frame, 
+                               text="XML Test Results Viewer",
+                               style="Header.TLabel")
+        title_label.pack(side=tk.LEFT)
+        
+        # Open button
+        self.open_btn = ttk.Button(header_frame,
+                                   text="📂 Open XML File",
+                                   style="Open.TButton",
+                                   command=self.open_file)
+        self.open_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Open folder button (all XML files below it, e.g. one TEST-*.xml per CI shard)
+        self.open_dir_btn = ttk.Button(header_frame,
+                                       text="🗂 Open Folder",
+                                       style="Open.TButton",
+                                       command=self.open_folder)
+        self.open_dir_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Export of every failure of the loaded report to a file
+        self.export_btn = ttk.Button(header_frame,
+                                     text="💾 Export Failures",
+                                     style="Open.TButton",
+                                     command=self.export_failures)
+        self.export_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Comparison of the loaded report against a baseline run
+        self.compare_btn = ttk.Button(header_frame,
+                                      text="⇄ Compare",
+                                      style="Open.TButton",
+                                      command=self.compare_reports)
+        self.compare_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Failures grouped by fingerprint, for when one cause fails many cases
+        self.groups_btn = ttk.Button(header_frame,
+                                     text="🧩 Failure Groups",
+                                     style="Open.TButton",
+                                     command=self.show_failure_groups)
+        self.groups_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Top K slowest test cases and suites
+        self.slowest_btn = ttk.Button(header_frame,
+                                      text="⏱ Slowest",
+                                      style="Open.TButton",
+                                      command=self.show_slowest)
+        self.slowest_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Cancel button, only shown while a load is running
+        self.cancel_btn = ttk.Button(header_frame,
+                                     text="✖ Cancel",
+                                     style="Open.TButton",
+                                     command=self.cancel_load)
+        
+        # Subtitle
+        subtitle_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
+        subtitle_frame.pack(fill=tk.X, pady=(5, 0))
+        self.subtitle_label = ttk.Label(subtitle_frame,
+                                        text="Open a JUnit XML file to view test results",
+                                        style="SubHeader.TLabel")
+        self.subtitle_label.pack(side=tk.LEFT)
+        
+        # Opt-in recording of every loaded report in the test history database
+        self.record_history = tk.BooleanVar(value=False)
+        ttk.Checkbutton(subtitle_frame,
+                        text="Record history",
+                        variable=self.record_history,
+                        style="History.TCheckbutton").pack(side=tk.RIGHT, padx=(10, 0))
+        
+        # Grouping of multi-file loads
+        self.group_by = tk.StringVar(value="File")
+        group_combo = ttk.Combobox(subtitle_frame,
+                                   textvariable=self.group_by,
+                                   values=("File", "Suite name"),
+                                   state="readonly",
+                                   width=12)
+        group_combo.pack(side=tk.RIGHT)
+        group_combo.bind("<<ComboboxSelected>>", self.on_group_change)
+        ttk.Label(subtitle_frame,
+                  text="Group files by:",
+                  style="SubHeader.TLabel").pack(side=tk.RIGHT, padx=(0, 5))
+        
+    def create_tree_view(self):
+        # Left panel for tree
+        tree_frame = ttk.Frame(self.content_frame, style="Tree.TFrame")
+        tree_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        
+        # Search box and status toggles
+        self.create_filter_bar(tree_frame)
+        
+        # Tree container with border
+        tree_container = tk.Frame(tree_frame, bg="#0f3460", bd=2)
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Scrollbars
+        y_scroll = ttk.Scrollbar(tree_container, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        x_scroll = ttk.Scrollbar(tree_container, orient=tk.HORIZONTAL)
+        x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # Treeview
+        self.tree = ttk.Treeview(tree_container,
+                                 style="Custom.Treeview",
+                                 yscrollcommand=y_scroll.set,
+                                 xscrollcommand=x_scroll.set,
+                                 columns=("status", "tests", "failures", "time", "action"),
+                                 selectmode="browse")
+        
+        y_scroll.config(command=self.tree.yview)
+        x_scroll.config(command=self.tree.xview)
+        
+        # Column configuration; clicking a numeric heading sorts by it, the name heading restores report order
+        self.tree.heading("#0", text="Test Suite / Test Case", anchor=tk.W,
+                          command=lambda: self.sort_by(None))
+        self.tree.heading("status", text="Status", anchor=tk.CENTER)
+        for column, title in SORT_COLUMNS.items():
+            self.tree.heading(column, text=title, anchor=tk.CENTER,
+                              command=lambda column=column: self.sort_by(column))
+        self.tree.heading("action", text="", anchor=tk.CENTER)
+        
+        self.tree.column("#0", width=450, minwidth=300)
+        self.tree.column("status", width=100, minwidth=80, anchor=tk.CENTER)
+        self.tree.column("tests", width=60, minwidth=50, anchor=tk.CENTER)
+        self.tree.column("failures", width=60, minwidth=50, anchor=tk.CENTER)
+        self.tree.column("time", width=80, minwidth=60, anchor=tk.CENTER)
+        self.tree.column("action", width=80, minwidth=60, anchor=tk.CENTER)
+        
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Bind selection event
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        
+        # Bind expand event to fill collapsed suites on demand
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+        
+        # Bind single click on action column for copy
+        self.tree.bind("<Button-1>", self.on_click)
+        
+        # Bind motion for cursor change on action column
+        self.tree.bind("<Motion>", self.on_motion)
+        
+        # Tags for coloring
+        self.tree.tag_configure("failure", foreground="#e94560")
+        self.tree.tag_configure("success", foreground="#00d9a0")
+        self.tree.tag_configure("skipped", foreground="#ffa500")
+        self.tree.tag_configure("suite_fail", foreground="#ff6b6b")
+        self.tree.tag_configure("suite_pass", foreground="#00d9a0")
+        
+    def create_filter_bar(self, parent):
+        filter_frame = tk.Frame(parent, bg="#16213e")
+        filter_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+        
+        tk.Label(filter_frame,
+                 text="🔍",
+                 bg="#16213e",
+                 fg="#a0a0a0",
+                 font=("Segoe UI", 10)).pack(side=tk.LEFT)
+        
+        # Name, class, failure type or message; a leading ^ matches prefixes only
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_filter_change)
+        search_entry = tk.Entry(filter_frame,
+                                textvariable=self.search_var,
+                                bg="#1a1a2e",
+                                fg="#eaeaea",
+                                insertbackground="#eaeaea",
+                                font=("Consolas", 10),
+                                bd=0)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, ipady=3)
+        
+        self.status_filters = {}
+        for status, text in (("failure", "Fail"), ("error", "Error"), ("skipped", "Skip"), ("passed", "Pass")):
+            var = tk.BooleanVar(value=True)
+            self.status_filters[status] = var
+            ttk.Checkbutton(filter_frame,
+                            text=text,
+                            variable=var,
+                            style="Filter.TCheckbutton",
+                            command=self.on_filter_change).pack(side=tk.LEFT, padx=2)
+        
+    def create_details_panel(self):
+        # Right panel for details; its fixed width keeps the layout while the contents are deferred
+        self.details_frame = ttk.Frame(self.content_frame, style="Details.TFrame", width=400)
+        self.details_frame.pack(side=tk.RIGHT, fill=tk.BOTH, padx=(5, 0))
+        self.details_frame.pack_propagate(False)
+        
+        # The contents are not needed for the first paint
+        self.details_text = None
+        self.root.after_idle(self.build_details_panel)
+        
+    def build_details_panel(self):
+        """Create the details panel's contents, once the window is idle or when first needed"""
+        if self.details_text is not None:
+            return
+            
+        # Details container
+        details_container = tk.Frame(self.details_frame, bg="#16213e", bd=2)
+        details_container.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Header with copy button
+        header_row = tk.Frame(details_container, bg="#16213e")
+        header_row.pack(fill=tk.X, padx=10, pady=(10, 5))
+        
+        details_label = tk.Label(header_row, 
+                                text="Details",
+                                bg="#16213e",
+                                fg="#eaeaea",
+                                font=("Segoe UI", 14, "bold"))
+        details_label.pack(side=tk.LEFT)
+        
+        self.copy_btn = tk.Button(header_row,
+                                  text="📋 Copy Failures",
+                                  bg="#e94560",
+                                  fg="white",
+                                  font=("Segoe UI", 9, "bold"),
+                                  bd=0,
+                                  padx=12,
+                                  pady=4,
+                                  cursor="hand2",
+                                  command=self.copy_selected_failures)
+        self.copy_btn.pack(side=tk.RIGHT)
+        self.copy_btn.bind("<Enter>", lambda e: self.copy_btn.config(bg="#ff6b6b"))
+        self.copy_btn.bind("<Leave>", lambda e: self.copy_btn.config(bg="#e94560"))
+        
+        # Text area for details
+        text_frame = tk.Frame(details_container, bg="#0f3460", bd=1)
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        
+        text_scroll = ttk.Scrollbar(text_frame)
+        text_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.details_text = tk.Text(text_frame,
+                                    bg="#1a1a2e",
+                                    fg="#eaeaea",
+                                    font=("Consolas", 10),
+                                    wrap=tk.WORD,
+                                    yscrollcommand=text_scroll.set,
+                                    padx=10,
+                                    pady=10,
+                                    bd=0)
+        self.details_text.pack(fill=tk.BOTH, expand=True)
+        text_scroll.config(command=self.details_text.yview)
+        
+        # Configure text tags
+        self.details_text.tag_configure("header", foreground="#00d9a0", font=("Consolas", 11, "bold"))
+        self.details_text.tag_configure("error", foreground="#e94560")
+        self.details_text.tag_configure("info", foreground="#a0a0a0")
+        
+    def create_status_bar(self):
+        status_frame = ttk.Frame(self.main_frame, style="Main.TFrame")
+        status_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        self.status_label = ttk.Label(status_frame,
+                                      text="Ready",
+                                      style="Status.TLabel")
+        self.status_label.pack(side=tk.LEFT)
+        
+        self.stats_label = ttk.Label(status_frame,
+                                     text="",
+                                     style="Status.TLabel")
+        self.stats_label.pack(side=tk.RIGHT)
+        
+    def open_file(self):
+        filepaths = filedialog.askopenfilenames(
+            title="Open XML Test Results",
+            filetypes=REPORT_FILETYPES
+        )
+        if len(filepaths) == 1 and is_archive(filepaths[0]):
+            # A single archive: let the user pick its reports
+            self.open_archive(filepaths[0])
+        elif filepaths:
+            self.load_files(list(filepaths))
+            
+    def open_archive(self, archive):
+        """Show the reports in a zip archive, with their sizes, to pick the ones to load"""
+        try:
+            members = list_members(archive)
+        except (OSError, *archive_errors()) as e:
+            messagebox.showerror("Error", f"Failed to read {archive}: {e}")
+            return
+        if not members:
+            messagebox.showinfo("Info", f"No XML files found in {os.path.basename(archive)}")
+            return
+        ArchiveWindow(self, archive, members)
+            
+    def open_folder(self):
+        directory = filedialog.askdirectory(title="Open Folder of XML Test Results")
+        if directory:
+            self.load_files([directory])
+            
+    def on_group_change(self, event=None):
+        # Regrouping a merged load means merging again
+        if len(self.loaded_paths) > 1:
+            self.load_files(self.loaded_paths)
+            
+    def load_files(self, paths):
+        """Load files and/or directories; several reports are parsed in parallel and merged"""
+        try:
+            filepaths = collect_report_files(paths)
+        except (OSError, *archive_errors()) as e:
+            messagebox.showerror("Error", f"Failed to load files: {e}")
+            return
+        if not filepaths:
+            messagebox.showinfo("Info", "No XML files found")
+            return
+        if len(filepaths) == 1:
+            self.load_xml(filepaths[0])
+            return
+            
+        # Only one load at a time: opening new files abandons the previous load
+        self.cancel_load()
+        
+        group_by = "suite" if self.group_by.get() == "Suite name" else "file"
+        try:
+            loader = MultiReportLoader(filepaths, group_by)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load files: {e}")
+            return
+        self.start_load(loader, filepaths)
+            
+    def load_xml(self, filepath):
+        # Only one load at a time: opening a new file abandons the previous one
+        self.cancel_load()
+        
+        try:
+            loader = ReportLoader(filepath)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load file: {e}")
+            return
+        self.start_load(loader, [filepath])
+        
+    def start_load(self, loader, paths):
+        # Clear existing data; filtered-out items are only detached, so reattach them first
+        if self.filtered:
+            self.show_all_rows()
+        self.tree.delete(*self.tree.get_children())
+        self.report = loader.report
+        self.index = None
+        self.filtered = False
+        self.lazy_suites.clear()
+        self.partial_suites.clear()
+        self.cancel_render()
+        self.build_details_panel()
+        self.details_text.delete(1.0, tk.END)
+        self.stats_label.config(text="")
+        
+        self.loader = loader
+        self.loaded_paths = paths
+        self.load_cases = 0
+        self.load_started = time.perf_counter()
+        # Multi-file loads grouped by file get a node per file above its suites
+        self.group_by_file = getattr(loader, "group_by", None) == "file"
+        
+        self.cancel_btn.pack(side=tk.RIGHT, padx=5, after=self.open_btn)
+        self.subtitle_label.config(text=f"Loading: {os.path.basename(loader.title)}")
+        self.status_label.config(text=f"Loading {loader.title}...")
+        
+        loader.start()
+        self.root.after(LOAD_POLL_MS, self.drain_load_queue, loader)
+        
+    def watch_path(self, path):
+        """Follow a growing report file, or a directory that report files are written to"""
+        self.cancel_load()
+        
+        try:
+            loader = WatchLoader(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to watch {path}: {e}")
+            return
+        self.start_load(loader, [path])
+        self.subtitle_label.config(text=f"Watching: {os.path.basename(os.path.normpath(path))}")
+        
+    def cancel_load(self):
+        if self.loader is None:
+            return
+        self.loader.cancel()
+        watching = getattr(self.loader, "watching", False)
+        self.loader = None
+        self.cancel_btn.pack_forget()
+        if watching:
+            self.status_label.config(text=f"Stopped watching after {self.load_cases:,} test cases")
+        else:
+            self.status_label.config(text=f"Load cancelled after {self.load_cases:,} test cases")
+        
+    def drain_load_queue(self, loader):
+        """Apply queued parser events to the tree for at most LOAD_BATCH_MS per call"""
+        if loader is not self.loader:
+            return  # Cancelled or superseded by another load
+            
+        deadline = time.perf_counter() + LOAD_BATCH_MS / 1000
+        while time.perf_counter() < deadline:
+            try:
+                kind, payload = loader.queue.get_nowait()
+            except queue.Empty:
+                break
+                
+            if kind == "events":
+                with profiler.phase("tree_insert") as span:
+                    span.items = len(payload)
+                    for event, data in payload:
+                        if event == "testcase":
+                            self.insert_testcase(*data)
+                            self.load_cases += 1
+                        elif event == "suite":
+                            self.insert_testsuite(data)
+                        elif event == "suite_update":
+                            self.update_testsuite(data)
+                        elif event == "file":
+                            self.insert_file(data)
+            elif kind == "update":
+                # Watch mode: a poll appended results; the watch itself keeps going
+                self.index = payload
+                self.update_stats()
+                self.apply_filter()
+                self.apply_sort()
+                self.status_label.config(
+                    text=f"Watching {loader.title} | {len(self.report):,} test cases, "
+                         f"updated {time.strftime('%H:%M:%S')}"
+                )
+            elif kind == "restart":
+                # The watched file was rewritten from scratch
+                self.watch_path(loader.path)
+                return
+            elif kind == "done":
+                self.finish_load(loader)
+                return
+            elif kind == "error":
+                self.loader = None
+                self.cancel_btn.pack_forget()
+                self.status_label.config(text="Load failed")
+                messagebox.showerror(*payload)
+                return
+                
+        if not getattr(loader, "watching", False):
+            self.show_load_progress(loader)
+        self.root.after(LOAD_POLL_MS, self.drain_load_queue, loader)
+        
+    def show_load_progress(self, loader):
+        mb_read = loader.bytes_read / (1024 * 1024)
+        mb_total = loader.total_bytes / (1024 * 1024)
+        percent = 100 * loader.bytes_read // loader.total_bytes if loader.total_bytes else 100
+        self.status_label.config(
+            text=f"Loading... {mb_read:.1f} / {mb_total:.1f} MB ({percent}%) | "
+                 f"{loader.cases_parsed:,} parsed, {self.load_cases:,} loaded"
+        )
+        
+    def finish_load(self, loader):
+        self.loader = None
+        self.cancel_btn.pack_forget()
+        
+        # Update UI
+        filename = os.path.basename(loader.title)
+        self.subtitle_label.config(text=f"Loaded: {filename}")
+        self.update_stats()
+        cached = " (from cache)" if getattr(loader, "from_cache", False) else ""
+        self.status_label.config(text=f"Loaded {loader.title}{cached}")
+        
+        # Built by the loader thread after parsing
+        self.index = loader.index
+        with profiler.phase("finish_load"):
+            self.apply_filter()
+            self.apply_sort()
+            
+        if profiler.enabled:
+            self.status_label.config(
+                text=f"Loaded {loader.title}{cached} | {profiler.summary_line(LOAD_PHASES, self.load_started)}"
+            )
+            self.write_profile()
+            
+        if self.record_history.get():
+            self.start_record(loader.report)
+            
+    def when_mapped(self, callback):
+        """Run callback once the main window is shown, when the event queue is next idle"""
+        if self.root.winfo_ismapped():
+            self.root.after_idle(callback)
+            return
+            
+        def on_map(event):
+            # <Map> of the root is also bound for every widget in it
+            if event.widget is not self.root:
+                return
+            self.root.unbind("<Map>", binding)
+            self.root.after_idle(callback)
+            
+        binding = self.root.bind("<Map>", on_map, "+")
+        
+    def enable_profile(self, path):
+        """Profile from now on, writing the trace to path after each load and when the window closes"""
+        profiler.enable()
+        self.profile_path = path
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
+    def write_profile(self):
+        try:
+            profiler.write(self.profile_path)
+        except OSError as e:
+            self.status_label.config(text=f"Failed to write profile trace: {e}")
+            
+    def close(self):
+        if self.profile_path is not None:
+            self.write_profile()
+        self.root.destroy()
+        
+    def history_store(self):
+        # Imported here: sqlite3 is only needed once a test case is selected or a report recorded
+        if self.history is None:
+            from report_history import HistoryStore
+            self.history = HistoryStore()
+        return self.history
+        
+    def start_record(self, report):
+        """Record a loaded report in the history database from a worker thread"""
+        import sqlite3
+        from report_history import HistoryStore
+        
+        path = self.history_store().path
+        
+        def record():
+            try:
+                with HistoryStore(path) as history:
+                    history.record(report)
+            except (sqlite3.Error, OSError):
+                pass  # History is best effort; the report itself is loaded
+                
+        threading.Thread(target=record, daemon=True).start()
+        
+    def test_history(self, row):
+        """Details panel parts with the recorded history of a test case, if any"""
+        import sqlite3
+        from report_history import stats_lines
+        
+        try:
+            stats = self.history_store().test_stats(self.report.classnames[row], self.report.names[row])
+        except (sqlite3.Error, OSError):
+            return []
+        if stats is None:
+            return []
+        return [("HISTORY\n", "header"), ("\n".join(stats_lines(stats)) + "\n\n", "info")]
+        
+    def update_stats(self):
+        # Totals are computed from the (possibly merged) data, not read from a root element
+        totals = self.report.totals()
+        files = len(self.report.sources)
+        
+        # Texts held in memory (failure messages, and bodies without a file to read them from)
+        # longer than the text limits were cut while loading
+        budget = self.report.text_budget
+        cut = ""
+        if budget.cut:
+            cut = f" | ✂ {budget.cut:,} long text(s) cut" + (" (text budget reached)" if budget.spent else "")
+        
+        self.stats_label.config(
+            text=(f"Files: {files} | " if files > 1 else "") +
+                 f"Tests: {totals['tests']} | Failures: {totals['failures']} | "
+                 f"Errors: {totals['errors']} | Time: {totals['time']:.3f}s" + cut
+        )
+        
+    def on_filter_change(self, *args):
+        """Debounce typing: filter once the user pauses"""
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+        
+    def apply_filter(self):
+        self.filter_job = None
+        if self.index is None:
+            return  # Applied when the load finishes
+            
+        statuses = [status for status, var in self.status_filters.items() if var.get()]
+        query = self.search_var.get()
+        matches = self.index.filter(query, statuses)
+        
+        if matches is None:
+            if self.filtered:
+                self.show_all_rows()
+                self.filtered = False
+                self.apply_sort()
+                self.status_label.config(text=f"Showing all {len(self.report):,} test cases")
+            return
+            
+        self.show_matching_rows(matches, open_suites=bool(query.strip("^ ")))
+        self.filtered = True
+        self.apply_sort()
+        self.status_label.config(text=f"Showing {len(matches):,} of {len(self.report):,} test cases")
+        
+    def sort_by(self, column):
+        """Sort the tree by a column, largest first; clicking the same heading again reverses it"""
+        if column is not None and column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_descending = True
+        self.sort_column = column
+        for name, title in SORT_COLUMNS.items():
+            arrow = (" ▼" if self.sort_descending else " ▲") if name == column else ""
+            self.tree.heading(name, text=title + arrow)
+        self.reorder(self.sort_key() if column is not None else None)
+        
+    def sort_key(self):
+        """Numeric sort key of a tree item id for the current sort column"""
+        report = self.report
+        column = self.sort_column
+        suites = report.suites
+        if column == "time":
+            case_values = report.times
+            suite_values = [suite.time for suite in suites]
+        elif column == "failures":
+            failures = report.failures
+            case_values = None
+            suite_values = [suite.failures for suite in suites]
+        else:
+            case_values = None
+            suite_values = [suite.tests for suite in suites]
+        file_values = [0] * len(report.sources)
+        for suite_index, suite in enumerate(suites):
+            if suite.source < len(file_values) and suite.parent < 0:
+                file_values[suite.source] += suite_values[suite_index]
+                
+        # "Loading..." placeholders have Tk's own ids (e.g. "I001") and go last either way
+        last = float("-inf") if self.sort_descending else float("inf")
+        
+        def key(item_id):
+            kind, index = item_id[:1], item_id[1:]
+            if kind not in MODEL_KINDS or not index.isdigit():
+                return last
+            index = int(index)
+            if kind == "c":
+                if case_values is not None:
+                    return case_values[index]
+                return 1 if column == "failures" and index in failures else 0
+            return suite_values[index] if kind == "s" else file_values[index]
+        return key
+        
+    def apply_sort(self):
+        """Sort rows added or reattached since the last sort"""
+        if self.sort_column is not None:
+            self.reorder(self.sort_key())
+            
+    def reorder(self, key):
+        """Reorder the existing rows under every parent in the tree; nothing is recreated"""
+        parents = [""]
+        if self.group_by_file:
+            parents += [f"f{source}" for source in range(len(self.report.sources))]
+        parents += [f"s{index}" for index in range(len(self.report.suites))]
+        for parent in parents:
+            if parent == "" or self.tree.exists(parent):
+                self.sort_children(parent, key)
+            
+    def sort_children(self, parent, key):
+        """Order the attached children of parent by key, largest first, or by report order if key is None"""
+        children = list(self.tree.get_children(parent))
+        if len(children) < 2:
+            return
+        # Report order (nested suites, then a placeholder, then cases) first; the sort is stable,
+        # so equal keys stay in it
+        ordered = sorted(children, key=lambda item_id: (
+            MODEL_KINDS.get(item_id[:1], 1) if item_id[1:].isdigit() else 1,
+            int(item_id[1:]) if item_id[1:].isdigit() else -1))
+        if key is not None:
+            ordered.sort(key=key, reverse=self.sort_descending)
+        if ordered != children:
+            # Moves the existing items; items detached by a filter stay detached
+            self.tree.set_children(parent, *ordered)
+            
+    def top_level_ids(self):
+        if self.group_by_file:
+            return [f"f{source}" for source in range(len(self.report.sources))]
+        return [f"s{index}" for index in self.report.top_suites()]
+        
+    def show_all_rows(self):
+        """Reattach every item detached by a filter, in model order"""
+        report = self.report
+        for suite_index, suite in enumerate(report.suites):
+            suite_id = f"s{suite_index}"
+            nested = [f"s{index}" for index in suite.children]
+            if suite_id in self.lazy_suites:
+                placeholder = self.lazy_suites[suite_id]
+                created = sorted(self.partial_suites.get(suite_id, ()))
+                self.tree.set_children(suite_id, *nested, *([placeholder] if placeholder else []),
+                                       *[f"c{row}" for row in created])
+            else:
+                self.tree.set_children(suite_id, *nested, *[f"c{row}" for row in suite.rows])
+            self.tree.item(suite_id, open=suite.has_failures)
+            
+        if self.group_by_file:
+            for source in range(len(report.sources)):
+                self.tree.set_children(f"f{source}", *[f"s{index}" for index in report.source_suites(source)])
+        self.tree.set_children("", *self.top_level_ids())
+        
+    def show_matching_rows(self, matches, open_suites):
+        """Detach everything but the matching cases and the suites and files containing them"""
+        report = self.report
+        row_suites = self.index.row_suites
+        suite_matches = {}
+        for row in sorted(matches):
+            suite_matches.setdefault(row_suites[row], []).append(row)
+        # Suites containing matches, directly or through nested suites
+        visible = set(suite_matches)
+        for suite_index in suite_matches:
+            visible.update(report.ancestors(suite_index))
+            
+        for suite_index in sorted(visible):
+            suite_id = f"s{suite_index}"
+            rows = suite_matches.get(suite_index, ())
+            if suite_id in self.lazy_suites:
+                # Create only the matching rows; the rest waits for the suite to be expanded unfiltered
+                created = self.partial_suites.setdefault(suite_id, set())
+                for row in rows:
+                    if row not in created:
+                        self.insert_testcase_row(row, suite_id)
+                        created.add(row)
+            nested = [f"s{index}" for index in report.suites[suite_index].children if index in visible]
+            self.tree.set_children(suite_id, *nested, *[f"c{row}" for row in rows])
+            if open_suites:
+                self.tree.item(suite_id, open=True)
+                
+        if self.group_by_file:
+            visible_sources = []
+            for source in range(len(report.sources)):
+                suite_ids = [f"s{index}" for index in report.source_suites(source) if index in visible]
+                self.tree.set_children(f"f{source}", *suite_ids)
+                if suite_ids:
+                    visible_sources.append(f"f{source}")
+            self.tree.set_children("", *visible_sources)
+        else:
+            self.tree.set_children("", *[f"s{index}" for index in report.top_suites() if index in visible])
+        
+    def item_index(self, item_id, prefix):
+        """Model index behind a tree item id ("f<source>", "s<suite>" or "c<row>"), or None"""
+        if item_id.startswith(prefix) and item_id[1:].isdigit():
+            return int(item_id[1:])
+        return None
+        
+    def is_failed_file(self, item_id):
+        source = self.item_index(item_id, "f")
+        return source is not None and any(
+            self.report.suites[index].has_failures for index in self.report.source_suites(source)
+        )
+        
+    def is_failed_suite(self, item_id):
+        suite_index = self.item_index(item_id, "s")
+        return suite_index is not None and self.report.suites[suite_index].has_failures
+        
+    def is_failed_case(self, item_id):
+        row = self.item_index(item_id, "c")
+        return row is not None and row in self.report.failures
+            
+    def group_row(self, has_failures, tests, failures, time):
+        """Values and tag of a suite or file row"""
+        if has_failures:
+            return ("❌ FAILURE", tests, failures, f"{time:.3f}s", "📋 Copy"), "suite_fail"
+        return ("✅ PASS", tests, failures, f"{time:.3f}s", ""), "suite_pass"
+        
+    def insert_file(self, source):
+        suites = [self.report.suites[index] for index in self.report.source_suites(source)]
+        has_failures = any(suite.has_failures for suite in suites)
+        values, tag = self.group_row(has_failures,
+                                     sum(suite.tests for suite in suites),
+                                     sum(suite.failures for suite in suites),
+                                     sum(suite.time for suite in suites))
+        self.tree.insert(
+            "", "end",
+            iid=f"f{source}",
+            text=f"🗂 {os.path.basename(self.report.sources[source])}",
+            values=values,
+            tags=(tag,),
+            open=has_failures
+        )
+        
+    def insert_testsuite(self, suite_index):
+        suite = self.report.suites[suite_index]
+        values, tag = self.group_row(suite.has_failures, suite.tests, suite.failures, suite.time)
+        if suite.parent >= 0:
+            # Nested suites go in front of the parent's own test cases
+            parent_id = f"s{suite.parent}"
+            position = suite.position
+        else:
+            parent_id = f"f{suite.source}" if self.group_by_file else ""
+            position = "end"
+            
+        suite_id = self.tree.insert(
+            parent_id, position,
+            iid=f"s{suite_index}",
+            text=f"📁 {suite.name}",
+            values=values,
+            tags=(tag,),
+            open=suite.has_failures  # Auto-expand failed suites
+        )
+        
+        if not suite.has_failures:
+            # Passing suites stay collapsed, so their rows are created on first expand
+            self.lazy_suites[suite_id] = None
+            
+        return suite_id
+            
+    def update_testsuite(self, suite_index):
+        """Refresh a suite row after another file's suite of the same name was merged into it"""
+        suite = self.report.suites[suite_index]
+        suite_id = f"s{suite_index}"
+        values, tag = self.group_row(suite.has_failures, suite.tests, suite.failures, suite.time)
+        self.tree.item(suite_id, values=values, tags=(tag,))
+        
+        if suite.has_failures and suite_id in self.lazy_suites:
+            self.populate_suite(suite_id)
+            self.tree.item(suite_id, open=True)
+            
+    def insert_testcase(self, suite_index, row):
+        suite_id = f"s{suite_index}"
+        if suite_id in self.lazy_suites:
+            if self.lazy_suites[suite_id] is None:
+                # Placeholder child so the suite gets an expand indicator
+                self.lazy_suites[suite_id] = self.tree.insert(suite_id, "end", text="  Loading...")
+            return
+            
+        self.insert_testcase_row(row, suite_id)
+        
+    def insert_testcase_row(self, row, parent_id):
+        report = self.report
+        status_code = report.statuses[row]
+        
+        if status_code == FAILURE:
+            status = "❌ FAIL"
+            tag = "failure"
+            action = "📋 Copy"
+        elif status_code == ERROR:
+            status = "⚠️ ERROR"
+            tag = "failure"
+            action = "📋 Copy"
+        elif status_code == SKIPPED:
+            status = "⏭️ SKIP"
+            tag = "skipped"
+            action = ""
+        else:
+            status = "✅ PASS"
+            tag = "success"
+            action = ""
+            
+        self.tree.insert(
+            parent_id, "end",
+            iid=f"c{row}",
+            text=f"  📄 {report.names[row]}",
+            values=(status, "", "", f"{report.times[row]:.3f}s", action),
+            tags=(tag,)
+        )
+        
+    def on_open(self, event):
+        """Create the test case rows of a collapsed suite the first time it is expanded"""
+        suite_id = self.tree.focus()
+        # While filtered, an expanded suite shows just its matching rows
+        if suite_id in self.lazy_suites and not self.filtered:
+            self.populate_suite(suite_id)
+            
+    def populate_suite(self, suite_id):
+        placeholder = self.lazy_suites.pop(suite_id)
+        if placeholder is not None:
+            self.tree.delete(placeholder)
+        
+        # Rows a search already created are kept and put back in order
+        created = self.partial_suites.pop(suite_id, ())
+        suite = self.report.suites[self.item_index(suite_id, "s")]
+        for row in suite.rows:
+            if row not in created:
+                self.insert_testcase_row(row, suite_id)
+        if created:
+            self.tree.set_children(suite_id, *[f"s{index}" for index in suite.children],
+                                   *[f"c{row}" for row in suite.rows])
+        if self.sort_column is not None:
+            self.sort_children(suite_id, self.sort_key())
+            
+    def on_motion(self, event):
+        """Change cursor to hand when hovering over clickable copy button"""
+        column = self.tree.identify_column(event.x)
+        item_id = self.tree.identify_row(event.y)
+        
+        if column == "#5" and item_id:
+            # Check if this item has a copy action
+            if self.is_failed_file(item_id) or self.is_failed_suite(item_id) or self.is_failed_case(item_id):
+                self.tree.config(cursor="hand2")
+                return
+        self.tree.config(cursor="")
+        
+    def on_click(self, event):
+        """Handle click on action column for copy"""
+        column = self.tree.identify_column(event.x)
+        item_id = self.tree.identify_row(event.y)
+        
+        if not item_id:
+            return
+            
+        # Check if clicked on action column (#5) - the copy button
+        if column == "#5":
+            # Check if this item has failures
+            if self.is_failed_file(item_id) or self.is_failed_suite(item_id) or self.is_failed_case(item_id):
+                self.tree.selection_set(item_id)
+                self.root.after(50, self.copy_selected_failures)  # Small delay to let selection update
+            
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        with profiler.phase("on_select", item=selection[0]):
+            self.show_selection(selection[0])
+            
+    def show_selection(self, item_id, keep=None):
+        """Show an item in the details panel; texts are cut to keep characters at each end
+        (by default XMLVIEWER_TEXT_KEEP_KB, 0 for whole texts)"""
+        report = self.report
+        
+        # Clear details, abandoning the rest of the previous selection's text
+        self.cancel_render()
+        self.build_details_panel()
+        self.details_text.delete(1.0, tk.END)
+        
+        row = self.item_index(item_id, "c")
+        suite_index = self.item_index(item_id, "s")
+        source = self.item_index(item_id, "f")
+        
+        # Check if it's a test case with data
+        if row is not None:
+            parts = [
+                ("TEST CASE\n", "header"),
+                (f"Name: {report.names[row]}\n", "info"),
+                (f"Class: {report.classnames[row]}\n", "info"),
+                (f"Time: {report.times[row]}s\n\n", "info"),
+            ]
+            parts.extend(self.test_history(row))
+            
+            failure = report.failures.get(row)
+            if failure:
+                parts.append(("FAILURE DETAILS\n", "header"))
+                parts.append((f"Type: {failure.type}\n", "error"))
+                parts.append((f"Message: {failure.message}\n\n", "error"))
+                parts.append(("Stack Trace:\n", "header"))
+                parts.append((failure.content, "error"))
+                
+            for title, column in (("SYSTEM OUT", report.system_out), ("SYSTEM ERR", report.system_err)):
+                span = column.get(row)
+                if span is not None:
+                    parts.append((f"\n\n{title}\n", "header"))
+                    parts.append((span, "info"))
+                    
+            # Texts are read from the report file on demand; reading one out of a compressed
+            # report decompresses the file up to it, which is left to a worker thread
+            if any(isinstance(text, TextSpan) and not is_plain(report.sources[text.source])
+                   for text, tag in parts):
+                self.details_text.insert(tk.END, "Decompressing the report up to this test case...\n", "info")
+                self.read_texts(item_id, parts, keep)
+            else:
+                self.show_case(item_id, [(report.read_text(text, keep=keep), tag) for text, tag in parts])
+
+        elif suite_index is not None:
+            suite = report.suites[suite_index]
+            
+            self.details_text.insert(tk.END, "TEST SUITE\n", "header")
+            self.details_text.insert(tk.END, f"Name: {suite.name}\n", "info")
+            self.details_text.insert(tk.END, f"Tests: {suite.tests}\n", "info")
+            self.details_text.insert(tk.END, f"Failures: {suite.failures}\n", "info")
+            self.details_text.insert(tk.END, f"Errors: {suite.errors}\n", "info")
+            self.details_text.insert(tk.END, f"Time: {suite.time:.3f}s\n\n", "info")
+            
+            # How the suite's time is spread over its cases
+            counts = report.duration_histogram(suite_index)
+            if any(counts):
+                self.details_text.insert(tk.END, "DURATIONS\n", "header")
+                largest = max(counts)
+                for label, count in zip(DURATION_LABELS, counts):
+                    bar = "█" * (-(-count * HISTOGRAM_WIDTH // largest))
+                    self.details_text.insert(tk.END, f"{label:>9} {bar} {count}\n", "info")
+                self.details_text.insert(tk.END, "\n", "info")
+                
+            if suite.has_failures:
+                self.details_text.insert(tk.END, "Click 'Copy Failures' to copy failure details\n", "info")
+            
+        elif source is not None:
+            suites = [report.suites[index] for index in report.source_suites(source)]
+            
+            self.details_text.insert(tk.END, "REPORT FILE\n", "header")
+            self.details_text.insert(tk.END, f"Path: {report.sources[source]}\n", "info")
+            self.details_text.insert(tk.END, f"Suites: {len(suites)}\n", "info")
+            self.details_text.insert(tk.END, f"Tests: {sum(suite.tests for suite in suites)}\n", "info")
+            self.details_text.insert(tk.END, f"Failures: {sum(suite.failures for suite in suites)}\n", "info")
+            self.details_text.insert(tk.END, f"Errors: {sum(suite.errors for suite in suites)}\n\n", "info")
+            
+    def show_case(self, item_id, parts):
+        # Texts read back cut in the middle can be read again whole
+        dropped = sum(getattr(text, "dropped", 0) for text, tag in parts)
+        if dropped:
+            self.insert_read_whole(item_id, dropped)
+            
+        # Stack traces and logs can be megabytes long
+        self.show_details(parts)
+        
+    def read_texts(self, item_id, parts, keep):
+        """Read the texts of a case's parts on a worker thread, then show the case unless
+        the selection changed in the meantime"""
+        report = self.report
+        read = []
+        reader = threading.Thread(
+            target=lambda: read.extend((report.read_text(text, keep=keep), tag) for text, tag in parts),
+            daemon=True)
+        reader.start()
+        
+        def poll():
+            if reader.is_alive():
+                self.text_job = self.root.after(LOAD_POLL_MS, poll)
+                return
+            self.text_job = None
+            self.details_text.delete(1.0, tk.END)
+            self.show_case(item_id, read)
+            
+        self.text_job = self.root.after(LOAD_POLL_MS, poll)
+        
+    def show_details(self, parts):
+        """Insert (text, tag) parts into the details panel without blocking the UI.
+        
+        Text is inserted DETAILS_CHUNK_CHARS at a time from the main loop, and
+        each part is cut at DETAILS_PREVIEW_CHARS behind a "Load full text" button.
+        """
+        for text, tag in parts:
+            self.render_queue.append([text, 0, min(len(text), DETAILS_PREVIEW_CHARS), tag, tk.END])
+        self.render_details()
+        
+    def render_details(self):
+        self.render_job = None
+        budget = DETAILS_CHUNK_CHARS
+        render_queue = self.render_queue
+        with profiler.phase("render_details") as span:
+            while render_queue and budget > 0:
+                part = render_queue[0]
+                text, position, stop, tag, index = part
+                end = min(stop, position + budget)
+                self.details_text.insert(index, text[position:end], tag)
+                budget -= end - position
+                part[1] = end
+                if end < stop:
+                    break
+                render_queue.popleft()
+                if stop < len(text):
+                    self.insert_load_full(text, stop, tag, index)
+            span.bytes = DETAILS_CHUNK_CHARS - budget
+            
+        if render_queue:
+            self.render_job = self.root.after(1, self.render_details)
+            
+    def insert_load_full(self, text, position, tag, index):
+        """Put a button where a cut text stops that renders the rest of it in place"""
+        mark = f"more{len(self.more_buttons)}"
+        self.details_text.mark_set(mark, "end-1c" if index == tk.END else index)
+        # Stays in front of the button while the parts after it are inserted
+        self.details_text.mark_gravity(mark, tk.LEFT)
+        
+        button = tk.Button(self.details_text,
+                           text=f"⬇ Load full text ({len(text) - position:,} more characters)",
+                           bg="#0f3460",
+                           fg="#eaeaea",
+                           font=("Segoe UI", 9),
+                           bd=0,
+                           padx=8,
+                           pady=2,
+                           cursor="hand2")
+        button.config(command=lambda: self.load_full_text(button, mark, text, position, tag))
+        self.details_text.insert(mark, "\n")
+        self.details_text.window_create(mark, window=button)
+        self.more_buttons.append(button)
+        
+    def insert_read_whole(self, item_id, dropped):
+        """Put a button above the details that shows them again with texts read whole"""
+        button = tk.Button(self.details_text,
+                           text=f"✂ {dropped:,} characters cut from long texts: read them whole",
+                           bg="#0f3460",
+                           fg="#eaeaea",
+                           font=("Segoe UI", 9),
+                           bd=0,
+                           padx=8,
+                           pady=2,
+                           cursor="hand2",
+                           command=lambda: self.show_selection(item_id, keep=0))
+        self.details_text.window_create(tk.END, window=button)
+        self.details_text.insert(tk.END, "\n\n")
+        self.more_buttons.append(button)
+        
+    def load_full_text(self, button, mark, text, position, tag):
+        self.details_text.delete(mark, f"{mark} +2c")  # Button and its line break
+        button.destroy()
+        # Inserted text now has to go in front of the mark, in order
+        self.details_text.mark_gravity(mark, tk.RIGHT)
+        self.render_queue.appendleft([text, position, len(text), tag, mark])
+        if self.render_job is None:
+            self.render_details()
+            
+    def cancel_render(self):
+        if self.render_job is not None:
+            self.root.after_cancel(self.render_job)
+            self.render_job = None
+        # A worker still reading texts finishes in the background; its texts are not shown
+        if self.text_job is not None:
+            self.root.after_cancel(self.text_job)
+            self.text_job = None
+        self.render_queue.clear()
+        for button in self.more_buttons:
+            button.destroy()
+        self.more_buttons = []
+        
+    def copy_selected_failures(self):
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showinfo("Info", "Please select a test suite or test case")
+            return
+            
+        item_id = selection[0]
+        
+        # Determine what to copy
+        if self.is_failed_file(item_id):
+            # Copy all failures in this file
+            rows = [row for index in self.report.source_suites(self.item_index(item_id, "f"))
+                    for row in self.report.failed_rows(index)]
+        elif self.is_failed_suite(item_id):
+            # Copy all failures in this suite
+            rows = self.report.failed_rows(self.item_index(item_id, "s"))
+        elif self.is_failed_case(item_id):
+            # Copy single test case failure
+            rows = [self.item_index(item_id, "c")]
+        else:
+            messagebox.showinfo("Info", "No failures to copy in selected item")
+            return
+            
+        if not rows:
+            messagebox.showinfo("Info", "No failures found")
+            return
+            
+        self.copy_failure_groups(rows)
+        
+    def copy_failure_groups(self, rows):
+        """Copy failures as YAML, one representative per group of failures with the same cause"""
+        with profiler.phase("copy") as span:
+            failures_to_copy = list(self.report.iter_failure_groups(rows))
+            
+            # Format as YAML (more readable for AI)
+            yaml_output = self.format_as_yaml(failures_to_copy)
+            
+            # Copy to clipboard
+            self.root.clipboard_clear()
+            self.root.clipboard_append(yaml_output)
+            span.items = len(rows)
+            span.bytes = len(yaml_output)
+            
+        # Show confirmation
+        copied = f"Copied {len(rows)} failure(s) to clipboard"
+        if len(failures_to_copy) < len(rows):
+            copied += f" as {len(failures_to_copy)} group(s)"
+        status = copied
+        if profiler.enabled:
+            status += f" | {profiler.summary_line(('copy',), span.start)}"
+        self.status_label.config(text=status)
+        messagebox.showinfo("Copied", copied)
+        
+    def export_failures(self):
+        """Write all failures of the loaded report to a YAML, JSON, JSON Lines or JUnit XML file"""
+        report = self.report
+        if self.loader is not None and not getattr(self.loader, "watching", False):
+            messagebox.showinfo("Info", "Wait for the report to finish loading")
+            return
+        if not report.failures:
+            messagebox.showinfo("Info", "No failures found")
+            return
+            
+        filepath = filedialog.asksaveasfilename(
+            title="Export All Failures",
+            defaultextension=".yaml",
+            filetypes=[("YAML", "*.yaml *.yml"), ("JSON Lines", "*.jsonl"),
+                       ("JSON", "*.json"), ("JUnit XML", "*.xml")]
+        )
+        if not filepath:
+            return
+            
+        # Streamed from a worker thread; the report is only read
+        result = {}
+        count = len(report.failures)
+        
+        def export():
+            try:
+                with profiler.phase("export", format=export_format(filepath)) as span, \
+                        open(filepath, "w", encoding="utf-8", newline="\n") as out:
+                    write_failures([report], out, export_format(filepath))
+                    span.items = count
+                    span.bytes = out.tell()
+            except Exception as e:
+                result["error"] = e
+                
+        thread = threading.Thread(target=export, daemon=True)
+        thread.start()
+        self.export_btn.config(state="disabled")
+        self.status_label.config(text=f"Exporting {count:,} failures to {os.path.basename(filepath)}...")
+        self.root.after(LOAD_POLL_MS, self.finish_export, thread, filepath, count, result)
+        
+    def finish_export(self, thread, filepath, count, result):
+        if thread.is_alive():
+            self.root.after(LOAD_POLL_MS, self.finish_export, thread, filepath, count, result)
+            return
+        self.export_btn.config(state="normal")
+        if "error" in result:
+            self.status_label.config(text="Export failed")
+            messagebox.showerror("Error", f"Failed to export failures: {result['error']}")
+            return
+        self.status_label.config(text=f"Exported {count:,} failure(s) to {filepath}")
+        
+    def compare_reports(self):
+        """Compare the loaded report (the candidate) against baseline files chosen by the user"""
+        report = self.report
+        if self.loader is not None and not getattr(self.loader, "watching", False):
+            messagebox.showinfo("Info", "Wait for the report to finish loading")
+            return
+        if not len(report):
+            messagebox.showinfo("Info", "Open the report to compare first")
+            return
+            
+        filepaths = filedialog.askopenfilenames(
+            title="Open Baseline XML Test Results",
+            filetypes=REPORT_FILETYPES
+        )
+        if not filepaths:
+            return
+            
+        # Parsed and joined on a worker thread; the loaded report is only read
+        result = {}
+        
+        def compare():
+            try:
+                result["diff"] = ReportDiff(load_merged(collect_report_files(filepaths)), report)
+            except Exception as e:
+                result["error"] = e
+                
+        thread = threading.Thread(target=compare, daemon=True)
+        thread.start()
+        self.compare_btn.config(state="disabled")
+        self.status_label.config(text=f"Comparing against {len(filepaths)} baseline file(s)...")
+        self.root.after(LOAD_POLL_MS, self.finish_compare, thread, result)
+        
+    def finish_compare(self, thread, result):
+        if thread.is_alive():
+            self.root.after(LOAD_POLL_MS, self.finish_compare, thread, result)
+            return
+        self.compare_btn.config(state="normal")
+        if "error" in result:
+            self.status_label.config(text="Compare failed")
+            messagebox.showerror("Error", f"Failed to compare reports: {result['error']}")
+            return
+        diff = result["diff"]
+        counts = diff.counts()
+        self.status_label.config(
+            text=" | ".join(f"{CHANGE_TITLES[change]}: {counts[change]:,}" for change in CHANGES)
+        )
+        CompareWindow(self, diff)
+        
+    def show_failure_groups(self):
+        if self.loader is not None and not getattr(self.loader, "watching", False):
+            messagebox.showinfo("Info", "Wait for the report to finish loading")
+            return
+        if not self.report.failures:
+            messagebox.showinfo("Info", "No failures found")
+            return
+        FailureGroupsWindow(self, self.report)
+        
+    def show_slowest(self):
+        if self.loader is not None and not getattr(self.loader, "watching", False):
+            messagebox.showinfo("Info", "Wait for the report to finish loading")
+            return
+        if not len(self.report):
+            messagebox.showinfo("Info", "Open a report first")
+            return
+        SlowestWindow(self, self.report)
+        
+    def clear_filter(self):
+        """Show every row again: clear the search box and tick all status toggles"""
+        if not self.filtered:
+            return
+        self.search_var.set("")
+        for var in self.status_filters.values():
+            var.set(True)
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.apply_filter()
+        
+    def reveal_case(self, row):
+        """Select a test case of the loaded report in the tree, creating and showing its row if needed"""
+        if row >= len(self.report) or self.index is None or row >= self.index.size:
+            return
+        # The row may be filtered out
+        self.clear_filter()
+        suite_id = f"s{self.index.row_suites[row]}"
+        if suite_id in self.lazy_suites:
+            self.populate_suite(suite_id)
+        self.select_item(f"c{row}")
+        
+    def reveal_suite(self, suite_index):
+        if suite_index >= len(self.report.suites):
+            return
+        self.clear_filter()
+        self.select_item(f"s{suite_index}")
+        
+    def select_item(self, item_id):
+        self.tree.see(item_id)
+        self.tree.selection_set(item_id)
+        self.tree.focus(item_id)
+        
+    def format_as_yaml(self, failures):
+        """Format failures as YAML for better AI readability"""
+        return format_as_yaml(failures)
+    
+    def format_as_json(self, failures):
+        """Format failures as JSON"""
+        return format_as_json(failures)
+
+
+class CompareWindow:
+    """Changes between a baseline and the loaded report, one expandable node per change kind.
+
+    Case rows of a kind are created when its node is first expanded; double
+    clicking a case of the loaded report selects it in the main window.
+    """
+    
+    def __init__(self, viewer, diff):
+        self.viewer = viewer
+        self.diff = diff
+        self.window = tk.Toplevel(viewer.root)
+        baseline = diff.baseline.sources
+        self.window.title("Compare: " + (os.path.basename(baseline[0]) if len(baseline) == 1
+                                         else f"{len(baseline)} baseline files"))
+        self.window.geometry("1000x600")
+        self.window.configure(bg="#1a1a2e")
+        
+        tree_container = tk.Frame(self.window, bg="#0f3460", bd=2)
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        y_scroll = ttk.Scrollbar(tree_container, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree = ttk.Treeview(tree_container,
+                                 style="Custom.Treeview",
+                                 yscrollcommand=y_scroll.set,
+                                 columns=("status", "time"),
+                                 selectmode="browse")
+        y_scroll.config(command=self.tree.yview)
+        self.tree.heading("#0", text="Change / Test Case", anchor=tk.W)
+        self.tree.heading("status", text="Status", anchor=tk.CENTER)
+        self.tree.heading("time", text="Time", anchor=tk.CENTER)
+        self.tree.column("#0", width=560, minwidth=300)
+        self.tree.column("status", width=200, minwidth=120, anchor=tk.CENTER)
+        self.tree.column("time", width=200, minwidth=120, anchor=tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.tree.tag_configure("failure", foreground="#e94560")
+        self.tree.tag_configure("success", foreground="#00d9a0")
+        self.tree.tag_configure("skipped", foreground="#ffa500")
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        
+        # Change kinds whose case rows have not been created yet, with their placeholder
+        self.lazy_changes = {}
+        counts = diff.counts()
+        for change in CHANGES:
+            self.tree.insert("", "end", iid=change,
+                             text=f"{CHANGE_TITLES[change]} ({counts[change]:,})",
+                             tags=("failure" if change in ("new_failure", "slower") else "success",))
+            if counts[change]:
+                self.lazy_changes[change] = self.tree.insert(change, "end", text="  Loading...")
+        if counts["new_failure"]:
+            self.populate("new_failure")
+            self.tree.item("new_failure", open=True)
+            
+    def on_open(self, event):
+        change = self.tree.focus()
+        if change in self.lazy_changes:
+            self.populate(change)
+            
+    def populate(self, change):
+        self.tree.delete(self.lazy_changes.pop(change))
+        diff = self.diff
+        for i, (base_row, row) in enumerate(diff.changes[change]):
+            entry = diff.entry(change, base_row, row)
+            name = f"{entry['classname']}.{entry['name']}" if entry["classname"] else entry["name"]
+            statuses = [status for status in (entry["baseline_status"], entry["status"]) if status]
+            times = [f"{time:.3f}s" for time in (entry["baseline_time"], entry["time"]) if time is not None]
+            status = statuses[-1]
+            tag = "failure" if status in ("failure", "error") else "skipped" if status == "skipped" else "success"
+            self.tree.insert(change, "end", iid=f"{change}:{i}",
+                             text=f"  📄 {name}",
+                             values=(" → ".join(statuses), " → ".join(times)),
+                             tags=(tag,))
+            
+    def on_double_click(self, event):
+        item_id = self.tree.identify_row(event.y)
+        change, _, i = item_id.partition(":")
+        if not i:
+            return
+        row = self.diff.changes[change][int(i)][1]
+        # Rows only mean something while the compared report is still the loaded one
+        if row is not None and self.viewer.report is self.diff.candidate:
+            self.viewer.reveal_case(row)
+
+
+class FailureGroupsWindow:
+    """Failures of a report grouped by fingerprint, largest group first.
+
+    A group's cases are created when it is first expanded; its copy action
+    copies one representative failure and the names of the other cases.
+    Double clicking a case selects it in the main window.
+    """
+    
+    def __init__(self, viewer, report):
+        self.viewer = viewer
+        self.report = report
+        self.groups = report.failure_groups()
+        self.window = tk.Toplevel(viewer.root)
+        self.window.title(f"Failure Groups: {len(self.groups):,} groups of {len(report.failures):,} failures")
+        self.window.geometry("1000x600")
+        self.window.configure(bg="#1a1a2e")
+        
+        tree_container = tk.Frame(self.window, bg="#0f3460", bd=2)
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        y_scroll = ttk.Scrollbar(tree_container, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree = ttk.Treeview(tree_container,
+                                 style="Custom.Treeview",
+                                 yscrollcommand=y_scroll.set,
+                                 columns=("tests", "action"),
+                                 selectmode="browse")
+        y_scroll.config(command=self.tree.yview)
+        self.tree.heading("#0", text="Failure / Test Case", anchor=tk.W)
+        self.tree.heading("tests", text="Tests", anchor=tk.CENTER)
+        self.tree.heading("action", text="", anchor=tk.CENTER)
+        self.tree.column("#0", width=760, minwidth=300)
+        self.tree.column("tests", width=80, minwidth=60, anchor=tk.CENTER)
+        self.tree.column("action", width=80, minwidth=60, anchor=tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        self.tree.tag_configure("failure", foreground="#e94560")
+        self.tree.bind("<<TreeviewOpen>>", self.on_open)
+        self.tree.bind("<Button-1>", self.on_click)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        
+        # Groups whose case rows have not been created yet, with their placeholder
+        self.lazy_groups = {}
+        for i, group in enumerate(self.groups):
+            failure = report.failures[group[0]]
+            message = failure.message.split("\n", 1)[0]
+            group_id = self.tree.insert("", "end", iid=f"g{i}",
+                                        text=f"🧩 {failure.type}: {message}" if failure.type else f"🧩 {message}",
+                                        values=(len(group), "📋 Copy"),
+                                        tags=("failure",))
+            self.lazy_groups[group_id] = self.tree.insert(group_id, "end", text="  Loading...")
+            
+    def on_open(self, event):
+        group_id = self.tree.focus()
+        if group_id in self.lazy_groups:
+            self.tree.delete(self.lazy_groups.pop(group_id))
+            for row in self.groups[int(group_id[1:])]:
+                self.tree.insert(group_id, "end", iid=f"c{row}",
+                                 text=f"  📄 {self.report.qualified_name(row)}",
+                                 values=("", ""),
+                                 tags=("failure",))
+                
+    def on_click(self, event):
+        item_id = self.tree.identify_row(event.y)
+        if self.tree.identify_column(event.x) == "#2" and item_id.startswith("g"):
+            self.viewer.copy_failure_groups(self.groups[int(item_id[1:])])
+            
+    def on_double_click(self, event):
+        item_id = self.tree.identify_row(event.y)
+        # Rows only mean something while the grouped report is still the loaded one
+        if item_id.startswith("c") and self.viewer.report is self.report:
+            self.viewer.reveal_case(int(item_id[1:]))
+
+
+class SlowestWindow:
+    """The TOP_K slowest test cases and suites of a report.
+
+    Picked with a heap over all cases rather than a full sort; double clicking
+    an entry selects it in the main window.
+    """
+    
+    def __init__(self, viewer, report):
+        self.viewer = viewer
+        self.report = report
+        self.window = tk.Toplevel(viewer.root)
+        self.window.title(f"Slowest of {len(report):,} test cases")
+        self.window.geometry("900x600")
+        self.window.configure(bg="#1a1a2e")
+        
+        tree_container = tk.Frame(self.window, bg="#0f3460", bd=2)
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        y_scroll = ttk.Scrollbar(tree_container, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree = ttk.Treeview(tree_container,
+                                 style="Custom.Treeview",
+                                 yscrollcommand=y_scroll.set,
+                                 columns=("time", "share"),
+                                 selectmode="browse")
+        y_scroll.config(command=self.tree.yview)
+        self.tree.heading("#0", text="Test Case / Test Suite", anchor=tk.W)
+        self.tree.heading("time", text="Time", anchor=tk.CENTER)
+        self.tree.heading("share", text="% of Total", anchor=tk.CENTER)
+        self.tree.column("#0", width=640, minwidth=300)
+        self.tree.column("time", width=100, minwidth=80, anchor=tk.CENTER)
+        self.tree.column("share", width=100, minwidth=80, anchor=tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        
+        total = sum(report.times) or 1.0
+        rows = report.slowest_cases(TOP_K)
+        self.tree.insert("", "end", iid="cases", text=f"⏱ Slowest {len(rows)} test cases", open=True)
+        for row in rows:
+            time_taken = report.times[row]
+            self.tree.insert("cases", "end", iid=f"c{row}",
+                             text=f"  📄 {report.qualified_name(row)}",
+                             values=(f"{time_taken:.3f}s", f"{100 * time_taken / total:.1f}%"))
+            
+        suite_indices = report.slowest_suites(TOP_K)
+        suite_total = report.totals()["time"] or 1.0
+        self.tree.insert("", "end", iid="suites", text=f"⏱ Slowest {len(suite_indices)} suites", open=True)
+        for suite_index in suite_indices:
+            suite = report.suites[suite_index]
+            self.tree.insert("suites", "end", iid=f"s{suite_index}",
+                             text=f"  📁 {suite.name}",
+                             values=(f"{suite.time:.3f}s", f"{100 * suite.time / suite_total:.1f}%"))
+            
+    def on_double_click(self, event):
+        item_id = self.tree.identify_row(event.y)
+        index = self.viewer.item_index(item_id, item_id[:1]) if item_id else None
+        # Rows only mean something while this report is still the loaded one
+        if index is None or self.viewer.report is not self.report:
+            return
+        if item_id.startswith("c"):
+            self.viewer.reveal_case(index)
+        else:
+            self.viewer.reveal_suite(index)
+
+
+class ArchiveWindow:
+    """The reports in a zip archive with their sizes, read from its directory without extracting.
+    
+    All reports are selected at first; "Open Selected" loads the selection
+    and double clicking a report loads just that one, streamed from the archive.
+    """
+    
+    def __init__(self, viewer, archive, members):
+        self.viewer = viewer
+        self.archive = archive
+        self.window = tk.Toplevel(viewer.root)
+        self.window.title(f"{os.path.basename(archive)}: {len(members):,} reports")
+        self.window.geometry("800x500")
+        self.window.configure(bg="#1a1a2e")
+        
+        button_frame = ttk.Frame(self.window, style="Main.TFrame")
+        button_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Button(button_frame,
+                   text="📂 Open Selected",
+                   style="Open.TButton",
+                   command=self.open_selected).pack(side=tk.RIGHT)
+        
+        tree_container = tk.Frame(self.window, bg="#0f3460", bd=2)
+        tree_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        y_scroll = ttk.Scrollbar(tree_container, orient=tk.VERTICAL)
+        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree = ttk.Treeview(tree_container,
+                                 style="Custom.Treeview",
+                                 yscrollcommand=y_scroll.set,
+                                 columns=("size", "compressed"),
+                                 selectmode="extended")
+        y_scroll.config(command=self.tree.yview)
+        self.tree.heading("#0", text="Report", anchor=tk.W)
+        self.tree.heading("size", text="Size", anchor=tk.CENTER)
+        self.tree.heading("compressed", text="Compressed", anchor=tk.CENTER)
+        self.tree.column("#0", width=520, minwidth=300)
+        self.tree.column("size", width=110, minwidth=80, anchor=tk.CENTER)
+        self.tree.column("compressed", width=110, minwidth=80, anchor=tk.CENTER)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", self.on_double_click)
+        
+        for i, (name, size, compressed) in enumerate(members):
+            self.tree.insert("", "end", iid=str(i), text=f"  📄 {name}",
+                             values=(f"{size / (1024 * 1024):,.1f} MB", f"{compressed / (1024 * 1024):,.1f} MB"))
+        self.names = [name for name, _, _ in members]
+        self.tree.selection_set(self.tree.get_children())
+        
+    def open_selected(self):
+        selection = self.tree.selection()
+        if not selection:
+            messagebox.showinfo("Info", "Select the reports to open", parent=self.window)
+            return
+        paths = [member_path(self.archive, self.names[int(item_id)]) for item_id in selection]
+        self.window.destroy()
+        self.viewer.load_files(paths)
+        
+    def on_double_click(self, event):
+        item_id = self.tree.identify_row(event.y)
+        if item_id:
+            self.window.destroy()
+            self.viewer.load_files([member_path(self.archive, self.names[int(item_id)])])
+
+
+def open_command_line(app, args):
+    """Apply command line arguments: one or more files or directories,
+    or --watch followed by a report file or directory to follow.
+    
+    Loading starts as soon as the window is shown, after its first paint.
+    """
+    args = list(args)
+    
+    # --profile [trace.json]: time the load phases and write a trace for bug reports
+    if "--profile" in args:
+        position = args.index("--profile")
+        args.pop(position)
+        path = DEFAULT_TRACE
+        if position < len(args) and args[position].lower().endswith(".json"):
+            path = args.pop(position)
+        app.enable_profile(path)
+        
+    if "--watch" in args and args.index("--watch") + 1 < len(args):
+        watched = args[args.index("--watch") + 1]
+        app.when_mapped(lambda: app.watch_path(watched))
+    else:
+        paths = [path for path in args if os.path.exists(disk_path(path))]
+        if paths:
+            app.when_mapped(lambda: app.load_files(paths))
+
+
+def main():
+    root = tk.Tk()
+    
+    # Set window icon if available
+    try:
+        if sys.platform == "win32":
+            root.iconbitmap(default='')
+    except:
+        pass
+    
+    app = XMLTestViewer(root)
+    open_command_line(app, sys.argv[1:])
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()